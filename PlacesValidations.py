@@ -4,6 +4,7 @@
 # Purpose:      This is a part of the Python MapReduce framework I developed to run validations and data mining
 #               on Places xml data on PlacesLab HDFS. This script needs to reside on PlacesLab next to the Mapper and Reducer.
 #               Takes in an input file called 'product_vals.xml', which should also be uploaded to PlacesLab.
+#               The category-aware validations also read 'category_taxonomy.xml', uploaded the same way.
 #
 # Author:       Chris Nielsen (chris.relaxing@gmail.com)
 #-------------------------------------------------------------------------------
@@ -12,9 +13,21 @@ import os
 import sys
 import lxml.etree as etree
 import re
-from math import pi , acos , sin , cos
+import zlib
+import base64
+import marshal
+import bisect
+import struct
+import hashlib
+import binascii
+from math import pi , asin , sin , cos , sqrt , log
+try:
+    import numpy as np          # Optional: batched coordinate checks (see CoordinateBatch)
+except ImportError:
+    np = None
 
 xml_file = 'product_vals.xml'
+category_file = 'category_taxonomy.xml'      # Category groups and lookups, see CategoryTaxonomy
 
 # Note: All validations below have been written to work with the Places xml (EWP) schema.
 #
@@ -40,7 +53,7 @@ def Media_0002(Place, map_input_file):
     return_emits = []
     for Location in LocationList:
         LocationAttributes = Location.attrib
-        CountryCode = Location.find(ns+"CountryCode").text
+        CountryCode = find_tag(Location, "CountryCode").text
         try:
             Location_primary_value = LocationAttributes['primary']  # LocationAttributes['primary']
         except:
@@ -106,7 +119,7 @@ def Basic_0003(Place):
     GeoPositionList = Place.findall(ns+"GeoPosition")
     return_emits = []
     for GeoPosition in GeoPositionList:
-        Latitude = GeoPosition.find(ns+"Latitude")
+        Latitude = find_tag(GeoPosition, "Latitude")
         try:
             LAT = str(Latitude.text)
             if not LAT or LAT == "None":
@@ -140,7 +153,7 @@ def Basic_0004(Place):
     GeoPositionList = Place.findall(ns+"GeoPosition")
     return_emits = []
     for GeoPosition in GeoPositionList:
-        Longitude = GeoPosition.find(ns+"Longitude")
+        Longitude = find_tag(GeoPosition, "Longitude")
         try:
             Long = str(Longitude.text)
             if not Long or Long == "None":
@@ -174,8 +187,8 @@ def Basic_0005(Place):
     return_emits = []
     for GeoPosition in GeoPositionList:
         try:
-            Longitude = GeoPosition.find(ns+"Longitude")
-            Latitude = GeoPosition.find(ns+"Latitude")
+            Longitude = find_tag(GeoPosition, "Longitude")
+            Latitude = find_tag(GeoPosition, "Latitude")
             Long = str(Longitude.text)
             LAT = str(Latitude.text)
             if float(Long) == float(LAT):
@@ -206,7 +219,7 @@ def Basic_0006a(Place):
     # For each Location in LocationList, check the side (assumes there is only 1 Side per Location)
     for Location in LocationList:
         try:
-            Side = Location.find(ns+"Side").text
+            Side = find_tag(Location, "Side").text
         except:
             Side = "None"
         GeoPositionList = Location.findall(ns+"GeoPosition")
@@ -216,11 +229,11 @@ def Basic_0006a(Place):
                 try:
                     GeoPosition_type = GeoPosition.attrib
                     if GeoPosition_type["type"] == 'DISPLAY':
-                        display_LAT = GeoPosition.find(ns+"Latitude")
-                        display_LONG = GeoPosition.find(ns+"Longitude")
+                        display_LAT = find_tag(GeoPosition, "Latitude")
+                        display_LONG = find_tag(GeoPosition, "Longitude")
                     if GeoPosition_type["type"] == 'ROUTING':
-                        routing_LAT = GeoPosition.find(ns+"Latitude")
-                        routing_LONG = GeoPosition.find(ns+"Longitude")
+                        routing_LAT = find_tag(GeoPosition, "Latitude")
+                        routing_LONG = find_tag(GeoPosition, "Longitude")
                     if Side == "left" or Side == "right":           # Exluding Side="None" and Side="neither"
                         if display_LAT.text == routing_LAT.text and display_LONG.text == routing_LONG.text:
                             emit_string = 'Basic_0006a|'+CountryCode+'|DISPLAY and ROUTING Lat/Longs are identical'
@@ -247,7 +260,7 @@ def Basic_0006b(Place):
     # For each Location in LocationList, check the side (assumes there is only 1 Side per Location)
     for Location in LocationList:
         try:
-            Side = Location.find(ns+"Side").text
+            Side = find_tag(Location, "Side").text
         except:
             Side = "None"
         GeoPositionList = Location.findall(ns+"GeoPosition")
@@ -257,11 +270,11 @@ def Basic_0006b(Place):
                 try:
                     GeoPosition_type = GeoPosition.attrib
                     if GeoPosition_type["type"] == 'DISPLAY':
-                        display_LAT = GeoPosition.find(ns+"Latitude")
-                        display_LONG = GeoPosition.find(ns+"Longitude")
+                        display_LAT = find_tag(GeoPosition, "Latitude")
+                        display_LONG = find_tag(GeoPosition, "Longitude")
                     if GeoPosition_type["type"] == 'ROUTING':
-                        routing_LAT = GeoPosition.find(ns+"Latitude")
-                        routing_LONG = GeoPosition.find(ns+"Longitude")
+                        routing_LAT = find_tag(GeoPosition, "Latitude")
+                        routing_LONG = find_tag(GeoPosition, "Longitude")
                     if Side == "left" or Side == "right":           # Exluding Side="None" and Side="neither"
                         if display_LAT.text == routing_LAT.text and display_LONG.text == routing_LONG.text:
                             emit_string = 'Basic_0006b|'+CountryCode+'|'+PlaceId+'|DISPLAY and ROUTING Lat/Longs are identical|Side='+Side
@@ -477,6 +490,48 @@ def Basic_0017d(Place):
         return emit_string
 
 
+# Text lint -------------------------------------------------------
+# The spacing/punctuation checks on name and address texts (Basic_0020, 0022, 0040, 0041, 0057, 0087, 0101,
+# 0104, 0116, 0117) read their fields from one extraction per Place (Place.findall / parsed_lint_fields) and
+# share one lint summary per distinct text (text_lint). The in-text rules run as a single scanner pass: double
+# spaces, a repeated -/\()!"+,&'. character and an Appendix F punctuation character use disjoint characters, so
+# the first match of each alternative is the same as a separate search for it. The whole-text rules are anchored
+# matches. All patterns are compiled once per task.
+lint_scanner = re.compile(ur'(?P<spaces>  )|(?P<consecutive>(?P<repeated>[-/\\()!"+,&\'.])(?P=repeated)+)|'
+                          u'(?P<appendix_f>[\u0023-\u0025\u002A\u00A1-\u00A7\u00A9-\u00AE\u003A-\u003F\u007B-\u007E'
+                          u'\u0040\u005B\\\u005D-\u005F\u00B0-\u00B3\u00B5-\u00B7\u00B9-\u00BF\u0060\u00D7])')  # Appendix F
+only_punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')              # checks to see if the string contains only these punctuations
+numeric_only = re.compile('^([-/\\()\s,\'&.]*)([0-9]+)([-/\\()\s,\'&.]*)$')    # digits with at most -/() ,'&. around them
+
+def text_lint(Place, text):
+    """
+    # {'spaces': bool, 'consecutive': first repeated punctuation run or None, 'appendix_f': bool,
+    #  'only_punctuation': the match or None, 'numeric': bool} for one text, memoized per Place.
+    # Matched text is UTF-8 encoded, like the emits that quote it.
+    """
+    memo = place_facts(Place).setdefault('TextLint', {})
+    lint = memo.get(text)
+    if lint is None:
+        lint = {'spaces': False, 'consecutive': None, 'appendix_f': False}
+        found = 0
+        for match in lint_scanner.finditer(text):
+            rule = match.lastgroup
+            if rule == 'consecutive':
+                if lint['consecutive'] is None:
+                    lint['consecutive'] = match.group().encode('UTF-8')
+                    found += 1
+            elif not lint[rule]:
+                lint[rule] = True
+                found += 1
+            if found == 3:
+                break
+        match = only_punctuation.search(text)
+        lint['only_punctuation'] = match.group(0).encode('UTF-8') if match else None
+        lint['numeric'] = numeric_only.search(text) is not None
+        memo[text] = lint
+    return lint
+
+
 # BASIC_0020 ------------------------------------------------------
 def Basic_0020(Place):
     """
@@ -489,9 +544,8 @@ def Basic_0020(Place):
         BaseTextList = Place.findall(ns+"BaseText")
         for BaseText in BaseTextList:
             btext = BaseText.text
-            btext = btext.rstrip("\n")
-            if "  " in btext:       # Just looks for two consecutive blank spaces
-                print_btext = btext.replace("  ", "__")
+            if text_lint(Place, btext)['spaces']:       # Just looks for two consecutive blank spaces
+                print_btext = btext.rstrip("\n").replace("  ", "__")
                 print_btext = print_btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
                 emit_string = 'Basic_0020|'+CountryCode+'|'+PlaceId+'|Multiple consecutive spaces found in BaseText|'+print_btext
                 return_emits.append(emit_string)
@@ -510,27 +564,85 @@ def Basic_0022(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    consecutive_punctuation = re.compile('(([-/\\\\()!"+,&\'.])\\2+)')      # checks for consecutive punctuations
-    punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')                # checks to see if the string contains only these punctuations
     BaseTextList = Place.findall(ns+"BaseText")
     for BaseText in BaseTextList:
         btext = BaseText.text
-        btext = btext.encode('UTF-8')
-        consec = consecutive_punctuation.search(btext)
-        match = punctuation.search(btext)
-        btext = btext.rstrip("\n")
-        if consec or match:
+        lint = text_lint(Place, btext)
+        if lint['consecutive'] or lint['only_punctuation'] is not None:
+            btext = btext.encode('UTF-8').rstrip("\n")
             btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-            if consec:
-                result = consec.group(1)
+            if lint['consecutive']:
+                result = lint['consecutive']
                 emit_string = 'Basic_0022|'+CountryCode+'|'+PlaceId+'|Multiple consecutive punctuation found in BaseText|'+btext+'|'+result
             else:
-                result = match.group(0)
+                result = lint['only_punctuation']
                 emit_string = 'Basic_0022a|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in BaseText|'+btext+'|'+result
             return_emits.append(emit_string)
     return return_emits
 
 
+# Script checks ---------------------------------------------------
+# Basic_0029-0037 (BaseText) and Basic_0045/0046/0048 (StreetName/BaseName) flag texts written in a script that
+# their languageCode doesn't allow. Every text is classified once per Place (basetext_scripts / basename_scripts)
+# in a single regex pass over it: script_ranges is compiled into one character class group per script, so the
+# code point to script lookup runs in C and Python only sees the runs of non-Latin characters.
+script_ranges = [('Cyrillic', u'\u0400-\u0482\u0488-\u04FF'),
+                 ('Greek', u'\u0386-\u03F6'),
+                 ('Hebrew', u'\u05D0-\u05EA'),
+                 ('Arabic', u'\u0621-\u063A\u0640-\u064A\u066E-\u066F\u0671-\u06D3\u06EE-\u06EF\u06FA-\u06FF'),
+                 ('Thai', u'\u0E01-\u0E5B'),
+                 ('CJK', u'\u4E00-\u9FA5'),
+                 ('Korean', u'\u1100-\u11FF\u3130-\u318F\uA960-\uA97F\uAC00-\uD7FF'),
+                 ('Hindi', u'\u0900-\u097F'),
+                 ('Georgian', u'\u10A0-\u10FF')]
+script_names = [name for (name, ranges) in script_ranges]
+script_pattern = re.compile(u'|'.join(u'([%s]+)' % ranges for (name, ranges) in script_ranges))
+
+def text_scripts(text):
+    """ {script: its characters in text} for the scripts of script_ranges in text, i.e. {'Greek': u'\u0391\u03B8'} """
+    scripts = {}
+    for match in script_pattern.finditer(text):
+        script = script_names[match.lastindex - 1]
+        scripts[script] = scripts.get(script, u'') + match.group()
+    return scripts
+
+def basetext_script_emits(Place, v_id, script, languages, rstrip=False):
+    """ Emits for the BaseTexts with `script` characters whose languageCode is not one of `languages` """
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
+    return_emits = []
+    try:
+        for (btext, btext_lc, scripts) in basetext_scripts(Place):
+            if btext is None:
+                if rstrip or btext_lc not in languages:
+                    break                       # Where the character by character check used to stop
+                continue
+            if script in scripts and btext_lc not in languages:
+                if rstrip:
+                    btext = btext.rstrip("\n")
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = v_id+'|'+CountryCode+'|'+PlaceId+'|Invalid: '+script+' characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
+                return_emits.append(emit_string)
+    except:
+        pass
+    return return_emits
+
+def basename_script_emits(Place, v_id, script, languages):
+    """ Emits for the StreetName/BaseNames with `script` characters whose Parsed languageCode is not one of `languages` """
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
+    return_emits = []
+    try:
+        for (btext, Parsed_lc, scripts) in basename_scripts(Place):
+            if btext is not None and Parsed_lc != "None" and Parsed_lc not in languages and script in scripts:
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = v_id+'|'+CountryCode+'|'+PlaceId+'|Invalid: '+script+' characters found in StreetName/BaseName|'+btext+'|languageCode="'+Parsed_lc+'"'
+                return_emits.append(emit_string)
+    except:
+        pass
+    return return_emits
+
+
 # BASIC_0029 ------------------------------------------------------
 def Basic_0029(Place):
     """
@@ -540,30 +652,7 @@ def Basic_0029(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Cyrillic unicode range: \u0400-\u0482, \u0488-\u04FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext = btext.rstrip("\n")
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "bg" and btext_lc != "be" and btext_lc != "mk" and btext_lc != "ru" and btext_lc != "ro" \
-                and btext_lc != "sr" and btext_lc != "uk" and btext_lc != "bs" and btext_lc != "kk":
-                for char in btext:
-                    if re.match(ur'[\u0400-\u0482]+|[\u0488-\u04FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0029|'+CountryCode+'|'+PlaceId+'|Invalid: Cyrillic characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0029', 'Cyrillic', ("bg", "be", "mk", "ru", "ro", "sr", "uk", "bs", "kk"), rstrip=True)
 
 
 # BASIC_0030 ------------------------------------------------------
@@ -575,29 +664,7 @@ def Basic_0030(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Greek unicode range: \u0386-\u03F6
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext = btext.rstrip("\n")
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "el":
-                for char in btext:
-                    if re.match(ur'[\u0386-\u03F6]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0030|'+CountryCode+'|'+PlaceId+'|Invalid: Greek characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0030', 'Greek', ("el",), rstrip=True)
 
 
 
@@ -611,28 +678,7 @@ def Basic_0031(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Hebrew unicode range: \u05D0-\u05EA
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "he":
-                for char in btext:
-                    if re.match(ur'[\u05D0-\u05EA]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0031|'+CountryCode+'|'+PlaceId+'|Invalid: Hebrew characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0031', 'Hebrew', ("he",))
 
 
 # BASIC_0032 ------------------------------------------------------
@@ -644,28 +690,7 @@ def Basic_0032(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Arabic unicode ranges: \u0621-\u063A|\u0640-\u064A|\u066E-\u066F|\u0671-\u06D3|\u06EE-\u06EF|\u06FA-\u06FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "ar" and btext_lc != "ur":
-                for char in btext:
-                    if re.match(ur'[\u0621-\u063A]+|[\u0640-\u064A]+|[\u066E-\u066F]+|[\u0671-\u06D3]+|[\u06EE-\u06EF]+|[\u06FA-\u06FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0032|'+CountryCode+'|'+PlaceId+'|Invalid: Arabic characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0032', 'Arabic', ("ar", "ur"))
 
 
 # BASIC_0033 ------------------------------------------------------
@@ -677,28 +702,7 @@ def Basic_0033(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Thai unicode range: \u0E01-\u0E5B
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "th":
-                for char in btext:
-                    if re.match(ur'[\u0E01-\u0E5B]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0033|'+CountryCode+'|'+PlaceId+'|Invalid: Thai characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0033', 'Thai', ("th",))
 
 
 # BASIC_0034 ------------------------------------------------------
@@ -711,29 +715,7 @@ def Basic_0034(Place):
     # Chinese unicode range: \u4e00-\u9fa5
     # Japanese unicode ranges: \u3041-\u309f, \u30a0-\u30ff
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "zh" and btext_lc != "ja" and btext_lc != "ko" and btext_lc != "zh-Hant":
-                for char in btext:
-##                    if re.match(ur'[\u4e00-\u9fa5]+|[\u3041-\u309f]+|[\u30a0-\u30ff]+',char):
-                    if re.match(ur'[\u4e00-\u9fa5]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0034|'+CountryCode+'|'+PlaceId+'|Invalid: CJK characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0034', 'CJK', ("zh", "ja", "ko", "zh-Hant"))
 
 
 # BASIC_0035 ------------------------------------------------------
@@ -745,28 +727,7 @@ def Basic_0035(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Korean unicode ranges: \u1100-\u11FF, \u3130-\u318F, \uA960-\uA97F, \uAC00-\uD7FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "ko":
-                for char in btext:
-                    if re.match(ur'[\u1100-\u11FF]+|[\u3130-\u318F]+|[\uA960-\uA97F]+|[\uAC00-\uD7FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0035|'+CountryCode+'|'+PlaceId+'|Invalid: Korean characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0035', 'Korean', ("ko",))
 
 
 # BASIC_0036 ------------------------------------------------------
@@ -778,28 +739,7 @@ def Basic_0036(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Hindi unicode range: \u0900-\u097F
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "hi":
-                for char in btext:
-                    if re.match(ur'[\u0900-\u097F]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0036|'+CountryCode+'|'+PlaceId+'|Invalid: Hindi characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0036', 'Hindi', ("hi",))
 
 # BASIC_0037 ------------------------------------------------------
 def Basic_0037(Place):
@@ -810,28 +750,7 @@ def Basic_0037(Place):
     # xpath: PlaceList/Place/Content/Base/NameList/Name/TextList/Text/BaseText/@language_Code
     # Georgian unicode range: \u10A0-\u10FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        BaseTextList = Place.findall(ns+"BaseText")
-        for BaseText in BaseTextList:
-            btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            try:  # Get the languageCode
-                btext_lc = btext_attrib['languageCode']
-            except:
-                btext_lc = 'None'
-            if btext_lc != "ka":
-                for char in btext:
-                    if re.match(ur'[\u10A0-\u10FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0037|'+CountryCode+'|'+PlaceId+'|Invalid: Georgian characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basetext_script_emits(Place, 'Basic_0037', 'Georgian', ("ka",))
 
 
 # BASIC_0040 ------------------------------------------------------
@@ -844,22 +763,18 @@ def Basic_0040(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    consecutive_punctuation = re.compile('(([-/\\\\()!"+,&\'.])\\2+)')      # checks for consecutive punctuations
-    punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')                # checks to see if the string contains only these punctuations
     BaseNameList = Place.findall(ns+"BaseName")
     for BaseName in BaseNameList:
         btext = BaseName.text
-        btext = btext.encode('UTF-8')
-        consec = consecutive_punctuation.search(btext)
-        match = punctuation.search(btext)
-        btext = btext.rstrip("\n")
-        if consec or match:
+        lint = text_lint(Place, btext)
+        if lint['consecutive'] or lint['only_punctuation'] is not None:
+            btext = btext.encode('UTF-8').rstrip("\n")
             btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-            if consec:
-                result = consec.group(1)
+            if lint['consecutive']:
+                result = lint['consecutive']
                 emit_string = 'Basic_0040|'+CountryCode+'|'+PlaceId+'|Multiple consecutive punctuation found in StreetName/BaseName|'+btext+'|'+result
             else:
-                result = match.group(0)
+                result = lint['only_punctuation']
                 emit_string = 'Basic_0040a|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in StreetName/BaseName|'+btext+'|'+result
             return_emits.append(emit_string)
     return return_emits
@@ -879,13 +794,11 @@ def Basic_0041(Place):
         BaseNameList = Place.findall(ns+"BaseName")
         for BaseName in BaseNameList:
             btext = BaseName.text
-            for char in btext:
-                if re.match(ur'[\u0023-\u0025]+|[\u002A]+|[\u00A1-\u00A7]+|[\u00A9-\u00AE]+|[\u003A-\u003F]+|[\u007B-\u007E]+|[\u0040]+|[\u005B]+|[\u005D-\u005F]+|[\u00B0-\u00B3]+|[\u00B5-\u00B7]+|[\u00B9-\u00BF]+|[\u0060]+|[\u00D7]+',char):
-                    btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                    btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                    emit_string = 'Basic_0041|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in StreetName/BaseName|'+btext
-                    return_emits.append(emit_string)
-                    break
+            if text_lint(Place, btext)['appendix_f']:
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = 'Basic_0041|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in StreetName/BaseName|'+btext
+                return_emits.append(emit_string)
     except:
         pass
     return return_emits
@@ -901,34 +814,7 @@ def Basic_0045(Place):
     # xpath: PlaceList/Place/LocationList/Location/Address/ParsedList/Parsed/@languageCode
     # Cyrillic unicode range: \u0400-\u0482, \u0488-\u04FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        ParsedList = Place.findall(ns+"Parsed")
-        for Parsed in ParsedList:
-            Parsed_attrib = Parsed.attrib
-            try:    # Get the languageCode
-                Parsed_lc = Parsed_attrib['languageCode']
-            except:
-                Parsed_lc = 'None'
-            try:
-                BaseName = Parsed.find(ns+"BaseName")
-                btext = BaseName.text
-                btext = btext.rstrip("\n")
-            except:
-                BaseName = ""
-            if BaseName != "" and Parsed_lc != "bg" and Parsed_lc != "be" and Parsed_lc != "mk" and Parsed_lc != "ru" and Parsed_lc != "ro" \
-                and Parsed_lc != "sr" and Parsed_lc != "uk" and Parsed_lc != "bs" and Parsed_lc != "kk" and Parsed_lc != "None":
-                for char in btext:
-                    if re.match(ur'[\u0400-\u0482]+|[\u0488-\u04FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0045|'+CountryCode+'|'+PlaceId+'|Invalid: Cyrillic characters found in StreetName/BaseName|'+btext+'|languageCode="'+Parsed_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basename_script_emits(Place, 'Basic_0045', 'Cyrillic', ("bg", "be", "mk", "ru", "ro", "sr", "uk", "bs", "kk"))
 
 
 # BASIC_0046 ------------------------------------------------------
@@ -941,33 +827,7 @@ def Basic_0046(Place):
     # xpath: PlaceList/Place/LocationList/Location/Address/ParsedList/Parsed/@languageCode
     # Greek unicode range: \u0386-\u03F6
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        ParsedList = Place.findall(ns+"Parsed")
-        for Parsed in ParsedList:
-            Parsed_attrib = Parsed.attrib
-            try:    # Get the languageCode
-                Parsed_lc = Parsed_attrib['languageCode']
-            except:
-                Parsed_lc = 'None'
-            try:
-                BaseName = Parsed.find(ns+"BaseName")
-                btext = BaseName.text
-                btext = btext.rstrip("\n")
-            except:
-                BaseName = ""
-            if BaseName != "" and Parsed_lc != "el" and Parsed_lc != "None":
-                for char in btext:
-                    if re.match(ur'[\u0386-\u03F6]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0046|'+CountryCode+'|'+PlaceId+'|Invalid: Greek characters found in StreetName/BaseName|'+btext+'|languageCode="'+Parsed_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basename_script_emits(Place, 'Basic_0046', 'Greek', ("el",))
 
 
 # BASIC_0048 ------------------------------------------------------
@@ -980,33 +840,7 @@ def Basic_0048(Place):
     # xpath: PlaceList/Place/LocationList/Location/Address/ParsedList/Parsed/@languageCode
     # Arabic unicode ranges: \u0621-\u063A|\u0640-\u064A|\u066E-\u066F|\u0671-\u06D3|\u06EE-\u06EF|\u06FA-\u06FF
     """
-    CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    return_emits = []
-    try:
-        ParsedList = Place.findall(ns+"Parsed")
-        for Parsed in ParsedList:
-            Parsed_attrib = Parsed.attrib
-            try:    # Get the languageCode
-                Parsed_lc = Parsed_attrib['languageCode']
-            except:
-                Parsed_lc = 'None'
-            try:
-                BaseName = Parsed.find(ns+"BaseName")
-                btext = BaseName.text
-                btext = btext.rstrip("\n")
-            except:
-                BaseName = ""
-            if BaseName != "" and Parsed_lc != "ar" and Parsed_lc != "ur" and Parsed_lc != "None":
-                for char in btext:
-                    if re.match(ur'[\u0621-\u063A]+|[\u0640-\u064A]+|[\u066E-\u066F]+|[\u0671-\u06D3]+|[\u06EE-\u06EF]+|[\u06FA-\u06FF]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0048|'+CountryCode+'|'+PlaceId+'|Invalid: Arabic characters found in StreetName/BaseName|'+btext+'|languageCode="'+Parsed_lc+'"'
-                        return_emits.append(emit_string)
-                        break
-    except:
-        pass
-    return return_emits
+    return basename_script_emits(Place, 'Basic_0048', 'Arabic', ("ar", "ur"))
 
 # BASIC_0057 ------------------------------------------------------
 def Basic_0057(Place):
@@ -1018,21 +852,13 @@ def Basic_0057(Place):
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
     try:
-        ParsedList = Place.findall(ns+"Parsed")
-        for Parsed in ParsedList:
-            try:
-                StreetType = Parsed.find(ns+"StreetType")
-                btext = StreetType.text
-                btext = btext.rstrip("\n")
-            except:
-                btext = ""
-            for char in btext:
-                if re.match(ur'[\u0023-\u0025]+|[\u002A]+|[\u00A1-\u00A7]+|[\u00A9-\u00AE]+|[\u003A-\u003F]+|[\u007B-\u007E]+|[\u0040]+|[\u005B]+|[\u005D-\u005F]+|[\u00B0-\u00B3]+|[\u00B5-\u00B7]+|[\u00B9-\u00BF]+|[\u0060]+|[\u00D7]+',char):
-                    btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                    btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                    emit_string = 'Basic_0057|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in StreetName/StreetType|'+btext
-                    return_emits.append(emit_string)
-                    break
+        for fields in parsed_lint_fields(Place):
+            btext = fields["StreetType"]
+            if text_lint(Place, btext)['appendix_f']:
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = 'Basic_0057|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in StreetName/StreetType|'+btext
+                return_emits.append(emit_string)
     except:
         pass
     return return_emits
@@ -1048,22 +874,13 @@ def Basic_0087(Place):
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
     try:
-        ParsedList = Place.findall(ns+"Parsed")
-        for Parsed in ParsedList:
-            try:
-                Level3 = Parsed.find(ns+"Level3")
-                btext = Level3.text
-                btext = btext.rstrip("\n")
-            except:
-                btext = ""
-            if btext != "":
-                for char in btext:
-                    if re.match(ur'[\u0023-\u0025]+|[\u002A]+|[\u00A1-\u00A7]+|[\u00A9-\u00AE]+|[\u003A-\u003F]+|[\u007B-\u007E]+|[\u0040]+|[\u005B]+|[\u005D-\u005F]+|[\u00B0-\u00B3]+|[\u00B5-\u00B7]+|[\u00B9-\u00BF]+|[\u0060]+|[\u00D7]+',char):
-                        btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                        btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                        emit_string = 'Basic_0087|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level3|'+btext
-                        return_emits.append(emit_string)
-                        break
+        for fields in parsed_lint_fields(Place):
+            btext = fields["Level3"]
+            if btext != "" and text_lint(Place, btext)['appendix_f']:
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = 'Basic_0087|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level3|'+btext
+                return_emits.append(emit_string)
     except:
         pass
     return return_emits
@@ -1078,27 +895,18 @@ def Basic_0101(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    consecutive_punctuation = re.compile('(([-/\\\\()!"+,&\'.])\\2+)')      # checks for consecutive punctuations
-    punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')                # checks to see if the string contains only these punctuations
-    ParsedList = Place.findall(ns+"Parsed")
-    for Parsed in ParsedList:
-        try:
-            Level4 = Parsed.find(ns+"Level4")
-            btext = Level4.text
-            btext = btext.rstrip("\n")
-        except:
-            btext = ""
+    for fields in parsed_lint_fields(Place):
+        btext = fields["Level4"]
         if btext != "":
-            btext = btext.encode('UTF-8')
-            consec = consecutive_punctuation.search(btext)
-            match = punctuation.search(btext)
-            if consec or match:
+            lint = text_lint(Place, btext)
+            if lint['consecutive'] or lint['only_punctuation'] is not None:
+                btext = btext.encode('UTF-8')
                 btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                if consec:
-                    result = consec.group(1)
+                if lint['consecutive']:
+                    result = lint['consecutive']
                     emit_string = 'Basic_0101|'+CountryCode+'|'+PlaceId+'|Multiple consecutive punctuation found in AdminLevel/Level4|'+btext+'|'+result
                 else:
-                    result = match.group(0)
+                    result = lint['only_punctuation']
                     emit_string = 'Basic_0101a|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level4|'+btext+'|'+result
                 return_emits.append(emit_string)
     return return_emits
@@ -1115,22 +923,13 @@ def Basic_0104(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    pattern = re.compile('^([-/\\()\s,\'&.]*)([0-9]+)([-/\\()\s,\'&.]*)$')
-    ParsedList = Place.findall(ns+"Parsed")
-    for Parsed in ParsedList:
-        try:
-            Level4 = Parsed.find(ns+"Level4")
-            btext = Level4.text
-            btext = btext.rstrip("\n")
-        except:
-            btext = ""
-        if btext != "":
+    for fields in parsed_lint_fields(Place):
+        btext = fields["Level4"]
+        if btext != "" and text_lint(Place, btext)['numeric']:
             btext = btext.encode('UTF-8')
-            match = pattern.search(btext)
-            if match:
-                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                emit_string = 'Basic_0104|'+CountryCode+'|'+PlaceId+'|Invalid numeric value found in AdminLevel/Level4|'+btext
-                return_emits.append(emit_string)
+            btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+            emit_string = 'Basic_0104|'+CountryCode+'|'+PlaceId+'|Invalid numeric value found in AdminLevel/Level4|'+btext
+            return_emits.append(emit_string)
     return return_emits
 
 
@@ -1145,27 +944,18 @@ def Basic_0116(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    consecutive_punctuation = re.compile('(([-/\\\\()!"+,&\'.])\\2+)')      # checks for consecutive punctuations
-    punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')                # checks to see if the string contains only these punctuations
-    ParsedList = Place.findall(ns+"Parsed")
-    for Parsed in ParsedList:
-        try:
-            Level5 = Parsed.find(ns+"Level5")
-            btext = Level5.text
-            btext = btext.rstrip("\n")
-        except:
-            btext = ""
+    for fields in parsed_lint_fields(Place):
+        btext = fields["Level5"]
         if btext != "":
-            btext = btext.encode('UTF-8')
-            consec = consecutive_punctuation.search(btext)
-            match = punctuation.search(btext)
-            if consec or match:
+            lint = text_lint(Place, btext)
+            if lint['consecutive'] or lint['only_punctuation'] is not None:
+                btext = btext.encode('UTF-8')
                 btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                if consec:
-                    result = consec.group(1)
+                if lint['consecutive']:
+                    result = lint['consecutive']
                     emit_string = 'Basic_0116|'+CountryCode+'|'+PlaceId+'|Multiple consecutive punctuation found in AdminLevel/Level5|'+btext+'|'+result
                 else:
-                    result = match.group(0)
+                    result = lint['only_punctuation']
                     emit_string = 'Basic_0116a|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level5|'+btext+'|'+result
                 return_emits.append(emit_string)
     return return_emits
@@ -1179,25 +969,55 @@ def Basic_0117(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    ParsedList = Place.findall(ns+"Parsed")
-    for Parsed in ParsedList:
-        try:
-            Level5 = Parsed.find(ns+"Level5")
-            btext = Level5.text
-            btext = btext.rstrip("\n")
-        except:
-            btext = ""
-        if btext != "":
-            for char in btext:
-                if re.match(ur'[\u0023-\u0025]+|[\u002A]+|[\u00A1-\u00A7]+|[\u00A9-\u00AE]+|[\u003A-\u003F]+|[\u007B-\u007E]+|[\u0040]+|[\u005B]+|[\u005D-\u005F]+|[\u00B0-\u00B3]+|[\u00B5-\u00B7]+|[\u00B9-\u00BF]+|[\u0060]+|[\u00D7]+',char):
-                    btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                    btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                    emit_string = 'Basic_0117|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level5|'+btext
-                    return_emits.append(emit_string)
-                    break
+    for fields in parsed_lint_fields(Place):
+        btext = fields["Level5"]
+        if btext != "" and text_lint(Place, btext)['appendix_f']:
+            btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+            btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+            emit_string = 'Basic_0117|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in AdminLevel/Level5|'+btext
+            return_emits.append(emit_string)
     return return_emits
 
 
+# Contact checks --------------------------------------------------
+# Basic_0135, 0144, 0145, 0147 and TQS_0010, 0011, 0012 read the Contacts of a Place from one classification
+# (contact_list): each Contact is parsed once and its ContactString is tagged as a well-formed email address
+# and/or a well-formed phone/fax number with the patterns below, compiled once per task. URLs are the Contacts
+# of type URL.
+# Apparently, new TLDs (Top Level Domains, such as .com, .net, .org, etc..) are going to be allowed up to 63 chars long!
+email_pattern = re.compile('^(?![a-zA-Z0-9._\-@]*[.-]{2,}[a-zA-Z0-9._\-@]*$)([a-zA-Z0-9._-])*([a-zA-Z0-9]@[a-zA-Z0-9])([a-zA-Z0-9.-])*([a-zA-Z0-9]?\.[a-zA-Z]{2,63})$')
+# Allows numbers to contain digits, spaces, and dashes, but not double dash, double space, or back to back dash and space
+number_pattern = re.compile('^[0-9]+(?:[ -][0-9]+)*$')
+
+def classify_contact(Contact):
+    """
+    # {'type': the type attribute or None, 'text': the ContactString text, 'value': the text UTF-8 encoded and
+    #  stripped, 'emails': [(address, well formed), ...] split at ';', 'number': well formed number,
+    #  'url': a Contact of type URL with a ContactString}
+    # 'text' and 'value' are None (and the tags empty or False) when the Contact has no ContactString text.
+    """
+    ContactString = find_tag(Contact, "ContactString")
+    text = None if ContactString is None else ContactString.text
+    contact = {'type': Contact.get('type'), 'text': text, 'value': None, 'emails': [], 'number': False, 'url': False}
+    if text is not None:
+        value = text.encode('UTF-8').strip()
+        contact['value'] = value
+        contact['emails'] = [(address, '@' in address and email_pattern.search(address) is not None)
+                             for address in value.split(';')]
+        contact['number'] = number_pattern.search(value) is not None
+        contact['url'] = contact['type'] == "URL" and value != ''
+    return contact
+
+def contact_value(contact):
+    """
+    # The stripped ContactString text of a classified Contact. A Contact without one raises ValueError, which
+    # stops the validations of the Place, as reading the missing text always did in the checks below.
+    """
+    if contact['value'] is None:
+        raise ValueError("%s Contact without ContactString text" % contact['type'])
+    return contact['value']
+
+
 # BASIC_0135 ------------------------------------------------------
 def Basic_0135(Place):
     """
@@ -1208,25 +1028,11 @@ def Basic_0135(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    # Apparently, new TLDs (Top Level Domains, such as .com, .net, .org, etc..) are going to be allowed up to 63 chars long!
-    pattern = re.compile('^(?![a-zA-Z0-9._\-@]*[.-]{2,}[a-zA-Z0-9._\-@]*$)([a-zA-Z0-9._-])*([a-zA-Z0-9]@[a-zA-Z0-9])([a-zA-Z0-9.-])*([a-zA-Z0-9]?\.[a-zA-Z]{2,63})$')
-    ContactList = Place.findall(ns+"Contact")
-    for Contact in ContactList:
-        ContactAttributes = Contact.attrib
-        if 'type' in ContactAttributes.keys() and ContactAttributes['type'] == "EMAIL":
-            email_address = Contact.find(ns+"ContactString").text
-            email_address = email_address.encode('UTF-8')
-            email_address = email_address.strip()
-            if ';' in email_address:
-                ea_list = email_address.split(';')
-                for email_address in ea_list:
-                    match = pattern.search(email_address)
-                    if not match:
-                        emit_string = 'Basic_0135|'+CountryCode+'|'+PlaceId+'|Invalid email address|'+email_address
-                        return_emits.append(emit_string)
-            else:
-                match = pattern.search(email_address)
-                if not match:
+    for contact in contact_list(Place):
+        if contact['type'] == "EMAIL":
+            contact_value(contact)
+            for (email_address, valid) in contact['emails']:
+                if not valid:
                     emit_string = 'Basic_0135|'+CountryCode+'|'+PlaceId+'|Invalid email address|'+email_address
                     return_emits.append(emit_string)
     return return_emits
@@ -1242,17 +1048,10 @@ def Basic_0144(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    # Allows Fax numbers to contain digits, spaces, and dashes, but not double dash, double space, or back to back dash and space
-    pattern = re.compile('^[0-9]+(?:[ -][0-9]+)*$')
-    ContactList = Place.findall(ns+"Contact")
-    for Contact in ContactList:
-        ContactAttributes = Contact.attrib
-        if 'type' in ContactAttributes.keys() and ContactAttributes['type'] == "FAX":
-            fax_number = Contact.find(ns+"ContactString").text
-            fax_number = fax_number.encode('UTF-8')
-            fax_number = fax_number.strip()
-            match = pattern.search(fax_number)
-            if not match:
+    for contact in contact_list(Place):
+        if contact['type'] == "FAX":
+            fax_number = contact_value(contact)
+            if not contact['number']:
                 emit_string = 'Basic_0144|'+CountryCode+'|'+PlaceId+'|Invalid FAX number|'+fax_number
                 return_emits.append(emit_string)
     return return_emits
@@ -1266,13 +1065,9 @@ def Basic_0145(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    ContactList = Place.findall(ns+"Contact")
-    for Contact in ContactList:
-        ContactAttributes = Contact.attrib
-        if 'type' in ContactAttributes.keys() and ContactAttributes['type'] == "FAX":
-            fax_number = Contact.find(ns+"ContactString").text
-            fax_number = fax_number.encode('UTF-8')
-            fax_number = fax_number.strip()
+    for contact in contact_list(Place):
+        if contact['type'] == "FAX":
+            fax_number = contact_value(contact)
             fax_len = len(fax_number)
             if (fax_len < 5 or fax_len > 11) and (CountryCode != 'AUT' and CountryCode != 'DEU'):
                 emit_string = 'Basic_0145|'+CountryCode+'|'+PlaceId+'|Length of FAX value should be between 5 and 11 digits.|'+str(fax_len)+'|'+fax_number
@@ -1290,17 +1085,10 @@ def Basic_0147(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    # Allows numbers to contain digits, spaces, and dashes, but not double dash, double space, or back to back dash and space
-    pattern = re.compile('^[0-9]+(?:[ -][0-9]+)*$')
-    ContactList = Place.findall(ns+"Contact")
-    for Contact in ContactList:
-        ContactAttributes = Contact.attrib
-        if 'type' in ContactAttributes.keys() and ContactAttributes['type'] == "MOBILE":
-            mobile_number = Contact.find(ns+"ContactString").text
-            mobile_number = mobile_number.encode('UTF-8')
-            mobile_number = mobile_number.strip()
-            match = pattern.search(mobile_number)
-            if not match:
+    for contact in contact_list(Place):
+        if contact['type'] == "MOBILE":
+            mobile_number = contact_value(contact)
+            if not contact['number']:
                 emit_string = 'Basic_0147|'+CountryCode+'|'+PlaceId+'|Invalid MOBILE number|'+mobile_number
                 return_emits.append(emit_string)
     return return_emits
@@ -1349,13 +1137,13 @@ def GEO_0001 (Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    if CountryCode == "ITA":    # Target results for just this one country
+    if CountryCode == "ITA":    # Target results for just this one country (see validation_prefilters)
         LocationList = Place.findall(ns+"Location")
         for Location in LocationList:
             LocationAttributes = Location.attrib
             if 'primary' in LocationAttributes.keys():
                 primary_TF = LocationAttributes['primary']
-            Link = Location.find(ns+"Link")
+            Link = find_tag(Location, "Link")
             LinkAttributes = Link.attrib
             if 'linkPvid' in LinkAttributes.keys():
                 LinkPvid = LinkAttributes['linkPvid']
@@ -1364,8 +1152,8 @@ def GEO_0001 (Place):
                 GeoPositionAttributes = GeoPosition.attrib
                 if 'type' in GeoPositionAttributes.keys():
                     Routing_Display = GeoPositionAttributes['type']
-                Longitude = GeoPosition.find(ns+"Longitude")
-                Latitude = GeoPosition.find(ns+"Latitude")
+                Longitude = find_tag(GeoPosition, "Longitude")
+                Latitude = find_tag(GeoPosition, "Latitude")
                 try:
                     Long = str(Longitude.text)
                     LAT = str(Latitude.text)
@@ -1399,15 +1187,7 @@ def GEO_0002 (Place):
         state = Place.find(ns+"Level2").text                # Gets the last Level2 value in the Place. Assumes all level2 in the Places are the same
     except:
         state = "None"
-    CategoryNameList = []
-    CategoryNames = Place.findall(ns+"CategoryName")
-    for Category in CategoryNames:
-        Name = Category.find(ns+"Text").text
-        CategoryNameList.append(Name)
-    try:
-        FirstCategory = CategoryNameList[0]
-    except:
-        FirstCategory = "None"
+    FirstCategory = first_category(Place)
 
     ExternalReferenceList = Place.findall(ns+"ExternalReference")
     ExternalRefSystem = ""
@@ -1418,34 +1198,34 @@ def GEO_0002 (Place):
 
     return_emits = []
 ##    if CountryCode == "USA" and (state == "CA" or state == "California"):
-    if CountryCode == "USA":
+    if CountryCode == "USA":    # Target results for just this one country (see validation_prefilters)
         LocationList = Place.findall(ns+"Location")
         for Location in LocationList:
             try:
-                StreetName = Location.find(ns+"BaseName").text
+                StreetName = find_tag(Location, "BaseName").text
             except:
                 StreetName = "None"
             try:
-                county = Location.find(ns+"Level3").text
+                county = find_tag(Location, "Level3").text
             except:
                 county = "None"
             try:
-                city = Location.find(ns+"Level4").text
+                city = find_tag(Location, "Level4").text
             except:
                 city = "None"
             try:
-                PostalCode = Location.find(ns+"PostalCode").text
+                PostalCode = find_tag(Location, "PostalCode").text
             except:
                 PostalCode = "None"
             try:
-                address = Location.find(ns+"HouseNumber").text
+                address = find_tag(Location, "HouseNumber").text
             except:
                 address = "None"
             try:
-                StreetType = Location.find(ns+"StreetType").text
+                StreetType = find_tag(Location, "StreetType").text
             except:
                 StreetType = "None"
-            Link = Location.find(ns+"Link")
+            Link = find_tag(Location, "Link")
             LinkAttributes = Link.attrib
             if 'linkPvid' in LinkAttributes.keys():
                 LinkPvid = LinkAttributes['linkPvid']
@@ -1454,8 +1234,8 @@ def GEO_0002 (Place):
                 GeoPositionAttributes = GeoPosition.attrib
                 if 'type' in GeoPositionAttributes.keys():
                     Routing_Display = GeoPositionAttributes['type']
-                Longitude = GeoPosition.find(ns+"Longitude")
-                Latitude = GeoPosition.find(ns+"Latitude")
+                Longitude = find_tag(GeoPosition, "Longitude")
+                Latitude = find_tag(GeoPosition, "Latitude")
                 if Routing_Display == "ROUTING" and ExternalRefSystem != "corepoixml":      # ROUTING and NON-core
                     try:
                         ROUTING_LONG = str(Longitude.text)
@@ -1491,15 +1271,7 @@ def GEO_0003 (Place):
     # <ExternalReferenceID type="SUPPLIER_POIID">400954855</ExternalReferenceID>
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
-    CategoryNameList = []
-    CategoryNames = Place.findall(ns+"CategoryName")
-    for Category in CategoryNames:
-        Name = Category.find(ns+"Text").text
-        CategoryNameList.append(Name)
-    try:
-        FirstCategory = CategoryNameList[0]
-    except:
-        FirstCategory = "None"
+    FirstCategory = first_category(Place)
 
     ExternalReferenceList = Place.findall(ns+"ExternalReference")
     ExternalRefSystem = ""
@@ -1508,7 +1280,7 @@ def GEO_0003 (Place):
         ExternalRefattrib = ExternalReference.attrib
         if 'system' in ExternalRefattrib.keys():
             ExternalRefSystem = ExternalRefattrib['system']
-        ExternalReferenceID = ExternalReference.find(ns+"ExternalReferenceID")
+        ExternalReferenceID = find_tag(ExternalReference, "ExternalReferenceID")
         ExternalReferenceID_attrib = ExternalReferenceID.attrib
         if 'type' in ExternalReferenceID_attrib.keys():
             ExternalReftype = ExternalReferenceID_attrib['type']
@@ -1523,11 +1295,11 @@ def GEO_0003 (Place):
         if 'supplier' in LocationAttributes.keys():
             Location_supplier_value = LocationAttributes['supplier']
         try:
-            POIName = Location.find(ns+"BaseText").text
+            POIName = find_tag(Location, "BaseText").text
         except:
             POIName = "None"
 
-        Link = Location.find(ns+"Link")
+        Link = find_tag(Location, "Link")
         LinkAttributes = Link.attrib
         if 'linkPvid' in LinkAttributes.keys():
             LinkPvid = LinkAttributes['linkPvid']
@@ -1536,8 +1308,8 @@ def GEO_0003 (Place):
             GeoPositionAttributes = GeoPosition.attrib
             if 'type' in GeoPositionAttributes.keys():
                 Routing_Display = GeoPositionAttributes['type']
-            Longitude = GeoPosition.find(ns+"Longitude")
-            Latitude = GeoPosition.find(ns+"Latitude")
+            Longitude = find_tag(GeoPosition, "Longitude")
+            Latitude = find_tag(GeoPosition, "Latitude")
 
             if Routing_Display == "ROUTING" and ExternalRefSystem == "corepoixml" and POI_PVID and Location_supplier_value == "NOKIA_GEOCODER":
                 try:
@@ -1569,25 +1341,17 @@ def GEO_0004 (Place):
     return_emits = []
 
     # Get category
-    CategoryNameList = []
-    CategoryNames = Place.findall(ns+"CategoryName")
-    for Category in CategoryNames:
-        Name = Category.find(ns+"Text").text
-        CategoryNameList.append(Name)
-    try:
-        FirstCategory = CategoryNameList[0]
-    except:
-        FirstCategory = "None"
+    FirstCategory = first_category(Place)
 
     # Get POIName, linkPvid and lat/longs
     LocationList = Place.findall(ns+"Location")
     for Location in LocationList:
         LocationAttributes = Location.attrib
         try:
-            POIName = Location.find(ns+"BaseText").text
+            POIName = find_tag(Location, "BaseText").text
         except:
             POIName = "None"
-        Link = Location.find(ns+"Link")
+        Link = find_tag(Location, "Link")
         LinkAttributes = Link.attrib
         if 'linkPvid' in LinkAttributes.keys():
             LinkPvid = LinkAttributes['linkPvid']
@@ -1596,8 +1360,8 @@ def GEO_0004 (Place):
             GeoPositionAttributes = GeoPosition.attrib
             if 'type' in GeoPositionAttributes.keys():
                 Routing_Display = GeoPositionAttributes['type']
-            Longitude = GeoPosition.find(ns+"Longitude")
-            Latitude = GeoPosition.find(ns+"Latitude")
+            Longitude = find_tag(GeoPosition, "Longitude")
+            Latitude = find_tag(GeoPosition, "Latitude")
             if Routing_Display == "ROUTING":
                 try:
                     Long = str(Longitude.text)
@@ -1624,24 +1388,16 @@ def GEO_0005 (Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    if CountryCode == "CAN":    # Target results for just this one country
+    if CountryCode == "CAN":    # Target results for just this one country (see validation_prefilters)
         # Get category
-        CategoryNameList = []
-        CategoryNames = Place.findall(ns+"CategoryName")
-        for Category in CategoryNames:
-            Name = Category.find(ns+"Text").text
-            CategoryNameList.append(Name)
-        try:
-            FirstCategory = CategoryNameList[0]
-        except:
-            FirstCategory = "None"
+        FirstCategory = first_category(Place)
         # Get POIName, linkPvid and lat/longs
         BaseTextList = Place.findall(ns+"BaseText")
         BaseText = BaseTextList[0]      # The first name
         POIName = BaseText.text
         LocationList = Place.findall(ns+"Location")
         for Location in LocationList:
-            Link = Location.find(ns+"Link")
+            Link = find_tag(Location, "Link")
             LinkAttributes = Link.attrib
             if 'linkPvid' in LinkAttributes.keys():
                 LinkPvid = LinkAttributes['linkPvid']
@@ -1666,8 +1422,8 @@ def GEO_0005 (Place):
                 GeoPositionAttributes = GeoPosition.attrib
                 if 'type' in GeoPositionAttributes.keys():
                     Routing_Display = GeoPositionAttributes['type']
-                Longitude = GeoPosition.find(ns+"Longitude")
-                Latitude = GeoPosition.find(ns+"Latitude")
+                Longitude = find_tag(GeoPosition, "Longitude")
+                Latitude = find_tag(GeoPosition, "Latitude")
                 if Routing_Display == "ROUTING":
                     try:
                         Long = str(Longitude.text)
@@ -1690,10 +1446,7 @@ def Stats_0001(Place):
     """
     # Count Places per CountryCode
     """
-    try:
-        CountryCode = Place.find(ns+"CountryCode").text
-    except:
-        CountryCode = 'None'
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
     emit_string = 'Stats_0001|'+CountryCode
     return emit_string
 
@@ -1703,10 +1456,7 @@ def Stats_0002(Place):
     """
     # Count Locations per CountryCode
     """
-    try:
-        CountryCode = Place.find(ns+"CountryCode").text
-    except:
-        CountryCode = 'None'
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
     LocationList = Place.findall(ns+"Location")
     return_emits = []
     for Location in LocationList:
@@ -1734,10 +1484,7 @@ def Stats_0004(Place):
     """
     # CategoryId per CountryCode
     """
-    try:
-        CountryCode = Place.find(ns+"CountryCode").text
-    except:
-        CountryCode = 'None'
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
     CategoryIdList = Place.findall(ns+"CategoryId")
     return_emits = []
     for CategoryId in CategoryIdList:
@@ -1755,10 +1502,7 @@ def Stats_0005(Place):
     xpath: PlaceList/Place/LocationList/Location(@primary) and
     xpath: PlaceList/Place/LocationList/Location(@supplier)
     """
-    try:
-        CountryCode = Place.find(ns+"CountryCode").text
-    except:
-        CountryCode = 'None'
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
     LocationList = Place.findall(ns+"Location")
     return_emits = []
     for Location in LocationList:
@@ -1778,6 +1522,59 @@ def Stats_0005(Place):
     return return_emits
 
 
+# STATS_0006 ------------------------------------------------------
+def Stats_0006(Place):
+    """
+    # Distinct PlaceIds per CountryCode (HyperLogLog estimate, see validation_aggregations)
+    # Output:           Stats_0006|USA	1523877|+/-12343
+    """
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
+    return ('Stats_0006|'+CountryCode, PlaceId)
+
+
+# STATS_0007 ------------------------------------------------------
+def Stats_0007(Place):
+    """
+    # Distinct ChainIds per CountryCode (HyperLogLog estimate)
+    xpath: PlaceList/Place/Content/Base/ChainList/Chain/Id
+    """
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
+    return_emits = []
+    for Chain in Place.findall(ns+"Chain"):
+        ChainId = find_tag(Chain, "Id")
+        if ChainId is not None and ChainId.text:
+            return_emits.append(('Stats_0007|'+CountryCode, ChainId.text))
+    return return_emits
+
+
+# STATS_0008 ------------------------------------------------------
+def Stats_0008(Place):
+    """
+    # Distinct ExternalReference "system" combinations (as in New_0014b) for Core and Non-Core POIs (HyperLogLog estimate)
+    """
+    system_set = set()
+    for ExternalReference in Place.findall(ns+"ExternalReference"):
+        ExternalRefattrib = ExternalReference.attrib
+        if 'system' in ExternalRefattrib.keys():
+            system_set.add(ExternalRefattrib['system'])
+    return ('Stats_0008|'+core_or_non_core(Place), ' '.join(sorted(system_set)))
+
+
+# STATS_0009 ------------------------------------------------------
+def Stats_0009(Place):
+    """
+    # Distinct linkPvids per CountryCode (HyperLogLog estimate)
+    xpath: PlaceList/Place/LocationList/Location/Link(@linkPvid)
+    """
+    CountryCode, PlaceId = CountryCode_PlaceID(Place)
+    return_emits = []
+    for Location in Place.findall(ns+"Location"):
+        Link = find_tag(Location, "Link")
+        if Link is not None and 'linkPvid' in Link.attrib:
+            return_emits.append(('Stats_0009|'+CountryCode, Link.attrib['linkPvid']))
+    return return_emits
+
+
 # New_0001 ------------------------------------------------------
 def New_0001(Place):
     """
@@ -1787,7 +1584,7 @@ def New_0001(Place):
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     ContactStrings = Place.findall(ns+"ContactString")
     for ContactString in ContactStrings:
-        if CountryCode == "USA":
+        if CountryCode == "USA":    # (see validation_prefilters)
             emit_string = 'New_0001|'+CountryCode+'|'+PlaceId+'|'+ContactString.text
             return emit_string
 
@@ -1827,13 +1624,15 @@ def New_0003(Place):
 
 
 # New_0004 ------------------------------------------------------
+# The Place_ID and country searched by New_0004 and New_0005 (their prefilters use these too)
+PlaceID_to_search = '276u33dc-915a1c96ef2b44deb456109cd81ecb50'
+##PlaceID_to_search = '442u0ue6-1ce317a5b64947ea8fcf959ca31a7773'
+Country_to_search = 'DEU'
+
 def New_0004(Place):
     """
     # Look up a Place_ID to see if it is in a given country
     """
-    PlaceID_to_search = '276u33dc-915a1c96ef2b44deb456109cd81ecb50'
-##    PlaceID_to_search = '442u0ue6-1ce317a5b64947ea8fcf959ca31a7773'
-    Country_to_search = 'DEU'
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     if CountryCode == Country_to_search:    # Target results for just this one country
         if PlaceID_to_search == PlaceId:
@@ -1847,9 +1646,6 @@ def New_0005(Place):
     # Look up a Place_ID to see if it is in a given country,
     and return ALL of the Category names and IDs as well
     """
-    PlaceID_to_search = '276u33dc-915a1c96ef2b44deb456109cd81ecb50'
-##    PlaceID_to_search = '442u0ue6-1ce317a5b64947ea8fcf959ca31a7773'
-    Country_to_search = 'DEU'
     return_emits = []
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     if CountryCode == Country_to_search:    # Target results for just this one country
@@ -1864,7 +1660,7 @@ def New_0005(Place):
                 except:
                     CategoryID = "None"
                 try:
-                    CategoryName = CategoryNames[x].find(ns+"Text").text
+                    CategoryName = find_tag(CategoryNames[x], "Text").text
                 except:
                     CategoryName = "None"
                 emit_string = 'New_0005|'+CountryCode+'|'+PlaceId+'|'+CategoryID+'|'+CategoryName
@@ -1874,26 +1670,106 @@ def New_0005(Place):
 
 
 # New_0006 ------------------------------------------------------
+class AhoCorasick(object):
+    """
+    # Multi-pattern string matcher: the patterns in a trie with failure links, compiled into a full transition table,
+    # so one pass over a text finds every occurrence of every pattern with one dict lookup per character.
+    """
+    def __init__(self, patterns):
+        (goto, output) = ([{}], [[]])
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in goto[state]:
+                    goto[state][ch] = len(goto)
+                    goto.append({})
+                    output.append([])
+                state = goto[state][ch]
+            output[state].append((len(pattern), index))
+        # Breadth first, so a state's failure state (its longest proper suffix in the trie) is done before it
+        (fail, order) = ([0] * len(goto), list(goto[0].values()))
+        for state in order:
+            for ch, child in goto[state].iteritems():
+                order.append(child)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(ch, 0)
+                output[child] = output[child] + output[fail[child]]
+        self.delta = [dict(row) for row in goto]
+        for state in order:                     # Parents first: fill in the transitions through the failure links
+            row = self.delta[state]
+            for ch, target in self.delta[fail[state]].iteritems():
+                row.setdefault(ch, target)
+        self.output = output
+
+    def find(self, text):
+        """ (start, end, pattern index) of every match in text """
+        (delta, output, state, matches) = (self.delta, self.output, 0, [])
+        for end, ch in enumerate(text, 1):
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                matches.extend((end - length, end, index) for (length, index) in output[state])
+        return matches
+
+
+def word_char(ch):
+    return ch.isalnum() or ch == '_'            # \w (re.UNICODE)
+
+profanity_list = ['2g1c', '2 girls 1 cup', 'acrotomophilia', 'anal', 'anilingus', 'anus', 'arsehole', 'ass', 'asshole', 'assmunch', 'auto erotic', 'autoerotic', 'babeland', 'baby batter', 'ball gag', 'ball gravy', 'ball kicking', 'ball licking', 'ball sack', 'ball sucking', 'bangbros', 'bareback', 'barely legal', 'barenaked', 'bastardo', 'bastinado', 'bbw', 'bdsm', 'beaver cleaver', 'beaver lips', 'bestiality', 'bi curious', 'big black', 'big breasts', 'big knockers', 'big tits', 'bimbos', 'birdlock', 'bitch', 'black cock', 'blonde action', 'blonde on blonde action', 'blow j', 'blow your l', 'blue waffle', 'blumpkin', 'bollocks', 'bondage', 'boner', 'boob', 'boobs', 'booty call', 'brown showers', 'brunette action', 'bukkake', 'bulldyke', 'bullet vibe', 'bung hole', 'bunghole', 'busty', 'butt', 'buttcheeks', 'butthole', 'camel toe', 'camgirl', 'camslut', 'camwhore', 'carpet muncher', 'carpetmuncher', 'chocolate rosebuds', 'circlejerk', 'cleveland steamer', 'clit', 'clitoris', 'clover clamps', 'clusterfuck', 'cock', 'cocks', 'coprolagnia', 'coprophilia', 'cornhole', 'cum', 'cumming', 'cunnilingus', 'cunt', 'darkie', 'date rape', 'daterape', 'deep throat', 'deepthroat', 'dick', 'dildo', 'dirty pillows', 'dirty sanchez', 'dog style', 'doggie style', 'doggiestyle', 'doggy style', 'doggystyle', 'dolcett', 'domination', 'dominatrix', 'dommes', 'donkey punch', 'double dong', 'double penetration', 'dp action', 'eat my ass', 'ecchi', 'ejaculation', 'erotic', 'erotism', 'escort', 'ethical slut', 'eunuch', 'faggot', 'fecal', 'felch', 'fellatio', 'feltch', 'female squirting', 'femdom', 'figging', 'fingering', 'fisting', 'foot fetish', 'footjob', 'frotting', 'fuck', 'fucking', 'fuck buttons', 'fudge packer', 'fudgepacker', 'futanari', 'g-spot', 'gang bang', 'gay sex', 'genitals', 'giant cock', 'girl on', 'girl on top', 'girls gone wild', 'goatcx', 'goatse', 'gokkun', 'golden shower', 'goo girl', 'goodpoop', 'goregasm', 'grope', 'group sex', 'guro', 'hand job', 'handjob', 'hard core', 'hardcore', 'hentai', 'homoerotic', 'honkey', 'hooker', 'hot chick', 'how to kill', 'how to murder', 'huge fat', 'humping', 'incest', 'intercourse', 'jack off', 'jail bait', 'jailbait', 'jerk off', 'jigaboo', 'jiggaboo', 'jiggerboo', 'jizz', 'juggs', 'kike', 'kinbaku', 'kinkster', 'kinky', 'knobbing', 'leather restraint', 'leather straight jacket', 'lemon party', 'lolita', 'lovemaking', 'make me come', 'male squirting', 'masturbate', 'menage a trois', 'milf', 'missionary position', 'motherfucker', 'mound of venus', 'mr hands', 'muff diver', 'muffdiving', 'nambla', 'nawashi', 'negro', 'neonazi', 'nig nog', 'nigga', 'nigger', 'nimphomania', 'nipple', 'nipples', 'nsfw images', 'nude', 'nudity', 'nympho', 'nymphomania', 'octopussy', 'omorashi', 'one cup two girls', 'one guy one jar', 'orgasm', 'orgy', 'paedophile', 'panties', 'panty', 'pedobear', 'pedophile', 'pegging', 'penis', 'phone sex', 'piece of shit', 'piss pig', 'pissing', 'pisspig', 'playboy', 'pleasure chest', 'pole smoker', 'ponyplay', 'poof', 'poop chute', 'poopchute', 'porn', 'porno', 'pornography', 'prince albert piercing', 'pthc', 'pubes', 'pussy', 'queaf', 'raghead', 'raging boner', 'rape', 'raping', 'rapist', 'rectum', 'reverse cowgirl', 'rimjob', 'rimming', 'rosy palm', 'rosy palm and her 5 sisters', 'rusty trombone', 's&m', 'sadism', 'scat', 'schlong', 'scissoring', 'semen', 'sex', 'sexo', 'sexy', 'shaved beaver', 'shaved pussy', 'shemale', 'shibari', 'shit', 'shota', 'shrimping', 'slanteye', 'slut', 'smut', 'snatch', 'snowballing', 'sodomize', 'sodomy', 'spic', 'spooge', 'spread legs', 'strap on', 'strapon', 'strappado', 'strip club', 'style doggy', 'suck', 'sucks', 'suicide girls', 'sultry women', 'swastika', 'swinger', 'tainted love', 'taste my', 'tea bagging', 'threesome', 'throating', 'tied up', 'tight white', 'tit', 'tits', 'titties', 'titty', 'tongue in a', 'topless', 'tosser', 'towelhead', 'tranny', 'tribadism', 'tub girl', 'tubgirl', 'tushy', 'twat', 'twink', 'twinkie', 'two girls one cup', 'undressing', 'upskirt', 'urethra play', 'urophilia', 'vagina', 'venus mound', 'vibrator', 'violet blue', 'violet wand', 'vorarephilia', 'voyeur', 'vulva', 'wank', 'wet dream', 'wetback', 'white power', 'women rapping', 'wrapping men', 'wrinkled starfish', 'xx', 'xxx', 'yaoi', 'yellow showers', 'yiffy', 'zoophilia', 'big-dick', 'big-prick', 'super-prick', 'meaty-ball', 'deez-nut', 'big-n-hard', 'big-and-hard', 'chester-the-pussy-molester', 'hard-on', 'hot-cock', 'bull-shit', 'load-of-crap', 'cock-suck', 'suck-my-cock', 'blow-job', 'facial-fetish', 'fuck', 'suck-(cock|dick)', 'hand-job', 'jack-off', 'jerk-off', '(lick|suck)-(cock|dick|nipples|tits)', 'crotch', 'ass-crack', 'butt-crack', 'dick-head', 'prick-head', 'ass-hole', 'bastard', 'punk-ass', 'pussy-ass', 'faggot', 'dick-less', 'm(o|u)th(er|a|)-fuck', 'god-dam', 'shitty-ass', 'nigg?(a|er|uh)', 'bitch', 'whore', 'suck-my-ass', 'hug-my-nuts', 'goto-hell', 'eat-shit', 'shit-eater', 'shit-head', 'turd-head', 'shit-face', 'suck-my-cock', 'fuck-off', 'eat-poop', 'smell-farts', 'half-assed', 'piss--face', 'piss--ass', 'poop--face', 'piss-drink', 'drink-piss', 'pussies', 'hot-puss', 'juicy-puss', 'smelly-puss', 'funky-puss', 'white-puss', 'black-puss', 'asian-puss', 'sex-puss', 'sex-clit', 'juic-clit', 'milk-my-breasts']
+profanity_matcher = None        # (AhoCorasick of the plain entries, their list indices, [(list index, compiled regex), ...])
+
+def profanity_found(text):
+    """
+    # The first profanity_list entry (in list order) that is in text as a whole word, as it is written in text.
+    # Entries with regex syntax, like 'nigg?(a|er|uh)', are matched as regexes.
+    """
+    global profanity_matcher
+    if profanity_matcher is None:                   # Once per task
+        (plain, regexes) = ([], [])
+        for index, entry in enumerate(profanity_list):
+            if re.search(r'[()|?*+\[\]]', entry):
+                regexes.append((index, re.compile(r'(?<!\w)(?:' + entry + r')(?!\w)', re.UNICODE)))
+            else:
+                plain.append((index, entry))
+        profanity_matcher = (AhoCorasick([entry for (index, entry) in plain]), [index for (index, entry) in plain], regexes)
+    (automaton, plain_indices, regexes) = profanity_matcher
+    found = None
+    for (start, end, index) in automaton.find(text):
+        index = plain_indices[index]
+        if (found is None or index < found[0]) and (start == 0 or not word_char(text[start-1])) \
+                and (end == len(text) or not word_char(text[end])):
+            found = (index, text[start:end])
+    for (index, regex) in regexes:
+        if found is not None and found[0] < index:
+            break
+        match = regex.search(text)
+        if match:
+            found = (index, match.group())
+            break
+    if found is not None:
+        return found[1]
+
+
 def New_0006(Place):
     """
     # Profanity check
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    profanity_list = ['2g1c', '2 girls 1 cup', 'acrotomophilia', 'anal', 'anilingus', 'anus', 'arsehole', 'ass', 'asshole', 'assmunch', 'auto erotic', 'autoerotic', 'babeland', 'baby batter', 'ball gag', 'ball gravy', 'ball kicking', 'ball licking', 'ball sack', 'ball sucking', 'bangbros', 'bareback', 'barely legal', 'barenaked', 'bastardo', 'bastinado', 'bbw', 'bdsm', 'beaver cleaver', 'beaver lips', 'bestiality', 'bi curious', 'big black', 'big breasts', 'big knockers', 'big tits', 'bimbos', 'birdlock', 'bitch', 'black cock', 'blonde action', 'blonde on blonde action', 'blow j', 'blow your l', 'blue waffle', 'blumpkin', 'bollocks', 'bondage', 'boner', 'boob', 'boobs', 'booty call', 'brown showers', 'brunette action', 'bukkake', 'bulldyke', 'bullet vibe', 'bung hole', 'bunghole', 'busty', 'butt', 'buttcheeks', 'butthole', 'camel toe', 'camgirl', 'camslut', 'camwhore', 'carpet muncher', 'carpetmuncher', 'chocolate rosebuds', 'circlejerk', 'cleveland steamer', 'clit', 'clitoris', 'clover clamps', 'clusterfuck', 'cock', 'cocks', 'coprolagnia', 'coprophilia', 'cornhole', 'cum', 'cumming', 'cunnilingus', 'cunt', 'darkie', 'date rape', 'daterape', 'deep throat', 'deepthroat', 'dick', 'dildo', 'dirty pillows', 'dirty sanchez', 'dog style', 'doggie style', 'doggiestyle', 'doggy style', 'doggystyle', 'dolcett', 'domination', 'dominatrix', 'dommes', 'donkey punch', 'double dong', 'double penetration', 'dp action', 'eat my ass', 'ecchi', 'ejaculation', 'erotic', 'erotism', 'escort', 'ethical slut', 'eunuch', 'faggot', 'fecal', 'felch', 'fellatio', 'feltch', 'female squirting', 'femdom', 'figging', 'fingering', 'fisting', 'foot fetish', 'footjob', 'frotting', 'fuck', 'fucking', 'fuck buttons', 'fudge packer', 'fudgepacker', 'futanari', 'g-spot', 'gang bang', 'gay sex', 'genitals', 'giant cock', 'girl on', 'girl on top', 'girls gone wild', 'goatcx', 'goatse', 'gokkun', 'golden shower', 'goo girl', 'goodpoop', 'goregasm', 'grope', 'group sex', 'guro', 'hand job', 'handjob', 'hard core', 'hardcore', 'hentai', 'homoerotic', 'honkey', 'hooker', 'hot chick', 'how to kill', 'how to murder', 'huge fat', 'humping', 'incest', 'intercourse', 'jack off', 'jail bait', 'jailbait', 'jerk off', 'jigaboo', 'jiggaboo', 'jiggerboo', 'jizz', 'juggs', 'kike', 'kinbaku', 'kinkster', 'kinky', 'knobbing', 'leather restraint', 'leather straight jacket', 'lemon party', 'lolita', 'lovemaking', 'make me come', 'male squirting', 'masturbate', 'menage a trois', 'milf', 'missionary position', 'motherfucker', 'mound of venus', 'mr hands', 'muff diver', 'muffdiving', 'nambla', 'nawashi', 'negro', 'neonazi', 'nig nog', 'nigga', 'nigger', 'nimphomania', 'nipple', 'nipples', 'nsfw images', 'nude', 'nudity', 'nympho', 'nymphomania', 'octopussy', 'omorashi', 'one cup two girls', 'one guy one jar', 'orgasm', 'orgy', 'paedophile', 'panties', 'panty', 'pedobear', 'pedophile', 'pegging', 'penis', 'phone sex', 'piece of shit', 'piss pig', 'pissing', 'pisspig', 'playboy', 'pleasure chest', 'pole smoker', 'ponyplay', 'poof', 'poop chute', 'poopchute', 'porn', 'porno', 'pornography', 'prince albert piercing', 'pthc', 'pubes', 'pussy', 'queaf', 'raghead', 'raging boner', 'rape', 'raping', 'rapist', 'rectum', 'reverse cowgirl', 'rimjob', 'rimming', 'rosy palm', 'rosy palm and her 5 sisters', 'rusty trombone', 's&m', 'sadism', 'scat', 'schlong', 'scissoring', 'semen', 'sex', 'sexo', 'sexy', 'shaved beaver', 'shaved pussy', 'shemale', 'shibari', 'shit', 'shota', 'shrimping', 'slanteye', 'slut', 'smut', 'snatch', 'snowballing', 'sodomize', 'sodomy', 'spic', 'spooge', 'spread legs', 'strap on', 'strapon', 'strappado', 'strip club', 'style doggy', 'suck', 'sucks', 'suicide girls', 'sultry women', 'swastika', 'swinger', 'tainted love', 'taste my', 'tea bagging', 'threesome', 'throating', 'tied up', 'tight white', 'tit', 'tits', 'titties', 'titty', 'tongue in a', 'topless', 'tosser', 'towelhead', 'tranny', 'tribadism', 'tub girl', 'tubgirl', 'tushy', 'twat', 'twink', 'twinkie', 'two girls one cup', 'undressing', 'upskirt', 'urethra play', 'urophilia', 'vagina', 'venus mound', 'vibrator', 'violet blue', 'violet wand', 'vorarephilia', 'voyeur', 'vulva', 'wank', 'wet dream', 'wetback', 'white power', 'women rapping', 'wrapping men', 'wrinkled starfish', 'xx', 'xxx', 'yaoi', 'yellow showers', 'yiffy', 'zoophilia', 'big-dick', 'big-prick', 'super-prick', 'meaty-ball', 'deez-nut', 'big-n-hard', 'big-and-hard', 'chester-the-pussy-molester', 'hard-on', 'hot-cock', 'bull-shit', 'load-of-crap', 'cock-suck', 'suck-my-cock', 'blow-job', 'facial-fetish', 'fuck', 'suck-(cock|dick)', 'hand-job', 'jack-off', 'jerk-off', '(lick|suck)-(cock|dick|nipples|tits)', 'crotch', 'ass-crack', 'butt-crack', 'dick-head', 'prick-head', 'ass-hole', 'bastard', 'punk-ass', 'pussy-ass', 'faggot', 'dick-less', 'm(o|u)th(er|a|)-fuck', 'god-dam', 'shitty-ass', 'nigg?(a|er|uh)', 'bitch', 'whore', 'suck-my-ass', 'hug-my-nuts', 'goto-hell', 'eat-shit', 'shit-eater', 'shit-head', 'turd-head', 'shit-face', 'suck-my-cock', 'fuck-off', 'eat-poop', 'smell-farts', 'half-assed', 'piss--face', 'piss--ass', 'poop--face', 'piss-drink', 'drink-piss', 'pussies', 'hot-puss', 'juicy-puss', 'smelly-puss', 'funky-puss', 'white-puss', 'black-puss', 'asian-puss', 'sex-puss', 'sex-clit', 'juic-clit', 'milk-my-breasts']
     try:
         BaseTextList = Place.findall(ns+"BaseText")
         for BaseText in BaseTextList:
             btext = BaseText.text
-            btext_attrib = BaseText.attrib
-            for word in profanity_list:
-                word = ' '+word+' '# sandwich the word with spaces
-                if word in btext:
-                    btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
-                    btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                    emit_string = 'New_0006|'+CountryCode+'|'+PlaceId+'|Profanity found in BaseText|'+word+'|'+btext
-                    return_emits.append(emit_string)
-                    break
+            if not btext:
+                continue
+            word = profanity_found(btext)
+            if word is not None:
+                word = ' '+word.encode('UTF-8')+' '# sandwich the word with spaces
+                btext = btext.replace('|', '#')  # remove pipe symbols so that they don't mess up the output
+                btext = btext.encode('UTF-8')   # convert the unicode to bytestrings for the return
+                emit_string = 'New_0006|'+CountryCode+'|'+PlaceId+'|Profanity found in BaseText|'+word+'|'+btext
+                return_emits.append(emit_string)
     except:
         pass
     return return_emits
@@ -1966,75 +1842,73 @@ def New_0007(Place):
     LocationList = Place.findall(ns+"Location")
     for Location in LocationList:
         LocationAttributes = Location.attrib
-        if 'primary' in LocationAttributes.keys() and 'type' in LocationAttributes.keys():
-            # Location = primary
-            if LocationAttributes['primary'] == 'true' and LocationAttributes['type'] == 'MAIN':
-                # Note: In LUX I am seeing that the primary locations have ONLY ROUTING, but the PA_BINDING and PA_RESOLVING loccations also have a DISPLAY
-                # The PA_RESOLVING lat/longs needed to be divided by 100000. For example 4985222.0 should be 49.85222
+        if LocationAttributes.get('primary') == 'true' and LocationAttributes.get('type') == 'MAIN':     # Location = primary
+            # Note: In LUX I am seeing that the primary locations have ONLY ROUTING, but the PA_BINDING and PA_RESOLVING loccations also have a DISPLAY
+            # The PA_RESOLVING lat/longs needed to be divided by 100000. For example 4985222.0 should be 49.85222
 
-                # Side
-                try:
-                    Side = Location.find(ns+"Side").text
-                except:
-                    Side = "None"
+            # Side
+            try:
+                Side = find_tag(Location, "Side").text
+            except:
+                Side = "None"
 
-                # Spot
-                try:
-                    Spot = Location.find(ns+"Spot").text
-                except:
-                    Spot = "None"
+            # Spot
+            try:
+                Spot = find_tag(Location, "Spot").text
+            except:
+                Spot = "None"
 
-                #element_recurse(Location, 0)
-                Parsed = Place.find(ns+'Parsed')
-                ParsedAttr = Parsed.attrib
-                if 'languageCode' in ParsedAttr.keys():
-                    langCode = ParsedAttr['languageCode']
-                else:
-                    langCode = "None"
-                try:
-                    StreetName = Location.find(ns+"BaseName").text
-                    StreetName = StreetName.encode('UTF-8')   # convert the unicode to bytestrings for the return
-                except:
-                    StreetName = "None"
-                try:
-                    HouseNumber = Location.find(ns+"HouseNumber").text
-                except:
-                    HouseNumber = "None"
-                try:
-                    Link = Location.find(ns+"Link")
-                except:
-                    Link = "None"
-                try:
-                    LinkAttributes = Link.attrib
-                except:
-                    LinkAttributes = "None"
-                primaryLinkPvid = ''
-                if LinkAttributes != "None":
-                    if 'linkPvid' in LinkAttributes.keys():
-                        primaryLinkPvid = LinkAttributes['linkPvid']
-                GeoPositionList = Location.findall(ns+"GeoPosition")
-                for GeoPosition in GeoPositionList:
-                    GeoPositionAttributes = GeoPosition.attrib
-                    if 'type' in GeoPositionAttributes.keys():
-                        Routing_Display = GeoPositionAttributes['type']
-                        Longitude = GeoPosition.find(ns+"Longitude")
-                        Latitude = GeoPosition.find(ns+"Latitude")
-                        if Routing_Display == "ROUTING":
-                            ROUTING_Long = str(Longitude.text)
-                            ROUTING_LAT = str(Latitude.text)
-                        if Routing_Display == "DISPLAY":
-                            DISPLAY_Long = str(Longitude.text)
-                            DISPLAY_LAT = str(Latitude.text)
-
-                # |'+primaryLinkPvid+'|'+langCode+'|'+StreetName+'|'+HouseNumber+'|'+ROUTING_LAT+'|'+ROUTING_Long+'|'+DISPLAY_LAT+'|'+DISPLAY_Long+'
-                primary_loc["linkPvid"] = primaryLinkPvid
-                primary_loc["langCode"] = langCode
-                primary_loc["StreetName"] = StreetName
-                primary_loc["HouseNumber"] = HouseNumber
-                ROUTING_xy = ROUTING_LAT+'|'+ROUTING_Long
-                DISPLAY_xy = DISPLAY_LAT+'|'+DISPLAY_Long
-                primary_loc["ROUTING_xy"] = ROUTING_xy
-                primary_loc["DISPLAY_xy"] = DISPLAY_xy
+            #element_recurse(Location, 0)
+            Parsed = Place.find(ns+'Parsed')
+            ParsedAttr = Parsed.attrib
+            if 'languageCode' in ParsedAttr.keys():
+                langCode = ParsedAttr['languageCode']
+            else:
+                langCode = "None"
+            try:
+                StreetName = find_tag(Location, "BaseName").text
+                StreetName = StreetName.encode('UTF-8')   # convert the unicode to bytestrings for the return
+            except:
+                StreetName = "None"
+            try:
+                HouseNumber = find_tag(Location, "HouseNumber").text
+            except:
+                HouseNumber = "None"
+            try:
+                Link = find_tag(Location, "Link")
+            except:
+                Link = "None"
+            try:
+                LinkAttributes = Link.attrib
+            except:
+                LinkAttributes = "None"
+            primaryLinkPvid = ''
+            if LinkAttributes != "None":
+                if 'linkPvid' in LinkAttributes.keys():
+                    primaryLinkPvid = LinkAttributes['linkPvid']
+            GeoPositionList = Location.findall(ns+"GeoPosition")
+            for GeoPosition in GeoPositionList:
+                GeoPositionAttributes = GeoPosition.attrib
+                if 'type' in GeoPositionAttributes.keys():
+                    Routing_Display = GeoPositionAttributes['type']
+                    Longitude = find_tag(GeoPosition, "Longitude")
+                    Latitude = find_tag(GeoPosition, "Latitude")
+                    if Routing_Display == "ROUTING":
+                        ROUTING_Long = str(Longitude.text)
+                        ROUTING_LAT = str(Latitude.text)
+                    if Routing_Display == "DISPLAY":
+                        DISPLAY_Long = str(Longitude.text)
+                        DISPLAY_LAT = str(Latitude.text)
+
+            # |'+primaryLinkPvid+'|'+langCode+'|'+StreetName+'|'+HouseNumber+'|'+ROUTING_LAT+'|'+ROUTING_Long+'|'+DISPLAY_LAT+'|'+DISPLAY_Long+'
+            primary_loc["linkPvid"] = primaryLinkPvid
+            primary_loc["langCode"] = langCode
+            primary_loc["StreetName"] = StreetName
+            primary_loc["HouseNumber"] = HouseNumber
+            ROUTING_xy = ROUTING_LAT+'|'+ROUTING_Long
+            DISPLAY_xy = DISPLAY_LAT+'|'+DISPLAY_Long
+            primary_loc["ROUTING_xy"] = ROUTING_xy
+            primary_loc["DISPLAY_xy"] = DISPLAY_xy
 
         # Location supplier = 'PA_BINDING'
         if LocationAttributes['supplier'] == 'PA_BINDING':
@@ -2048,12 +1922,12 @@ def New_0007(Place):
             else:
                 pblangCode = "None"
             try:
-                pbStreetName = Location.find(ns+"BaseName").text
+                pbStreetName = find_tag(Location, "BaseName").text
                 pbStreetName = pbStreetName.encode('UTF-8')   # convert the unicode to bytestrings for the return
             except:
                 pbStreetName = "None"
             try:
-                pbHouseNumber = Location.find(ns+"HouseNumber").text
+                pbHouseNumber = find_tag(Location, "HouseNumber").text
             except:
                 pbHouseNumber = "None"
 
@@ -2072,7 +1946,7 @@ def New_0007(Place):
                     pass
 
             try:
-                Link = Location.find(ns+"Link")
+                Link = find_tag(Location, "Link")
             except:
                 Link = "None"
             try:
@@ -2088,8 +1962,8 @@ def New_0007(Place):
                 GeoPositionAttributes = GeoPosition.attrib
                 if 'type' in GeoPositionAttributes.keys():
                     Routing_Display = GeoPositionAttributes['type']
-                    Longitude = GeoPosition.find(ns+"Longitude")
-                    Latitude = GeoPosition.find(ns+"Latitude")
+                    Longitude = find_tag(GeoPosition, "Longitude")
+                    Latitude = find_tag(GeoPosition, "Latitude")
                     if Routing_Display == "ROUTING":
                         pbROUTING_Long = str(Longitude.text)
                         pbROUTING_LAT = str(Latitude.text)
@@ -2119,24 +1993,24 @@ def New_0007(Place):
             else:
                 prlangCode = "None"
             try:
-                prStreetName = Location.find(ns+"BaseName").text
+                prStreetName = find_tag(Location, "BaseName").text
                 prStreetName = prStreetName.encode('UTF-8')   # convert the unicode to bytestrings for the return
             except:
                 prStreetName = "None"
             try:
-                prHouseNumber = Location.find(ns+"HouseNumber").text
+                prHouseNumber = find_tag(Location, "HouseNumber").text
             except:
                 prHouseNumber = "None"
 
             # Side
             try:
-                prSide = Location.find(ns+"Side").text
+                prSide = find_tag(Location, "Side").text
             except:
                 prSide = "None"
 
             # Spot
             try:
-                prSpot = Location.find(ns+"Spot").text
+                prSpot = find_tag(Location, "Spot").text
             except:
                 prSpot = "None"
 
@@ -2152,7 +2026,7 @@ def New_0007(Place):
                 except:
                     pass
 
-            Link = Location.find(ns+"Link")
+            Link = find_tag(Location, "Link")
             try:
                 LinkAttributes = Link.attrib
             except:
@@ -2164,8 +2038,8 @@ def New_0007(Place):
                 GeoPositionAttributes = GeoPosition.attrib
                 if 'type' in GeoPositionAttributes.keys():
                     Routing_Display = GeoPositionAttributes['type']
-                    Longitude = GeoPosition.find(ns+"Longitude")
-                    Latitude = GeoPosition.find(ns+"Latitude")
+                    Longitude = find_tag(GeoPosition, "Longitude")
+                    Latitude = find_tag(GeoPosition, "Latitude")
                     if Routing_Display == "ROUTING":
                         prROUTING_Long = str(Longitude.text)
                         prROUTING_LAT = str(Latitude.text)
@@ -2424,8 +2298,8 @@ def New_0013(Place):
     ChainName = ''; ChainId = ''
     ChainList = Place.findall(ns+"Chain")
     for Chain in ChainList:
-        ChainId = Chain.find(ns+"Id").text
-        Text = Chain.find(ns+"Text")
+        ChainId = find_tag(Chain, "Id").text
+        Text = find_tag(Chain, "Text")
         TextAttrib = Text.attrib
         # default="true" type="OFFICIAL"
         if 'default' in TextAttrib.keys() and 'type' in TextAttrib.keys():
@@ -2490,11 +2364,11 @@ def New_0015(Place, id):
         for id in id_list:
             if PlaceId == id:
                 # returnPlace = etree.tostring(Place) <-- this produces HTML entities!
-                returnPlace = etree.tostring(Place, encoding='UTF-8')
+                returnPlace = etree.tostring(Place.element, encoding='UTF-8')
                 return_emits.append(returnPlace)
     else:
         if PlaceId == id:
-            returnPlace = etree.tostring(Place, encoding='UTF-8')
+            returnPlace = etree.tostring(Place.element, encoding='UTF-8')
             return_emits.append(returnPlace)
     return return_emits
 
@@ -2642,7 +2516,7 @@ def New_0020(Place):
     """
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
     return_emits = []
-    Place_string = etree.tostring(Place, encoding='UTF-8')
+    Place_string = etree.tostring(Place.element, encoding='UTF-8')
     emit_string = ''
     entity_begin = '&#'
     closing_brace = '>'
@@ -2738,7 +2612,7 @@ def New_0023(Place):
             if 'system' in ExternalRefattrib.keys():
                 ExternalRefSystem = ExternalRefattrib['system']
                 if ExternalRefSystem == "corepoixml":
-                    ExternalReferenceID = ExternalReference.find(ns+"ExternalReferenceID")
+                    ExternalReferenceID = find_tag(ExternalReference, "ExternalReferenceID")
                     ExternalReferenceID_attrib = ExternalReferenceID.attrib
                     if 'type' in ExternalReferenceID_attrib.keys():
                         ExternalReftype = ExternalReferenceID_attrib['type']
@@ -2748,7 +2622,7 @@ def New_0023(Place):
         pass
 
     return_emits = []
-    Place_string = etree.tostring(Place, encoding='UTF-8')
+    Place_string = etree.tostring(Place.element, encoding='UTF-8')
     emit_string = ''
     entity_begin = '&#'
     closing_brace = '>'
@@ -2859,15 +2733,7 @@ def TQS_0005(Place):
         pass
 
     # Get category
-    CategoryNameList = []
-    CategoryNames = Place.findall(ns+"CategoryName")
-    for Category in CategoryNames:
-        Name = Category.find(ns+"Text").text
-        CategoryNameList.append(Name)
-    try:
-        FirstCategory = CategoryNameList[0]
-    except:
-        FirstCategory = "None"
+    FirstCategory = first_category(Place)
 
     emit_string = PlaceId+'|'+Core_POI+'|'+QualityLevel+'|'+FirstCategory
     return emit_string
@@ -2972,7 +2838,7 @@ def TQS_0008(Place):
     Also look for the string 'overallScore'
     """
     return_emits = []
-    stringified_Place = etree.tostring(Place)
+    stringified_Place = etree.tostring(Place.element)
     if '<QualityLevel>' in stringified_Place:
         emit_string = 'QualityLevel Total'
         return_emits.append(emit_string)
@@ -2982,6 +2848,53 @@ def TQS_0008(Place):
     return return_emits
 
 
+# Category taxonomy -----------------------------------------------
+class CategoryTaxonomy(object):
+    """
+    # The category groups and lookups of a category_taxonomy.xml file, indexed for the category-aware validations:
+    # group(name) is a frozenset of category IDs (one hash lookup per membership test), lookup(name) is a dict of
+    # category ID to value (corename, coreid, ...), and under(prefix) lists the known IDs in one branch of the
+    # hierarchy, i.e. under('600-6900') is every 600-6900-* ID, found by bisection in the sorted ID list.
+    """
+    def __init__(self, path):
+        self.groups = {}
+        self.lookups = {}
+        ids = set()
+        for elem in etree.parse(path).getroot():
+            if elem.tag == 'Group':
+                self.groups[elem.get('name')] = frozenset(category.text for category in elem)
+                ids.update(self.groups[elem.get('name')])
+            elif elem.tag == 'Lookup':
+                self.lookups[elem.get('name')] = dict((category.get('id'), category.text) for category in elem)
+                ids.update(self.lookups[elem.get('name')])
+        self.ids = sorted(ids)
+
+    def group(self, name):
+        return self.groups[name]
+
+    def in_group(self, name, category_id):
+        return category_id in self.groups[name]
+
+    def lookup(self, name):
+        return self.lookups[name]
+
+    def under(self, prefix):
+        prefix = prefix.rstrip('-*') + '-'
+        start = bisect.bisect_left(self.ids, prefix)
+        end = bisect.bisect_left(self.ids, prefix[:-1] + '.')      # '.' sorts right after '-'
+        return self.ids[start:end]
+
+taxonomy_validations = ('TQS_0009', 'TQS_0010', 'TQS_0012')     # The validations that read category_file
+category_index = None
+
+def category_taxonomy():
+    """ The CategoryTaxonomy of category_file, loaded on first use (once per task) """
+    global category_index
+    if category_index is None:
+        category_index = CategoryTaxonomy(category_file)
+    return category_index
+
+
 # TQS_0009 ------------------------------------------------------
 def TQS_0009(Place):
     """
@@ -2991,33 +2904,7 @@ def TQS_0009(Place):
     # CategoryId|Core|QL i.e. 100-1000-0000|Non-Core|4
     """
 
-    important_categories = set(['100-1000-0000', '100-1000-0001', '100-1000-0002', '100-1000-0003', '100-1000-0004', '100-1000-0005', '100-1000-0006', '100-1000-0007', '100-1000-0008',
-    '100-1000-0009', '100-1000-0230', '100-1100-0000', '100-1100-0010', '100-1100-0331', '200-2000-0000', '200-2000-0011', '200-2000-0012', '200-2000-0013', '200-2000-0014',
-    '200-2000-0015', '200-2000-0016', '200-2000-0017', '200-2000-0018', '200-2000-0306', '200-2000-0368', '200-2100-0019', '200-2200-0000', '200-2200-0020', '200-2300-0000',
-    '200-2300-0021', '300-3000-0000', '300-3000-0023', '300-3000-0024', '300-3000-0025', '300-3000-0065', '300-3000-0350', '300-3000-0351', '300-3100-0000', '300-3100-0026',
-    '300-3100-0027', '300-3100-0028', '300-3100-0029', '300-3200-0000', '300-3200-0030', '300-3200-0031', '300-3200-0032', '300-3200-0033', '300-3200-0034', '300-3200-0309',
-    '300-3200-0375', '400-4000-4580', '400-4000-4581', '400-4000-4582', '400-4100-0035', '400-4100-0036', '400-4100-0038', '400-4100-0039', '400-4100-0041', '400-4100-0044',
-    '400-4100-0045', '400-4100-0046', '400-4300-0000', '400-4300-0199', '400-4300-0200', '400-4300-0201', '400-4300-0202', '400-4300-0308', '500-5000-0000', '500-5000-0053',
-    '500-5000-0054', '500-5100-0000', '500-5100-0055', '500-5100-0056', '500-5100-0057', '500-5100-0058', '500-5100-0059', '500-5100-0060', '550-5510-0000', '550-5510-0202',
-    '550-5510-0203', '550-5510-0204', '550-5510-0205', '550-5510-0206', '550-5510-0227', '550-5510-0242', '550-5510-0243', '550-5520-0000', '550-5520-0207', '550-5520-0208',
-    '550-5520-0209', '550-5520-0210', '550-5520-0211', '550-5520-0212', '550-5520-0228', '550-5520-0357', '600-6000-0000', '600-6000-0061', '600-6100-0062', '600-6200-0063',
-    '600-6300-0064', '600-6300-0066', '600-6300-0067', '600-6300-0068', '600-6300-0244', '600-6300-0245', '600-6300-0363', '600-6300-0364', '600-6400-0000', '600-6400-0069',
-    '600-6400-0070', '600-6500-0072', '600-6500-0073', '600-6500-0074', '600-6500-0075', '600-6500-0076', '600-6500-0333', '600-6600-0000', '600-6600-0077', '600-6600-0078',
-    '600-6600-0079', '600-6600-0080', '600-6600-0082', '600-6600-0083', '600-6600-0084', '600-6600-0085', '600-6600-0310', '600-6600-0319', '600-6700-0000', '600-6700-0087',
-    '600-6800-0000', '600-6800-0089', '600-6800-0090', '600-6800-0091', '600-6800-0092', '600-6800-0093', '600-6900-0000', '600-6900-0094', '600-6900-0095', '600-6900-0096',
-    '600-6900-0097', '600-6900-0098', '600-6900-0099', '600-6900-0100', '600-6900-0101', '600-6900-0102', '600-6900-0103', '600-6900-0104', '600-6900-0105', '600-6900-0106',
-    '600-6900-0246', '600-6900-0247', '600-6900-0248', '600-6900-0250', '600-6900-0251', '600-6900-0305', '600-6900-0307', '600-6900-0355', '600-6900-0356', '600-6900-0358',
-    '600-6900-0388', '600-6900-0389', '600-6900-0390', '600-6900-0391', '600-6900-0392', '600-6900-0393', '600-6900-0394', '600-6900-0395', '600-6900-0396', '600-6900-0397',
-    '600-6900-0398', '600-6950-0000', '600-6950-0399', '600-6950-0400', '600-6950-0401', '700-7000-0107', '700-7010-0108', '700-7050-0109', '700-7050-0110', '700-7300-0111',
-    '700-7300-0113', '700-7300-0280', '700-7450-0114', '700-7460-0115', '700-7600-0000', '700-7600-0116', '700-7800-0118', '700-7800-0119', '700-7800-0120', '700-7850-0000',
-    '700-7850-0121', '700-7850-0122', '700-7850-0123', '700-7850-0124', '700-7850-0125', '700-7850-0126', '700-7850-0127', '700-7850-0128', '700-7850-0129', '700-7851-0117',
-    '700-7900-0132', '800-8000-0000', '800-8000-0154', '800-8000-0155', '800-8000-0156', '800-8000-0157', '800-8000-0158', '800-8000-0159', '800-8000-0161', '800-8000-0162',
-    '800-8000-0325', '800-8000-0340', '800-8000-0341', '800-8000-0367', '800-8100-0000', '800-8100-0163', '800-8100-0164', '800-8100-0165', '800-8100-0168', '800-8100-0169',
-    '800-8100-0170', '800-8100-0171', '800-8200-0000', '800-8200-0173', '800-8200-0174', '800-8200-0295', '800-8200-0360', '800-8200-0361', '800-8200-0362', '800-8300-0000',
-    '800-8300-0175', '800-8400-0000', '800-8400-0176', '800-8500-0000', '800-8500-0177', '800-8500-0178', '800-8500-0179', '800-8500-0315', '800-8600-0000', '800-8600-0180',
-    '800-8600-0181', '800-8600-0182', '800-8600-0183', '800-8600-0184', '800-8600-0185', '800-8600-0186', '800-8600-0187', '800-8600-0188', '800-8600-0189', '800-8600-0190',
-    '800-8600-0191', '800-8600-0192', '800-8600-0193', '800-8600-0194', '800-8600-0195', '800-8600-0196', '800-8600-0197', '800-8600-0199', '800-8600-0200', '800-8600-0314',
-    '800-8600-0316', '800-8600-0376', '800-8600-0377', '800-8600-0381', '800-8700-0166', '800-8700-0167', '900-9200-0219', '900-9200-0220'])
+    important_categories = category_taxonomy().group('TQS_Priority')
 
     return_emits = []
     Core_POI = core_or_non_core(Place)
@@ -3028,11 +2915,7 @@ def TQS_0009(Place):
         pass
 
     # Get category
-    CategoryIds = []
-    CategoryIdList = Place.findall(ns+"CategoryId")
-    for Category in CategoryIdList:
-        CatId = Category.text
-        CategoryIds.append(CatId)
+    CategoryIds = category_ids(Place)
 
     if set(CategoryIds).intersection(important_categories):
         emit_string = 'Priority QualityLevel|'+QualityLevel
@@ -3064,114 +2947,17 @@ def TQS_0010(Place):
     # PDS category labels (corenames) and ids (coreid1) that correspond to the matchng USA_Core_POI_category
     """
 
-    USA_Core_POI_categories = set([ '100-1000-0000', '100-1000-0001', '100-1000-0002', '100-1000-0003', '100-1000-0004', '100-1000-0005', '100-1000-0006', '100-1000-0007',
-                                    '100-1000-0008', '100-1000-0009', '100-1000-0230', '100-1100-0000', '100-1100-0010', '200-2100-0019', '200-2200-0020', '200-2300-0021',
-                                    '300-3000-0023', '300-3000-0024', '300-3000-0025', '300-3000-0065', '300-3100-0000', '300-3100-0026', '300-3100-0027', '300-3100-0028',
-                                    '300-3100-0029', '400-4000-4581', '400-4000-4582', '400-4100-0035', '400-4100-0036', '400-4100-0037', '400-4100-0038', '400-4100-0039',
-                                    '400-4100-0041', '400-4100-0044', '400-4100-0045', '400-4100-0046', '400-4300-0000', '400-4300-0199', '400-4300-0200', '400-4300-0201',
-                                    '400-4300-0202', '400-4300-0308', '500-5000-0000', '500-5000-0053', '500-5000-0054', '500-5100-0056', '550-5510-0202', '550-5510-0203',
-                                    '550-5510-0204', '550-5510-0205', '550-5510-0358', '550-5510-0374', '550-5520-0207', '550-5520-0208', '550-5520-0209', '550-5520-0210',
-                                    '550-5520-0211', '550-5520-0212', '550-5520-0228', '550-5520-0357', '600-6000-0061', '600-6100-0062', '600-6200-0063', '600-6300-0064',
-                                    '600-6300-0066', '600-6300-0244', '600-6300-0245', '600-6300-0363', '600-6300-0364', '600-6400-0000', '600-6400-0069', '600-6400-0070',
-                                    '600-6500-0072', '600-6500-0073', '600-6500-0074', '600-6600-0078', '600-6600-0310', '600-6700-0087', '600-6800-0000', '600-6800-0089',
-                                    '600-6800-0090', '600-6800-0091', '600-6800-0092', '600-6900-0094', '600-6900-0388', '600-6900-0389', '600-6900-0390', '600-6900-0391',
-                                    '600-6900-0392', '600-6900-0393', '600-6900-0246', '600-6900-0394', '600-6900-0395', '600-6900-0396', '600-6900-0397', '600-6900-0398',
-                                    '600-6900-0095', '600-6900-0096', '600-6900-0097', '600-6900-0098', '600-6900-0247', '600-6900-0247', '600-6900-0248', '600-6900-0307',
-                                    '600-6900-0358', '700-7000-0107', '700-7300-0111', '700-7400-0286', '700-7450-0114', '700-7460-0115', '700-7600-0116', '700-7800-0118',
-                                    '700-7800-0120', '700-7850-0000', '700-7850-0121', '700-7850-0122', '700-7850-0123', '700-7850-0124', '700-7850-0125', '700-7850-0126',
-                                    '700-7850-0127', '700-7850-0129', '700-7851-0117', '700-7900-0130', '700-7900-0131', '700-7900-0132', '800-8000-0159', '800-8000-0325',
-                                    '800-8100-0163', '800-8100-0164', '800-8100-0165', '800-8100-0169', '800-8100-0170', '800-8200-0173', '800-8200-0174', '800-8300-0175',
-                                    '800-8400-0176', '800-8500-0177', '800-8500-0178', '800-8500-0179', '800-8500-0315', '800-8600-0180', '800-8600-0193', '900-9200-0219'])
-
-    corename_lookups = {'600-6800-0000': 'Clothing Store', '550-5520-0207': 'Amusement Park', '400-4300-0000': 'Rest Area', '600-6900-0307': 'Specialty Store',
-                        '550-5520-0209': 'Animal Park', '550-5520-0208': 'Animal Park', '600-6900-0389': 'Sporting Goods Store', '600-6900-0388': 'Sporting Goods Store',
-                        '550-5510-0374': 'Park/Recreation Area', '100-1000-0230': 'Restaurant', '100-1000-0002': 'Restaurant', '300-3000-0065': 'Winery',
-                        '600-6900-0394': 'Sporting Goods Store', '600-6900-0095': 'Office Supply & Services Store', '600-6900-0094': 'Sporting Goods Store',
-                        '500-5100-0056': 'Campground', '200-2200-0020': 'Performing Arts', '600-6900-0396': 'Sporting Goods Store', '600-6900-0098': 'Specialty Store',
-                        '550-5520-0210': 'Animal Park', '550-5520-0211': 'Animal Park', '550-5520-0212': 'Ski Resort', '600-6900-0397': 'Sporting Goods Store',
-                        '600-6800-0090': 'Clothing Store', '600-6800-0091': 'Clothing Store', '600-6800-0092': 'Clothing Store', '600-6900-0390': 'Sporting Goods Store',
-                        '700-7450-0114': 'Post Office', '600-6900-0391': 'Sporting Goods Store', '100-1000-0003': 'Restaurant', '600-6600-0078': 'Home Specialty Store',
-                        '100-1000-0001': 'Restaurant', '100-1000-0000': 'Restaurant', '100-1000-0007': 'Restaurant', '100-1000-0006': 'Restaurant', '100-1000-0005': 'Restaurant',
-                        '100-1000-0004': 'Restaurant', '100-1000-0009': 'Restaurant', '100-1000-0008': 'Restaurant', '600-6900-0398': 'Sporting Goods Store',
-                        '600-6800-0089': 'Clothing Store', '200-2300-0021': 'Casino', '700-7800-0120': 'Motorcycle Dealership', '200-2100-0019': 'Cinema',
-                        '600-6900-0246': 'Sporting Goods Store', '600-6900-0247': 'Indoor Market', '700-7600-0116': 'Petrol/Gasoline Station', '600-6900-0248': 'Specialty Store',
-                        '600-6500-0073': 'Mobile Retailer', '500-5000-0053': 'Hotel', '500-5000-0054': 'Hotel', '600-6500-0074': 'Mobile Service Center',
-                        '800-8300-0175': 'Library', '800-8100-0163': 'City Hall', '600-6300-0364': 'Specialty Store', '600-6300-0363': 'Specialty Store',
-                        '600-6200-0063': 'Department Store', '800-8400-0176': 'Convention/Exhibition Centre', '800-8500-0315': 'Parking Lot', '400-4100-0035': 'Train Station',
-                        '400-4100-0037': 'Underground Train/Subway', '400-4100-0036': 'Bus Station', '600-6900-0395': 'Sporting Goods Store',
-                        '400-4100-0039': 'Underground Train/Subway', '400-4100-0038': 'Underground Train/Subway', '300-3100-0026': 'Museum', '300-3100-0027': 'Museum',
-                        '600-6400-0000': 'Pharmacy / Drug Store', '700-7900-0131': 'Truck Parking', '300-3100-0028': 'Museum', '300-3100-0029': 'Museum',
-                        '800-8100-0165': 'Military Base', '800-8100-0164': 'Embassy', '700-7851-0117': 'Rental Car Agency', '600-6700-0087': 'Bookstore',
-                        '800-8100-0169': 'Civic/Community Centre', '400-4100-0041': 'Transportation Service', '400-4100-0044': 'Ferry Terminal',
-                        '400-4100-0045': 'Ferry Terminal', '400-4100-0046': 'Ferry Terminal', '700-7400-0286': 'School', '600-6100-0062': 'Shopping',
-                        '400-4300-0199': 'Rest Area', '400-4300-0200': 'Rest Area', '400-4300-0201': 'Rest Area', '400-4300-0202': 'Rest Area',
-                        '600-6300-0064': 'Specialty Store', '600-6300-0066': 'Grocery Store', '600-6900-0358': 'Specialty Store', '700-7800-0118': 'Auto Dealerships',
-                        '700-7850-0000': 'Auto Service & Maintenance', '700-7850-0129': 'Automobile Club', '700-7850-0125': 'Auto Service & Maintenance',
-                        '700-7850-0124': 'Auto Service & Maintenance', '700-7850-0127': 'Auto Service & Maintenance', '700-7850-0126': 'Auto Service & Maintenance',
-                        '700-7850-0121': 'Auto Service & Maintenance', '700-7850-0123': 'Auto Service & Maintenance', '700-7850-0122': 'Auto Service & Maintenance',
-                        '800-8100-0170': 'Court House', '800-8000-0159': 'Hospital', '700-7000-0107': 'Bank', '500-5000-0000': 'Hotel', '900-9200-0219': 'Marina',
-                        '800-8600-0180': 'Sports Complex', '600-6900-0097': 'Specialty Store', '700-7900-0130': 'Truck Dealership', '700-7300-0111': 'Police Station',
-                        '700-7900-0132': 'Truck Stop/Plaza', '600-6900-0096': 'Specialty Store', '300-3100-0000': 'Museum', '550-5520-0228': 'Animal Park',
-                        '600-6600-0310': 'Home Improvement & Hardware', '800-8600-0193': 'Golf Course', '600-6900-0392': 'Sporting Goods Store',
-                        '550-5510-0358': 'Park/Recreation Area', '800-8500-0178': 'Parking Lot', '800-8500-0179': 'Park & Ride', '550-5520-0357': 'Amusement Park',
-                        '800-8500-0177': 'Parking Garage/House', '600-6400-0069': 'Pharmacy / Drug Store', '400-4000-4582': 'Airport',
-                        '600-6500-0072': 'Consumer Electronics Store', '400-4000-4581': 'Airport', '300-3000-0023': 'Tourist Attraction',
-                        '600-6900-0393': 'Sporting Goods Store', '300-3000-0025': 'Historical Monument', '300-3000-0024': 'Tourist Attraction',
-                        '100-1100-0010': 'Coffee Shop', '400-4300-0308': 'Rest Area', '600-6300-0244': 'Specialty Store', '600-6300-0245': 'Specialty Store',
-                        '700-7460-0115': 'Tourist Information', '600-6000-0061': 'Convenience Store', '800-8200-0173': 'Higher Education', '800-8000-0325': 'Hospital',
-                        '800-8200-0174': 'School', '600-6400-0070': 'Pharmacy / Drug Store', '550-5510-0204': 'Park/Recreation Area', '550-5510-0205': 'Park/Recreation Area',
-                        '550-5510-0202': 'Park/Recreation Area', '550-5510-0203': 'Park/Recreation Area', '100-1100-0000': 'Coffee Shop'}
-
-    coreid_lookup = {'600-6800-0000': '9537', '550-5520-0207': '7996', '400-4300-0000': '7897', '600-6900-0307': '9567', '550-5520-0209': '9718', '550-5520-0208': '9718',
-                     '600-6900-0389': '9568', '600-6900-0388': '9568', '550-5510-0374': '7947', '100-1000-0230': '5800', '100-1000-0002': '5800', '300-3000-0065': '2084',
-                     '600-6900-0394': '9568', '600-6900-0095': '9988', '600-6900-0094': '9568', '500-5100-0056': '9517', '200-2200-0020': '7929', '600-6900-0396': '9568',
-                     '600-6900-0098': '9567', '550-5520-0210': '9718', '550-5520-0211': '9718', '550-5520-0212': '7012', '600-6900-0397': '9568', '600-6800-0090': '9537',
-                     '600-6800-0091': '9537', '600-6800-0092': '9537', '600-6900-0390': '9568', '700-7450-0114': '9530', '600-6900-0391': '9568', '100-1000-0003': '5800',
-                     '600-6600-0078': '9560', '100-1000-0001': '5800', '100-1000-0000': '5800', '100-1000-0007': '5800', '100-1000-0006': '5800', '100-1000-0005': '5800',
-                     '100-1000-0004': '5800', '100-1000-0009': '5800', '100-1000-0008': '5800', '600-6900-0398': '9568', '600-6800-0089': '9537', '200-2300-0021': '7985',
-                     '700-7800-0120': '5571', '200-2100-0019': '7832', '600-6900-0246': '9568', '600-6900-0247': '5400', '700-7600-0116': '5540', '600-6900-0248': '9567',
-                     '600-6500-0073': '9987', '500-5000-0053': '7011', '500-5000-0054': '7011', '600-6500-0074': '9987', '800-8300-0175': '8231', '800-8100-0163': '9121',
-                     '600-6300-0364': '9567', '600-6300-0363': '9567', '600-6200-0063': '9545', '800-8400-0176': '7990', '800-8500-0315': '7520', '400-4100-0035': '4013',
-                     '400-4100-0037': '4100', '400-4100-0036': '4170', '600-6900-0395': '9568', '400-4100-0039': '4100', '400-4100-0038': '4100', '300-3100-0026': '8410',
-                     '300-3100-0027': '8410', '600-6400-0000': '9565', '700-7900-0131': '9720', '300-3100-0028': '8410', '300-3100-0029': '8410', '800-8100-0165': '9715',
-                     '800-8100-0164': '9993', '700-7851-0117': '7510', '600-6700-0087': '9995', '800-8100-0169': '7994', '400-4100-0041': '9593', '400-4100-0044': '4482',
-                     '400-4100-0045': '4482', '400-4100-0046': '4482', '700-7400-0286': '8211', '600-6100-0062': '6512', '400-4300-0199': '7897', '400-4300-0200': '7897',
-                     '400-4300-0201': '7897', '400-4300-0202': '7897', '600-6300-0064': '9567', '600-6300-0066': '5400', '600-6900-0358': '9567', '700-7800-0118': '5511',
-                     '700-7850-0000': '7538', '700-7850-0129': '8699', '700-7850-0125': '7538', '700-7850-0124': '7538', '700-7850-0127': '7538', '700-7850-0126': '7538',
-                     '700-7850-0121': '7538', '700-7850-0123': '7538', '700-7850-0122': '7538', '800-8100-0170': '9211', '800-8000-0159': '8060', '700-7000-0107': '6000',
-                     '500-5000-0000': '7011', '900-9200-0219': '4493', '800-8600-0180': '7940', '600-6900-0097': '9567', '700-7900-0130': '9719', '700-7300-0111': '9221',
-                     '700-7900-0132': '9522', '600-6900-0096': '9567', '300-3100-0000': '8410', '550-5520-0228': '9718', '600-6600-0310': '9986', '800-8600-0193': '7992',
-                     '600-6900-0392': '9568', '550-5510-0358': '7947', '800-8500-0178': '7520', '800-8500-0179': '7522', '550-5520-0357': '7996', '800-8500-0177': '7521',
-                     '600-6400-0069': '9565', '400-4000-4582': '4581', '600-6500-0072': '9987', '400-4000-4581': '4581', '300-3000-0023': '7999', '600-6900-0393': '9568',
-                     '300-3000-0025': '5999', '300-3000-0024': '7999', '100-1100-0010': '9996', '400-4300-0308': '7897', '600-6300-0244': '9567', '600-6300-0245': '9567',
-                     '700-7460-0115': '7389', '600-6000-0061': '9535', '800-8200-0173': '8200', '800-8000-0325': '8060', '800-8200-0174': '8211', '600-6400-0070': '9565',
-                     '550-5510-0204': '7947', '550-5510-0205': '7947', '550-5510-0202': '7947', '550-5510-0203': '7947', '100-1100-0000': '9996'}
-
-    CuisineID_lookup = {'252-000': '50', '380-000': '100', '800-066': '82', '800-067': '85', '800-064': '53', '800-065': '4', '800-062': '75',
-                        '800-063': '76', '800-060': '41', '800-061': '74', '404-000': '95', '306-000': '18', '151-000': '29', '800-068': '86',
-                        '800-069': '87', '211-000': '92', '401-000': '46', '501-000': '81', '373-000': '98', '311-034': '77', '402-000': '102',
-                        '201-000': '3', '371-000': '30', '314-000': '35', '311-000': '47', '100-1000-0009': '27', '406-000': '83', '202-022': '8',
-                        '202-023': '8', '204-000': '44', '202-021': '8', '202-024': '8', '202-025': '8', '207-000': '33', '307-000': '20',
-                        '302-000': '6', '202-020': '8', '378-000': '54', '350-000': '42', '310-000': '49', 'None': '12', '103-000': '52',
-                        '208-000': '104', '309-000': '25', '205-000': '14', '210-000': '103', '203-026': '88', '377-000': '40', '101-000': '1',
-                        '101-001': '2', '101-002': '45', '101-003': '19', '101-004': '84', '504-000': '51', '400-000': '43', '303-000': '7',
-                        '209-000': '80', '382-000': '26', '212-000': '37', '506-000': '51', '251-000': '97', '202-019': '8', '202-018': '8',
-                        '152-000': '79', '202-012': '8', '202-017': '8', '202-016': '8', '202-015': '8', '202-014': '8', '308-000': '23',
-                        '370-000': '26', '800-058': '73', '800-057': '58', '800-056': '48', '203-000': '10', '376-000': '38', '202-000': '8',
-                        '206-000': '16', '150-000': '57', '375-000': '101', '500-000': '51', '305-000': '78', '379-000': '55', '403-000': '34',
-                        '202-013': '8', '102-000': '11', '101-070': '91', '505-000': '51', '313-000': '39', '250-000': '36', '301-000': '5',
-                        '304-000': '9', '800-079': '32', '800-078': '28', '800-071': '93', '800-073': '21', '800-075': '13', '800-074': '22',
-                        '800-077': '15', '800-076': '89', '351-000': '56', '374-000': '99', '405-000': '96'}
+    taxonomy = category_taxonomy()
+    USA_Core_POI_categories = taxonomy.group('USA_Core_POI')
+    corename_lookups = taxonomy.lookup('corename')
+    coreid_lookup = taxonomy.lookup('coreid')
+    CuisineID_lookup = taxonomy.lookup('cuisineid')
 
     Core_POI = core_or_non_core(Place)
     emit_string = ''
 
     # Get category
-    CategoryIds = []
-    CategoryIdList = Place.findall(ns+"CategoryId")
-    for Category in CategoryIdList:
-        CatId = Category.text
-        CategoryIds.append(CatId)
+    CategoryIds = category_ids(Place)
 
     if set(CategoryIds).intersection(USA_Core_POI_categories) and Core_POI == 'Non-Core':
 
@@ -3210,14 +2996,14 @@ def TQS_0010(Place):
 
             # CuisineID
             for nmc in non_matching_cats:
-                if nmc in CuisineID_lookup.keys():
+                if nmc in CuisineID_lookup:
                     CuisineIDList.append(CuisineID_lookup[nmc])
 
         elif len(non_matching_cats) == 1:
             non_matching_cat = list(non_matching_cats)[0]
 
             # CuisineID
-            if non_matching_cat in CuisineID_lookup.keys():
+            if non_matching_cat in CuisineID_lookup:
                 CuisineIDList.append(CuisineID_lookup[non_matching_cat])
 
         else:
@@ -3247,11 +3033,11 @@ def TQS_0010(Place):
             # 1509 Columbia Vista Dr, Point Roberts, WA 98281
             # address StreetName StreetType, city, state PostalCode
             try:
-                StreetName = Location.find(ns+"BaseName").text
+                StreetName = find_tag(Location, "BaseName").text
             except:
                 StreetName = "None"
             try:
-                city = Location.find(ns+"Level4").text
+                city = find_tag(Location, "Level4").text
             except:
                 # If city is not found at Level4, then try getting city via AdditionalData --> key="PA-Zone"
                 for AdditionalData in AddDataList:
@@ -3264,28 +3050,28 @@ def TQS_0010(Place):
                             city = "None"
             cities.append(city)
             try:
-                PostalCode = Location.find(ns+"PostalCode").text
+                PostalCode = find_tag(Location, "PostalCode").text
             except:
                 PostalCode = "None"
             postalcodes.append(PostalCode)
             try:
-                address = Location.find(ns+"HouseNumber").text
+                address = find_tag(Location, "HouseNumber").text
             except:
                 address = "None"
             try:
-                StreetType = Location.find(ns+"StreetType").text
+                StreetType = find_tag(Location, "StreetType").text
             except:
                 StreetType = "None"
 
             # Suffix and Prefix
             suffix = ''; prefix = ''
             try:
-                Suffix = Location.find(ns+"Suffix")
+                Suffix = find_tag(Location, "Suffix")
                 suffix = Suffix.text
             except:
                 pass
             try:
-                Prefix = Location.find(ns+"Prefix")
+                Prefix = find_tag(Location, "Prefix")
                 prefix = Prefix.text
             except:
                 pass
@@ -3300,7 +3086,7 @@ def TQS_0010(Place):
                     else:
                         # otherwise, try getting the full state name via Level2
                         try:
-                            state = Location.find(ns+"Level2").text
+                            state = find_tag(Location, "Level2").text
                         except:
                             state = "None"
             states.append(state)
@@ -3336,13 +3122,7 @@ def TQS_0010(Place):
             phone = "None"
 
         # TQS Scores
-        Attributes = Place.findall(ns+"Attribute")
-        Attribute_dict = {}
-        for Attribute in Attributes:
-            Attribute_attrib = Attribute.attrib
-            if 'key' in Attribute_attrib.keys():
-                kv = Attribute_attrib['key']
-                Attribute_dict[kv] = Attribute.text
+        Attribute_dict = additional_attributes(Place)
 
         try:
             modelVersion = Attribute_dict['modelVersion']
@@ -3377,27 +3157,16 @@ def TQS_0010(Place):
         ChainId = ''
         ChainList = Place.findall(ns+"Chain")
         for Chain in ChainList:
-            Text = Chain.find(ns+"Text")
+            Text = find_tag(Chain, "Text")
             TextAttrib = Text.attrib
             # default="true" type="OFFICIAL"
             if 'default' in TextAttrib.keys() and 'type' in TextAttrib.keys():
                 if TextAttrib['default'] == 'true' and TextAttrib['type'] == 'OFFICIAL':
-                    ChainId = Chain.find(ns+"Id").text
+                    ChainId = find_tag(Chain, "Id").text
 
 
         # ContactString URLs
-        URL_indicators = ["http", "www", ".com", ".net", ".org", "://"]
-
-        ContactStrings = Place.findall(ns+"ContactString")
-        webURLs = []; URL = ''
-        for ContactString in ContactStrings:
-            cs = ContactString.text
-            for URL_indicator in URL_indicators:
-                if URL_indicator in cs:
-                    cs = cs.strip('\n')
-                    webURLs.append(cs)
-
-        webURLset = set(webURLs)
+        webURLset = set(contact_urls(Place))
         if len(webURLset) > 1:
             URL = "; ".join(webURLset)
         else:
@@ -3420,13 +3189,10 @@ def TQS_0011(Place):
     """
     Core_POI = core_or_non_core(Place)
     if Core_POI == "Non-Core":
-        ContactStrings = Place.findall(ns+"ContactString")
-        for ContactString in ContactStrings:
-            if "http" in ContactString or "www" or ".com" in ContactString:
-                emit_string = 'TQS_0011|Has URL'
-                break
-            else:
-                emit_string = 'TQS_0011|Does not have URL'
+        if contact_urls(Place):
+            emit_string = 'TQS_0011|Has URL'
+        else:
+            emit_string = 'TQS_0011|Does not have URL'
         return emit_string
 
 
@@ -3438,50 +3204,18 @@ def TQS_0012(Place):
     xpath: PlaceList/Place/Content/Base/ContactList/Contact(@type=FAX)/ContactString
     """
 
-    USA_Core_POI_categories = set([ '100-1000-0000', '100-1000-0001', '100-1000-0002', '100-1000-0003', '100-1000-0004', '100-1000-0005', '100-1000-0006', '100-1000-0007',
-                                    '100-1000-0008', '100-1000-0009', '100-1000-0230', '100-1100-0000', '100-1100-0010', '200-2100-0019', '200-2200-0020', '200-2300-0021',
-                                    '300-3000-0023', '300-3000-0024', '300-3000-0025', '300-3000-0065', '300-3100-0000', '300-3100-0026', '300-3100-0027', '300-3100-0028',
-                                    '300-3100-0029', '400-4000-4581', '400-4000-4582', '400-4100-0035', '400-4100-0036', '400-4100-0037', '400-4100-0038', '400-4100-0039',
-                                    '400-4100-0041', '400-4100-0044', '400-4100-0045', '400-4100-0046', '400-4300-0000', '400-4300-0199', '400-4300-0200', '400-4300-0201',
-                                    '400-4300-0202', '400-4300-0308', '500-5000-0000', '500-5000-0053', '500-5000-0054', '500-5100-0056', '550-5510-0202', '550-5510-0203',
-                                    '550-5510-0204', '550-5510-0205', '550-5510-0358', '550-5510-0374', '550-5520-0207', '550-5520-0208', '550-5520-0209', '550-5520-0210',
-                                    '550-5520-0211', '550-5520-0212', '550-5520-0228', '550-5520-0357', '600-6000-0061', '600-6100-0062', '600-6200-0063', '600-6300-0064',
-                                    '600-6300-0066', '600-6300-0244', '600-6300-0245', '600-6300-0363', '600-6300-0364', '600-6400-0000', '600-6400-0069', '600-6400-0070',
-                                    '600-6500-0072', '600-6500-0073', '600-6500-0074', '600-6600-0078', '600-6600-0310', '600-6700-0087', '600-6800-0000', '600-6800-0089',
-                                    '600-6800-0090', '600-6800-0091', '600-6800-0092', '600-6900-0094', '600-6900-0388', '600-6900-0389', '600-6900-0390', '600-6900-0391',
-                                    '600-6900-0392', '600-6900-0393', '600-6900-0246', '600-6900-0394', '600-6900-0395', '600-6900-0396', '600-6900-0397', '600-6900-0398',
-                                    '600-6900-0095', '600-6900-0096', '600-6900-0097', '600-6900-0098', '600-6900-0247', '600-6900-0247', '600-6900-0248', '600-6900-0307',
-                                    '600-6900-0358', '700-7000-0107', '700-7300-0111', '700-7400-0286', '700-7450-0114', '700-7460-0115', '700-7600-0116', '700-7800-0118',
-                                    '700-7800-0120', '700-7850-0000', '700-7850-0121', '700-7850-0122', '700-7850-0123', '700-7850-0124', '700-7850-0125', '700-7850-0126',
-                                    '700-7850-0127', '700-7850-0129', '700-7851-0117', '700-7900-0130', '700-7900-0131', '700-7900-0132', '800-8000-0159', '800-8000-0325',
-                                    '800-8100-0163', '800-8100-0164', '800-8100-0165', '800-8100-0169', '800-8100-0170', '800-8200-0173', '800-8200-0174', '800-8300-0175',
-                                    '800-8400-0176', '800-8500-0177', '800-8500-0178', '800-8500-0179', '800-8500-0315', '800-8600-0180', '800-8600-0193', '900-9200-0219'])
+    USA_Core_POI_categories = category_taxonomy().group('USA_Core_POI')
 
 
     Core_POI = core_or_non_core(Place)
     CountryCode, PlaceId = CountryCode_PlaceID(Place)
 
     # Get category
-    CategoryIds = []
     emit_string = ''
-    CategoryIdList = Place.findall(ns+"CategoryId")
-    for Category in CategoryIdList:
-        CatId = Category.text
-        CategoryIds.append(CatId)
-
-    URL_indicators = ["http", "www", ".com", ".net", ".org", "://"]
+    CategoryIds = category_ids(Place)
 
     if set(CategoryIds).intersection(USA_Core_POI_categories) and Core_POI == 'Non-Core':
-        ContactStrings = Place.findall(ns+"ContactString")
-        webURLs = []; URL = ''
-        for ContactString in ContactStrings:
-            cs = ContactString.text
-            for ui in URL_indicators:
-                if ui in cs:
-                    cs = cs.strip('\n')
-                    webURLs.append(cs)
-
-        webURLset = set(webURLs)
+        webURLset = set(contact_urls(Place))
         if len(webURLset) > 1:
             URL = "; ".join(webURLset)
         else:
@@ -3602,6 +3336,10 @@ validation_modules = { 'Stats_0001': Stats_0001,
                         'Stats_0003': Stats_0003,
                         'Stats_0004': Stats_0004,
                         'Stats_0005': Stats_0005,
+                        'Stats_0006': Stats_0006,
+                        'Stats_0007': Stats_0007,
+                        'Stats_0008': Stats_0008,
+                        'Stats_0009': Stats_0009,
                         'Basic_0001': Basic_0001,
                         'Basic_0002': Basic_0002,
                         'Basic_0003': Basic_0003,
@@ -3695,6 +3433,498 @@ validation_modules = { 'Stats_0001': Stats_0001,
 
 print len(validation_modules), "modules implemented"
 
+# -----------------------------------------------------------------------------
+class TagPrefilter(object):
+    """
+    # Raw-line predicate: true unless every <tag> element on the line (any prefix, attributes or whitespace)
+    # plainly holds some other text. Text with entities, comments or CDATA, which only the parser can read,
+    # always passes, so a Place the validation would act on is never skipped.
+    """
+    def __init__(self, tag, values):
+        self.values = set(values)
+        self.pattern = re.compile(r'<(?:[^\s<>/:]+:)?' + re.escape(tag) +
+                                  r'(?:\s(?:[^>"\']|"[^"]*"|\'[^\']*\')*?)?(/?)>([^<]*)(<!)?')
+
+    def search(self, line, start=0, end=sys.maxint):
+        for match in self.pattern.finditer(line, start, end):
+            (empty, text, markup) = match.groups()
+            if empty:
+                continue
+            if markup or '&' in text or text.strip() in self.values:
+                return True
+        return False
+
+def country_prefilter(CountryCode):
+    """ Raw-line predicate for validations that only ever act on one CountryCode """
+    return TagPrefilter('CountryCode', [CountryCode])
+
+def PlaceId_prefilter(PlaceIds):
+    """ Raw-line predicate for validations that only ever act on the given PlaceId(s) """
+    return TagPrefilter('PlaceId', PlaceIds)
+
+# Optional raw-line prefilters, checked by mapper.py before a Place line is parsed.
+# A validation listed here can only ever emit for a Place whose raw xml matches its predicate (a substring
+# or an object with a search(line, start, end) method, like TagPrefilter), so when every enabled validation
+# has one, lines that match none of them are skipped without parsing. Validations that are not listed here
+# see every Place. New_0015 is built by the mapper from the queryPlaceId argument.
+validation_prefilters = { 'GEO_0001' : country_prefilter('ITA'),
+                          'GEO_0002' : country_prefilter('USA'),
+                          'GEO_0005' : country_prefilter('CAN'),
+                          'New_0001' : country_prefilter('USA'),
+                          'New_0004' : PlaceId_prefilter([PlaceID_to_search]),
+                          'New_0005' : PlaceId_prefilter([PlaceID_to_search]) }
+
+# -----------------------------------------------------------------------------
+# Reducer aggregations. reducer.py folds all the values emitted for one key with the aggregation of the key's
+# validation ID (the first | field of the key), i.e. 'Basic_0017a' for 'Basic_0017a|<PlaceId>'. IDs that are
+# not listed in validation_aggregations are summed, which for plain emits (each one a 1) is the count.
+# A validation hands a real value to the reducer by emitting (key, value) instead of just the key, i.e.
+#   return [('New_00xx|'+CountryCode+'|'+Category, Rating), ...]
+# Each aggregation keeps a small state per key: start() makes it from the first value, add() folds in another
+# value, merge() combines two states (reducer spills) and result() gives (count, output value). An aggregation
+# that writes several keys (TopK) has rows(key, state) instead, giving [(key, count, output value), ...]. having=N only
+# writes keys whose count is at least N. States are plain ints/tuples/lists/sets/bytearrays so they can be spilled.
+# For the memory budget of reducer.py --hash, state_size() is the rough size of a state and add_size() what an
+# add() of the value will grow it by, so fixed-size states (sums, min/max, sketches) don't count their values.
+value_size = 100        # Rough bytes per value a state keeps, on top of the text itself
+
+class SerializedState(str):
+    """
+    # A state written by an aggregation's dump() (the mapper's HyperLogLog sketches and --top summaries). Its type,
+    # not its text, tells the reducer to load() and merge() it instead of add()ing it as a value, so no raw value
+    # can pass for one. Text lines carry it as "key\t\tstate" (an empty middle field, which a "key\tvalue" line
+    # never has), binary records with tag bit 2 (see BinaryWriter).
+    """
+
+class Sum(object):
+    """ Total of the integer values """
+    def __init__(self, having=None):
+        self.having = having
+    def start(self, value):
+        return int(value)
+    def add(self, state, value):
+        return state + int(value)
+    def merge(self, state, other):
+        return state + other
+    def result(self, state):
+        return state, state
+    def state_size(self, state):
+        return 0
+    def add_size(self, state, value):
+        return 0
+
+class Min(object):
+    """ Smallest numeric value, written as it was emitted. The count is the number of values """
+    def __init__(self, having=None):
+        self.having = having
+    def better(self, a, b):
+        return a < b
+    def start(self, value):
+        return (1, float(value), value)
+    def add(self, state, value):
+        return self.merge(state, self.start(value))
+    def merge(self, state, other):
+        if self.better(other[1:], state[1:]):
+            return (state[0] + other[0],) + other[1:]
+        return (state[0] + other[0],) + state[1:]
+    def result(self, state):
+        return state[0], state[2]
+    def state_size(self, state):
+        return len(state[2])
+    def add_size(self, state, value):
+        return 0
+
+class Max(Min):
+    """ Largest numeric value, written as it was emitted. The count is the number of values """
+    def better(self, a, b):
+        return a > b
+
+class Distinct(object):
+    """ Number of distinct values """
+    def __init__(self, having=None):
+        self.having = having
+    def start(self, value):
+        return set([value])
+    def add(self, state, value):
+        state.add(value)
+        return state
+    def merge(self, state, other):
+        state.update(other)
+        return state
+    def result(self, state):
+        return len(state), len(state)
+    def state_size(self, state):
+        return sum(len(value) + value_size for value in state)
+    def add_size(self, state, value):
+        return 0 if value in state else len(value) + value_size
+
+class FirstN(object):
+    """ The first n values in sort order (the order `sort` delivers them in), written joined by | """
+    def __init__(self, n, having=None):
+        self.n = n
+        self.having = having
+    def start(self, value):
+        return [1, [value]]
+    def add(self, state, value):
+        state[0] += 1
+        if len(state[1]) < self.n or value < state[1][-1]:
+            bisect.insort(state[1], value)
+            del state[1][self.n:]
+        return state
+    def merge(self, state, other):
+        return [state[0] + other[0], sorted(state[1] + other[1])[:self.n]]
+    def result(self, state):
+        return state[0], '|'.join(state[1])
+    def state_size(self, state):
+        return sum(len(value) + value_size for value in state[1])
+    def add_size(self, state, value):
+        return len(value) + value_size if len(state[1]) < self.n else 0
+
+class HyperLogLog(object):
+    """
+    # Approximate number of distinct values in fixed memory: 2**precision one-byte registers, with a standard
+    # error of 1.04/sqrt(2**precision) (0.81% at the default 14). The mapper folds the values of each key into
+    # one sketch per task and emits it as a SerializedState (base64), the reducer merges sketches and adds raw
+    # values. Written as "estimate|+/-standard error"; the count for having is the estimate.
+    """
+    inverse_powers = [2.0 ** -rank for rank in range(65)]
+
+    def __init__(self, precision=14, having=None):
+        self.precision = precision
+        self.registers = 1 << precision
+        self.having = having
+
+    def start(self, value):
+        return self.add(bytearray(self.registers), value)
+
+    def add(self, state, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        else:
+            value = str(value)
+        (h,) = struct.unpack('<Q', hashlib.md5(value).digest()[:8])
+        register = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1      # Position of the first 1 bit after the register bits
+        if rank > state[register]:
+            state[register] = rank
+        return state
+
+    def merge(self, state, other):
+        for register, rank in enumerate(other):
+            if rank > state[register]:
+                state[register] = rank
+        return state
+
+    def state_size(self, state):
+        return len(state)
+
+    def add_size(self, state, value):
+        return 0
+
+    def dump(self, state):
+        return SerializedState(base64.b64encode(zlib.compress(str(state))))
+
+    def load(self, value):
+        return bytearray(zlib.decompress(base64.b64decode(value)))
+
+    def result(self, state):
+        m = self.registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(self.inverse_powers[rank] for rank in state)
+        zeros = state.count('\x00')
+        if estimate <= 2.5 * m and zeros:               # Small range correction (linear counting)
+            estimate = m * log(float(m) / zeros)
+        estimate = int(round(estimate))
+        return estimate, '%d|+/-%d' % (estimate, round(1.04 / sqrt(m) * estimate))
+
+class TopK(object):
+    """
+    # Heavy hitters: the k most frequent keys of a report with bounded error, without shuffling the long tail.
+    # What is counted is the whole emit key, or only its `field`-th '|' separated field (the BaseText, the word)
+    # for reports whose keys also name the Place and so are never repeated. A Misra-Gries summary of at most
+    # `capacity` counters (default 10*k): when it overflows, every counter is lowered by the (capacity+1)-th
+    # largest one and the ones left at 0 are dropped, and the amount taken off is added to the floor. A key's
+    # true count is between its counter and counter + floor, and the floor is at most (number of keys added) /
+    # (capacity + 1). Summaries merge by adding counters and floors, so the result does not depend on the order
+    # they arrive in. The mapper (--top) folds the keys of a report into one summary per task and emits it as a
+    # SerializedState (base64), the reducer merges them and rows() gives the top k keys as
+    # "<report>.top|key\tcount|+/-floor", the count being the upper bound and a whole key losing its report ID
+    # in front. The rows sort where the summary's own key does, so the output stays in key order.
+    """
+    def __init__(self, k=300, capacity=None, having=None, field=None):
+        self.k = k
+        self.capacity = capacity or 10 * k
+        self.having = having
+        self.field = field
+
+    def item(self, emit_string):
+        """ The part of an emit key the summary counts """
+        if self.field is None:
+            return emit_string
+        return emit_string.split('|', self.field + 1)[self.field]
+
+    def start(self, value):
+        return self.add([0, {}], value)
+
+    def add(self, state, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        counts = state[1]
+        counts[value] = counts.get(value, 0) + 1
+        if len(counts) > 2 * self.capacity:
+            self.compact(state)
+        return state
+
+    def compact(self, state):
+        counts = state[1]
+        if len(counts) > self.capacity:
+            cut = sorted(counts.itervalues(), reverse=True)[self.capacity]
+            state[0] += cut
+            state[1] = dict((key, count - cut) for key, count in counts.iteritems() if count > cut)
+        return state
+
+    def merge(self, state, other):
+        counts = state[1]
+        for key, count in other[1].iteritems():
+            counts[key] = counts.get(key, 0) + count
+        state[0] += other[0]
+        return state
+
+    def state_size(self, state):
+        return sum(len(key) + value_size for key in state[1])
+
+    def add_size(self, state, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')     # The counts are keyed by UTF-8 str (see add())
+        return 0 if value in state[1] else len(value) + value_size
+
+    def dump(self, state):
+        (floor, counts) = self.compact(state)
+        return SerializedState(base64.b64encode(zlib.compress(marshal.dumps((floor, counts)))))
+
+    def load(self, value):
+        (floor, counts) = marshal.loads(zlib.decompress(base64.b64decode(value)))
+        return [floor, counts]
+
+    def rows(self, key, state):
+        (floor, counts) = self.compact(state)
+        top = sorted(counts.iteritems(), key=lambda item: (-item[1], item[0]))[:self.k]
+        report = key[:-len(top_suffix)] + '|'
+        rows = []
+        for (value, count) in top:
+            value = value.decode('utf-8')
+            if value.startswith(report):
+                value = value[len(report):]
+            rows.append((key + u'|' + value, count + floor, '%d|+/-%d' % (count + floor, floor)))
+        rows.sort(key=lambda row: row[0] + u'\t')         # The order `sort` gives the "key\tval" lines
+        return rows
+
+default_aggregation = Sum()
+
+validation_aggregations = { 'Basic_0017a' : Sum(having=2),       # Only PlaceIds seen more than once are duplicates
+                            'Stats_0006' : HyperLogLog(),
+                            'Stats_0007' : HyperLogLog(),
+                            'Stats_0008' : HyperLogLog(),
+                            'Stats_0009' : HyperLogLog() }
+
+# Top-N reports that mapper.py --top reduces to their heavy hitters (see TopK). Their keys are folded into one
+# summary per report, shuffled under the ID '<report>.top': the BaseTexts with double spaces, the profanity
+# hits by word and the "system" combinations.
+heavy_hitters = { 'Basic_0020' : TopK(field=4),         # Basic_0020|CountryCode|PlaceId|message|BaseText
+                  'New_0006' : TopK(field=4),           # New_0006|CountryCode|PlaceId|message| word |BaseText
+                  'New_0014b' : TopK() }
+top_suffix = '.top'
+validation_aggregations.update((report + top_suffix, spec) for report, spec in heavy_hitters.items())
+
+# Counted IDs that only report keys seen more than once. local_runner.py --dedup finds their candidate keys with
+# Bloom filters first, so only (probable) repeats are shuffled instead of every key.
+duplicate_ids = set(v_id for v_id, spec in validation_aggregations.items()
+                    if isinstance(spec, Sum) and spec.having is not None and spec.having > 1)
+
+# -----------------------------------------------------------------------------
+class BloomFilter(object):
+    """
+    # Fixed size Bloom filter over str keys: size bits, hashes bit positions per key taken from one md5 digest
+    # (double hashing). A key that was added is always found; a key that wasn't is found with a small probability
+    # (about 1% at 10 bits per key). Filters of the same size can be combined, see bloom_seen_twice().
+    """
+    hashes = 7
+
+    def __init__(self, size, bits=None):
+        self.size = size
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    def positions(self, key):
+        (h1, h2) = struct.unpack('<QQ', hashlib.md5(key).digest())
+        return [(h1 + i*h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self.positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        for pos in self.positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+bloom_block = 1 << 20      # Bytes of each filter combined at a time by bloom_seen_twice()
+
+def bloom_seen_twice(paths, size):
+    """
+    # Filter of the bits set in at least two of the filters saved in paths (the bits of BloomFilters of the given
+    # size). A key added to two different filters is always in it. The filters are folded in one at a time, block
+    # by block, into running once/twice bit arrays, so memory is two filters whatever the number of filters. The
+    # blocks are combined as long integers, so the and/or run over whole words in C.
+    """
+    nbytes = (size + 7) // 8
+    (once, twice) = (bytearray(nbytes), bytearray(nbytes))
+    for path in paths:
+        offset = 0
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(bloom_block), ''):
+                end = offset + len(block)
+                if end <= nbytes:
+                    bits = long(binascii.hexlify(block), 16)
+                    seen = long(binascii.hexlify(once[offset:end]), 16)
+                    seen_twice = long(binascii.hexlify(twice[offset:end]), 16) | (seen & bits)
+                    twice[offset:end] = binascii.unhexlify('%0*x' % (len(block)*2, seen_twice))
+                    once[offset:end] = binascii.unhexlify('%0*x' % (len(block)*2, seen | bits))
+                offset = end
+        if offset != nbytes:
+            raise ValueError("%s is not a Bloom filter of %d bits" % (path, size))
+    return BloomFilter(size, twice)
+
+# -----------------------------------------------------------------------------
+# Binary intermediate format (mapper.py --binary), an alternative to "key\tvalue" text lines for local and piped
+# runs. A stream is a header followed by records:
+#   header  '\xffPVB' + version byte + varint dictionary size
+#   record  tag byte, then the key and the value:
+#           key    tag bit 0 clear: varint length + UTF-8 key, added to the key dictionary while it has room
+#                  tag bit 0 set:   varint index of a key in the dictionary
+#           value  tag bit 1 clear: varint count (plain emits, combiner counts)
+#                  tag bit 1 set:   varint length + UTF-8 value text (emitted values, sketches)
+#                  tag bit 2 set:   the value text is a SerializedState (sketches), read back as one
+# Varints are unsigned LEB128, so a count of 1 is one byte and a repeated key costs 1-3 bytes. Concatenated
+# streams are a valid stream (each header starts a new dictionary). 0xff can't start UTF-8 text, which is how
+# reducer.py tells the two formats apart.
+binary_magic = '\xffPVB'
+binary_version = 2
+varint_bytes = [chr(i) for i in range(128)]
+
+def encode_varint(n):
+    if n < 128:
+        return varint_bytes[n]
+    parts = []
+    while n >= 128:
+        parts.append(chr(n & 0x7f | 0x80))
+        n >>= 7
+    parts.append(chr(n))
+    return ''.join(parts)
+
+def decode_varint(buf, pos):
+    """ (value, position after it) of the varint at buf[pos] (a bytearray) """
+    (n, shift) = (0, 0)
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 128:
+            return n, pos
+        shift += 7
+
+class BinaryWriter(object):
+    """ Writes (key, value) records to out. Non-negative int values are counts, anything else is text """
+    def __init__(self, out, dictionary_size=1 << 16):
+        self.out = out
+        self.keys = {}
+        self.dictionary_size = dictionary_size
+        out.write(binary_magic + chr(binary_version) + encode_varint(dictionary_size))
+
+    def write(self, key, value):
+        key = "{0}".format(key)             # Same formatting (and unicode failures) as a text line
+        index = self.keys.get(key)
+        if index is None:
+            (tag, head) = (0, encode_varint(len(key)) + key)
+            if len(self.keys) < self.dictionary_size:
+                self.keys[key] = len(self.keys)
+        else:
+            (tag, head) = (1, encode_varint(index))
+        if type(value) is int and value >= 0:
+            tail = encode_varint(value)
+        elif type(value) is SerializedState:
+            (tag, tail) = (tag | 6, encode_varint(len(value)) + value)
+        else:
+            value = "{0}".format(value)
+            (tag, tail) = (tag | 2, encode_varint(len(value)) + value)
+        self.out.write(varint_bytes[tag] + head + tail)
+
+def read_binary_records(stream, decode=True, chunk_size=1 << 20):
+    """
+    # Yields the (key, value) records of a binary stream: counts as ints, keys and text values as unicode
+    # (UTF-8 str with decode=False), serialized states as SerializedState.
+    """
+    buf = bytearray()
+    (pos, keys, dictionary_size) = (0, [], 0)
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        del buf[:pos]
+        buf += data
+        (pos, n) = (0, len(buf))
+        try:
+            while pos < n:
+                start = pos
+                tag = buf[pos]
+                if tag == 0xff:
+                    if pos + 5 > n:
+                        raise IndexError
+                    if buf[pos:pos+4] != binary_magic or buf[pos+4] != binary_version:
+                        raise ValueError("not a binary record stream (or an unknown version)")
+                    (dictionary_size, pos) = decode_varint(buf, pos + 5)
+                    keys = []
+                    continue
+                pos += 1
+                if tag & 1:
+                    (index, pos) = decode_varint(buf, pos)
+                    key = keys[index]
+                else:
+                    (length, pos) = decode_varint(buf, pos)
+                    end = pos + length
+                    if end > n:
+                        raise IndexError
+                    key = str(buf[pos:end])
+                    if decode:
+                        key = key.decode('utf-8')
+                    pos = end
+                if tag & 2:
+                    (length, pos) = decode_varint(buf, pos)
+                    end = pos + length
+                    if end > n:
+                        raise IndexError
+                    value = str(buf[pos:end])
+                    if tag & 4:
+                        value = SerializedState(value)
+                    elif decode:
+                        value = value.decode('utf-8')
+                    pos = end
+                else:
+                    value = buf[pos]
+                    pos += 1
+                    if value >= 128:
+                        (value, pos) = decode_varint(buf, pos - 1)
+                if not tag & 1 and len(keys) < dictionary_size:
+                    keys.append(key)
+                yield key, value
+        except IndexError:
+            pos = start                     # Record continues in the next chunk
+    if pos < len(buf):
+        raise ValueError("binary record stream ends in the middle of a record")
+
 # -----------------------------------------------------------------------------
 def parseProductValXML():
     tree = etree.parse(xml_file)
@@ -3716,71 +3946,446 @@ def parseProductValXML():
     return product_validations
 
 # -----------------------------------------------------------------------------
-# Creating this function trimmed over 300 lines of repeated code!
-def CountryCode_PlaceID(Place):
+class IndexedPlace(object):
+    """
+    # Wraps a parsed Place so that every validation in the run list shares one tag index.
+    # The index maps each descendant tag to its elements (in document order) and is built with a single
+    # iter() pass the first time a './/{ns}Tag' lookup is made, so Place.find(ns+"Location") and
+    # Place.findall(ns+"Location") become dict hits instead of re-walking the whole Place every time.
+    # Any other path, attribute or method falls through to the underlying lxml element (Place.element).
+    # Note: findall() returns the shared list from the index, so validations must not modify it.
+    # Derived facts (see place_facts() below) are memoized in self.facts, which lives and dies with this Place.
+    """
+    def __init__(self, element):
+        self.element = element
+        self._index = None
+        self.facts = {}
+
+    def tag_index(self):
+        if self._index is None:
+            index = {}
+            for elem in self.element.iterdescendants():
+                tag = elem.tag
+                if tag in index:
+                    index[tag].append(elem)
+                else:
+                    index[tag] = [elem]
+            self._index = index
+        return self._index
+
+    def findall(self, path):
+        tag = indexed_tag(path)
+        if tag is None:
+            return self.element.findall(path)
+        return self.tag_index().get(tag, [])
+
+    def find(self, path):
+        tag = indexed_tag(path)
+        if tag is None:
+            return self.element.find(path)
+        found = self.tag_index().get(tag)
+        if found:
+            return found[0]
+        return None
+
+    def __getattr__(self, name):
+        return getattr(self.element, name)
+
+    def __iter__(self):
+        return iter(self.element)
+
+    def __len__(self):
+        return len(self.element)
+
+    def __getitem__(self, i):
+        return self.element[i]
+
+
+indexed_tags = {}
+def indexed_tag(path):
+    """ Returns the Clark-notation tag for a plain './/{ns}Tag' path, or None if the path needs real ElementPath """
     try:
-        CountryCode = Place.find(ns+"CountryCode").text
-    except:
-        CountryCode = 'None'
+        return indexed_tags[path]
+    except KeyError:
+        tag = None
+        if path.startswith(ns):
+            name = path[len(ns):]
+            if name and not re.search(r'[/\[\]*@.()]', name):
+                tag = t + name
+        indexed_tags[path] = tag
+        return tag
+
+# -----------------------------------------------------------------------------
+# One parser per task, tuned for this workload but kept safe: no DTD loading, no network access,
+# no entity expansion, and huge_tree for giant Places.
+parser_options = dict(load_dtd=False, no_network=True, resolve_entities=False, huge_tree=True)
+place_parser = etree.XMLParser(**parser_options)
+
+# Registry of compiled XPath objects for the first-match lookups the validations make below a Place element
+# (Location, GeoPosition, Parsed, ...), so each path is compiled once per task instead of once per call.
+# findall() below a Place stays ElementPath, which is as fast; lookups on the Place itself go through the
+# IndexedPlace tag index instead.
+place_tags = ('AdditionalAttribute', 'AdditionalData', 'Attribute', 'BaseName', 'BaseText', 'CategoryId',
+             'CategoryName', 'Chain', 'Contact', 'ContactString', 'CountryCode', 'ExternalReference',
+             'ExternalReferenceID', 'GeoPosition', 'HouseNumber', 'Id', 'Identity', 'Latitude', 'Level2',
+             'Level3', 'Level4', 'Level5', 'Link', 'Location', 'Longitude', 'Map', 'Parsed', 'PlaceId',
+             'PostalCode', 'Prefix', 'QualityLevel', 'Side', 'Spot', 'StandardNumber', 'StreetType', 'Suffix',
+             'Text', 'Unparsed')
+find_xpaths = {}
+def compile_tag_xpath(tag):
+    find_xpaths[tag] = etree.XPath('(descendant::pds:'+tag+')[1]', namespaces={'pds': t[1:-1]})
+for tag in place_tags:
+    compile_tag_xpath(tag)
+
+def find_tag(elem, tag):
+    """ Compiled equivalent of elem.find(ns+tag) """
     try:
-        PlaceId = Place.find(ns+"PlaceId").text
-    except:
-        PlaceId = 'None'
-    return CountryCode, PlaceId
+        found = find_xpaths[tag](elem)
+    except KeyError:
+        compile_tag_xpath(tag)
+        found = find_xpaths[tag](elem)
+    if found:
+        return found[0]
+    return None
+
+# -----------------------------------------------------------------------------
+def place_facts(Place):
+    """
+    # Returns the memo of derived facts for this Place. Each fact below is computed at most once per Place
+    # and then shared by every validation in the run list. A bare lxml element gets a throwaway memo.
+    """
+    try:
+        return Place.facts
+    except AttributeError:
+        return {}
+
+# -----------------------------------------------------------------------------
+# Creating this function trimmed over 300 lines of repeated code!
+def CountryCode_PlaceID(Place):
+    facts = place_facts(Place)
+    if 'CountryCode_PlaceID' not in facts:
+        try:
+            CountryCode = Place.find(ns+"CountryCode").text
+        except:
+            CountryCode = 'None'
+        try:
+            PlaceId = Place.find(ns+"PlaceId").text
+        except:
+            PlaceId = 'None'
+        facts['CountryCode_PlaceID'] = (CountryCode, PlaceId)
+    return facts['CountryCode_PlaceID']
 
 # -----------------------------------------------------------------------------
 def core_or_non_core(Place):
     """ Determine if it is a Core POI or not """
+    facts = place_facts(Place)
+    if 'Core_POI' not in facts:
+        system_set = set()
+        ExternalReferenceList = Place.findall(ns+"ExternalReference")
+        for ExternalReference in ExternalReferenceList:
+            ExternalRefattrib = ExternalReference.attrib
+            if 'system' in ExternalRefattrib.keys():
+                ExternalRefSystem = ExternalRefattrib['system']
+                system_set.add(ExternalRefSystem)
+        # After traversing all ExternalReferences:
+        if "corepoixml" in system_set:
+            facts['Core_POI'] = 'Core'
+        else:
+            facts['Core_POI'] = 'Non-Core'
+    return facts['Core_POI']
 
-    system_set = set()
-    Core_POI = ""
-    ExternalReferenceList = Place.findall(ns+"ExternalReference")
-    for ExternalReference in ExternalReferenceList:
-        ExternalRefattrib = ExternalReference.attrib
-        if 'system' in ExternalRefattrib.keys():
-            ExternalRefSystem = ExternalRefattrib['system']
-            system_set.add(ExternalRefSystem)
-    # After traversing all ExternalReferences:
-    if "corepoixml" in system_set:
-        Core_POI = 'Core'
-    else:
-        Core_POI = 'Non-Core'
-    return Core_POI
+# -----------------------------------------------------------------------------
+def first_category(Place):
+    """ The Text of the first CategoryName in the Place, or "None" """
+    facts = place_facts(Place)
+    if 'FirstCategory' not in facts:
+        CategoryNames = Place.findall(ns+"CategoryName")
+        if CategoryNames:
+            facts['FirstCategory'] = find_tag(CategoryNames[0], "Text").text
+        else:
+            facts['FirstCategory'] = "None"
+    return facts['FirstCategory']
+
+# -----------------------------------------------------------------------------
+def basetext_scripts(Place):
+    """ [(text, languageCode, text_scripts(text)), ...] for every BaseText of the Place (text may be None) """
+    facts = place_facts(Place)
+    if 'BaseTextScripts' not in facts:
+        summary = []
+        for BaseText in Place.findall(ns+"BaseText"):
+            btext = BaseText.text
+            btext_lc = BaseText.attrib.get('languageCode', 'None')
+            summary.append((btext, btext_lc, text_scripts(btext) if btext is not None else None))
+        facts['BaseTextScripts'] = summary
+    return facts['BaseTextScripts']
+
+# -----------------------------------------------------------------------------
+def basename_scripts(Place):
+    """ [(StreetName/BaseName text, Parsed languageCode, text_scripts(text)), ...] for every Parsed (text None without one) """
+    facts = place_facts(Place)
+    if 'BaseNameScripts' not in facts:
+        summary = []
+        for Parsed in Place.findall(ns+"Parsed"):
+            Parsed_lc = Parsed.attrib.get('languageCode', 'None')
+            try:
+                btext = find_tag(Parsed, "BaseName").text.rstrip("\n")
+            except:
+                btext = None
+            summary.append((btext, Parsed_lc, text_scripts(btext) if btext is not None else None))
+        facts['BaseNameScripts'] = summary
+    return facts['BaseNameScripts']
+
+# -----------------------------------------------------------------------------
+lint_field_tags = ('StreetType', 'Level3', 'Level4', 'Level5')
+
+def parsed_lint_fields(Place):
+    """
+    # [{'StreetType': text, 'Level3': text, 'Level4': text, 'Level5': text}, ...] per Parsed: the text of the first
+    # such element below the Parsed without trailing newlines, or "" when there is none (or it is empty).
+    """
+    facts = place_facts(Place)
+    if 'ParsedLintFields' not in facts:
+        fields_list = []
+        tags = [t + tag for tag in lint_field_tags]
+        for Parsed in Place.findall(ns+"Parsed"):
+            fields = dict.fromkeys(lint_field_tags, "")
+            seen = set()
+            for elem in Parsed.iterdescendants(*tags):
+                if elem.tag not in seen:
+                    seen.add(elem.tag)
+                    if elem.text is not None:
+                        fields[elem.tag[len(t):]] = elem.text.rstrip("\n")
+            fields_list.append(fields)
+        facts['ParsedLintFields'] = fields_list
+    return facts['ParsedLintFields']
+
+# -----------------------------------------------------------------------------
+def contact_list(Place):
+    """ classify_contact() of every Contact of the Place, in document order """
+    facts = place_facts(Place)
+    if 'Contacts' not in facts:
+        facts['Contacts'] = [classify_contact(Contact) for Contact in Place.findall(ns+"Contact")]
+    return facts['Contacts']
+
+def contact_urls(Place):
+    """ The ContactString texts of the URL Contacts, without trailing newlines """
+    return [contact['text'].strip('\n') for contact in contact_list(Place) if contact['url']]
 
 # -----------------------------------------------------------------------------
-def math_distance(a, b, unit):
+def category_ids(Place):
+    """ The CategoryId texts of the Place, in document order """
+    facts = place_facts(Place)
+    if 'CategoryIds' not in facts:
+        facts['CategoryIds'] = [Category.text for Category in Place.findall(ns+"CategoryId")]
+    return facts['CategoryIds']
+
+# -----------------------------------------------------------------------------
+def additional_attributes(Place):
+    """
+    # Key/value map of every AdditionalAttribute/Attribute in the Place, i.e. {'overallScore': '4', 'modelVersion': ...}
+    # If a key appears more than once, the last one in the Place wins.
+    """
+    facts = place_facts(Place)
+    if 'AdditionalAttributes' not in facts:
+        Attribute_dict = {}
+        for Attribute in Place.findall(ns+"Attribute"):
+            Attribute_attrib = Attribute.attrib
+            if 'key' in Attribute_attrib.keys():
+                Attribute_dict[Attribute_attrib['key']] = Attribute.text
+        facts['AdditionalAttributes'] = Attribute_dict
+    return facts['AdditionalAttributes']
+
+# -----------------------------------------------------------------------------
+# Batched coordinate checks. Basic_0003, Basic_0004, Basic_0006a and Basic_0006b only look at the GeoPosition
+# Latitude/Longitude text, so when NumPy is available the mapper collects those values from a batch of Places
+# into columns and runs each check once per batch as array operations. The emit strings are the same as the
+# per-Place functions above, which are still used when NumPy is not installed.
+batched_validations = ('Basic_0003', 'Basic_0004', 'Basic_0006a', 'Basic_0006b')
+
+def coordinate_text(elem):
+    """ str() of a Latitude/Longitude text as Basic_0003/0004 see it, or None where they report the element missing """
+    try:
+        return str(elem.text)
+    except:
+        return None
+
+class CoordinateBatch(object):
+    """
+    # Columns for a batch of Places:
+    #   places                      (CountryCode, PlaceId, set of the batched validations run on it)
+    #   geo_place, lat, lon         one row per GeoPosition (Basic_0003/0004)
+    #   pair_place, side, display_lat, display_lon, routing_lat, routing_lon
+    #                               one row per DISPLAY/ROUTING comparison Basic_0006a/b make
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.current = None
+        self.places = []
+        self.geo_place = []; self.lat = []; self.lon = []
+        self.pair_place = []; self.side = []
+        self.display_lat = []; self.display_lon = []; self.routing_lat = []; self.routing_lon = []
+
+    def __len__(self):
+        return len(self.places)
+
+    def add(self, Place, val):
+        """ Records what val needs from this Place. Nothing is emitted until flush() """
+        if self.current is not Place:
+            self.current = Place
+            CountryCode, PlaceId = CountryCode_PlaceID(Place)
+            self.places.append((CountryCode, PlaceId, set()))
+        index = len(self.places) - 1
+        vals = self.places[index][2]
+        if val in ('Basic_0003', 'Basic_0004') and 'Basic_0003' not in vals and 'Basic_0004' not in vals:
+            for GeoPosition in Place.findall(ns+"GeoPosition"):
+                self.geo_place.append(index)
+                self.lat.append(coordinate_text(find_tag(GeoPosition, "Latitude")))
+                self.lon.append(coordinate_text(find_tag(GeoPosition, "Longitude")))
+        if val in ('Basic_0006a', 'Basic_0006b') and 'Basic_0006a' not in vals and 'Basic_0006b' not in vals:
+            self.add_display_routing(Place, index)
+        vals.add(val)
+
+    def add_display_routing(self, Place, index):
+        # Same walk as Basic_0006a/b, including the last DISPLAY/ROUTING seen carrying over to the next Location
+        display = routing = None
+        for Location in Place.findall(ns+"Location"):
+            try:
+                Side = find_tag(Location, "Side").text
+            except:
+                Side = "None"
+            GeoPositionList = Location.findall(ns+"GeoPosition")
+            if len(GeoPositionList) == 2:
+                for GeoPosition in GeoPositionList:
+                    GeoPosition_type = GeoPosition.get("type")
+                    if GeoPosition_type is None:
+                        continue
+                    if GeoPosition_type == 'DISPLAY':
+                        display = (find_tag(GeoPosition, "Latitude"), find_tag(GeoPosition, "Longitude"))
+                    if GeoPosition_type == 'ROUTING':
+                        routing = (find_tag(GeoPosition, "Latitude"), find_tag(GeoPosition, "Longitude"))
+                    if (Side == "left" or Side == "right") and display and routing and None not in display + routing:
+                        self.pair_place.append(index)
+                        self.side.append(Side)
+                        self.display_lat.append(display[0].text)
+                        self.display_lon.append(display[1].text)
+                        self.routing_lat.append(routing[0].text)
+                        self.routing_lon.append(routing[1].text)
+
+    def flush(self):
+        """ Runs the batched checks over everything added since the last flush and returns the emit strings """
+        return_emits = []
+        if self.geo_place:
+            geo_place = np.array(self.geo_place)
+            return_emits.extend(coordinate_emits('Basic_0003', 'Latitude', 90, self.lat, geo_place, self.places))
+            return_emits.extend(coordinate_emits('Basic_0004', 'Longitude', 180, self.lon, geo_place, self.places))
+        if self.pair_place:
+            same_lat = np.array(self.display_lat, dtype=object) == np.array(self.routing_lat, dtype=object)
+            same_lon = np.array(self.display_lon, dtype=object) == np.array(self.routing_lon, dtype=object)
+            for i in np.flatnonzero(same_lat & same_lon):
+                CountryCode, PlaceId, vals = self.places[self.pair_place[i]]
+                if 'Basic_0006a' in vals:
+                    return_emits.append('Basic_0006a|'+CountryCode+'|DISPLAY and ROUTING Lat/Longs are identical')
+                if 'Basic_0006b' in vals:
+                    emit_string = 'Basic_0006b|'+CountryCode+'|'+PlaceId+'|DISPLAY and ROUTING Lat/Longs are identical|Side='+self.side[i]
+                    return_emits.append(emit_string)
+        self.clear()
+        return return_emits
+
+def coordinate_emits(val, name, limit, values, geo_place, places):
+    """ Basic_0003 (Latitude, limit 90) or Basic_0004 (Longitude, limit 180) over one column of a CoordinateBatch """
+    wanted = np.array([val in vals for CountryCode, PlaceId, vals in places])[geo_place]
+    if not wanted.any():
+        return []
+    missing = np.array([value is None for value in values])
+    text = np.array(['' if value is None else value for value in values])
+    null = ~missing & ((text == 'None') | (text == ''))
+    checked = ~missing & ~null
+    exponent = checked & (np.char.find(text, 'E') >= 0)
+    number = np.zeros(len(values))
+    parsed = checked.copy()
+    try:
+        number[checked] = text[checked].astype(np.float64)
+    except:
+        for i in np.flatnonzero(checked):       # At least one value is not a number, find out which
+            try:
+                number[i] = float(values[i])
+            except:
+                parsed[i] = False
+    with np.errstate(invalid='ignore'):         # "nan" parses and is neither out of range nor 0, as before
+        out_of_range = parsed & ((number > limit) | (number < -limit))
+        zero = parsed & (number == 0)
+    flagged = wanted & (missing | null | exponent | ~parsed | out_of_range | zero)
+    return_emits = []
+    for i in np.flatnonzero(flagged):
+        CountryCode, PlaceId = places[geo_place[i]][:2]
+        value = values[i]
+        if missing[i]:
+            return_emits.append(val+'d|'+CountryCode+'|'+PlaceId+'|'+name+' element is missing|<'+name+'>')
+            continue
+        if null[i]:
+            return_emits.append(val+'a|'+CountryCode+'|'+PlaceId+'|'+name+' is 0 or Null|'+value)
+            continue
+        if exponent[i]:
+            return_emits.append(val+'c|'+CountryCode+'|'+PlaceId+'|'+name+' Invalid format|'+value)
+        if not parsed[i]:
+            return_emits.append(val+'d|'+CountryCode+'|'+PlaceId+'|'+name+' element is missing|<'+name+'>')
+            continue
+        if out_of_range[i]:
+            return_emits.append(val+'b|'+CountryCode+'|'+PlaceId+'|'+name+' not between -%d and %d|' % (limit, limit)+value)
+        if zero[i]:
+            return_emits.append(val+'a|'+CountryCode+'|'+PlaceId+'|'+name+' is 0 or Null|'+value)
+    return return_emits
+
+# -----------------------------------------------------------------------------
+earth_radius = { 'mi' : 3958.76,              # miles
+                 'km' : 6.371*1000,           # km
+                 'm'  : 6.371*1000*1000 }     # meters
+
+def math_distance(a, b, unit="m"):
     """Example input (LAT, LONG):
     a = (49.8755, 6.07594)
     b = (49.87257, 6.0784)
-    """
-    miles = 3958.76             # miles
-    km = 6.371*1000             # km
-    meters = 6.371*1000*1000    # meters
-
-    if unit == "mi":
-        dist = miles
-    elif unit == "km":
-        dist = km
-    elif unit == "m":
-        dist = meters
-    else:
-        dist = meters
-
-    y1  = float(a[0])
-    x1  = float(a[1])
-    y2  = float(b[0])
-    x2  = float(b[1])
-
-    y1 *= pi/180.0
-    x1 *= pi/180.0
-    y2 *= pi/180.0
-    x2 *= pi/180.0
-
-    # approximate great circle distance with law of cosines
-    x = sin(y1)*sin(y2) + cos(y1)*cos(y2)*cos(x2-x1)
-    if x > 1:
-        x = 1
-    return acos( x ) * dist
+    # Great circle distance with the haversine formula, which (unlike the law of cosines) stays accurate for
+    # sub-meter deltas. unit is "m" (default), "km" or "mi". Coordinates may be strings or numbers.
+    # a and b can also be N pairs each (lists of pairs or N x 2 arrays, or one pair against N): the distances
+    # are then computed in one go with NumPy and returned as an array of N, or pair by pair as a list of N
+    # without NumPy.
+    """
+    dist = earth_radius.get(unit, earth_radius['m'])
+
+    if batch_of_pairs(a) or batch_of_pairs(b):
+        if np is None:
+            if not batch_of_pairs(a):
+                a = [a] * len(b)
+            if not batch_of_pairs(b):
+                b = [b] * len(a)
+            if len(a) != len(b):
+                raise ValueError("math_distance: %d pairs against %d pairs" % (len(a), len(b)))
+            return [math_distance(pair_a, pair_b, unit) for (pair_a, pair_b) in zip(a, b)]
+        a = np.radians(np.asarray(a, dtype=np.float64))
+        b = np.radians(np.asarray(b, dtype=np.float64))
+        y1, x1 = a[..., 0], a[..., 1]
+        y2, x2 = b[..., 0], b[..., 1]
+        h = np.sin((y2-y1)/2)**2 + np.cos(y1)*np.cos(y2)*np.sin((x2-x1)/2)**2
+        return 2 * np.arcsin(np.sqrt(np.clip(h, 0, 1))) * dist
+
+    y1  = float(a[0])*pi/180.0
+    x1  = float(a[1])*pi/180.0
+    y2  = float(b[0])*pi/180.0
+    x2  = float(b[1])*pi/180.0
+
+    h = sin((y2-y1)/2)**2 + cos(y1)*cos(y2)*sin((x2-x1)/2)**2
+    if h > 1:
+        h = 1
+    return 2 * asin(sqrt(h)) * dist
+
+def batch_of_pairs(a):
+    """ True for a list/array of (LAT, LONG) pairs rather than a single pair """
+    if np is not None and isinstance(a, np.ndarray):
+        return a.ndim > 1
+    return len(a) > 0 and not isinstance(a[0], basestring) and hasattr(a[0], '__len__')
 
 # -----------------------------------------------------------------------------
 def getValidationList(Product):
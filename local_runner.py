@@ -0,0 +1,343 @@
+#!/usr/lib/python_2.7.3/bin/python
+#-------------------------------------------------------------------------------
+# Name:         local_runner.py
+
+# Purpose:      Runs the MapReduce framework on a single machine instead of Hadoop streaming.
+#               Every country xml file in a directory gets its own mapper.py (with map_input_file set to the
+#               file name), the mapper outputs are sorted and merged (the shuffle), and reducer.py turns the
+#               merged stream into the same output the Hadoop job writes.
+#
+# Usage:        python local_runner.py <xml directory> <Product> [queryPlaceId] [options]
+#                   --processes=N   Number of mappers run at the same time (default: number of cores)
+#                   --output=PATH   Write the reducer output to PATH instead of stdout
+#                   --hash          Skip the sort and run reducer.py --hash over the unsorted mapper outputs
+#                   --reducers=N    Hash-partition the keys over N reducer.py processes (default 1). The partition
+#                                   outputs are merged back into one output in key order, the same as a single reducer.
+#                   --dedup         Two-stage duplicate search for Basic_0017a (pv.duplicate_ids): the mappers build
+#                                   Bloom filters of their keys instead of shuffling them, the filters are merged
+#                                   into "seen in two tasks", and only keys passing it (or repeated within a task)
+#                                   are counted exactly. The output is the same.
+#                   --bloom-bits=N  Bloom filter size for --dedup (default: 10 bits per Place estimated from input size)
+#                   --binary        The mappers write the binary record format (mapper.py --binary) instead of text lines.
+#                                   Implies --hash, since the records are not sorted.
+#                   --sort-memory=MB
+#                                   Map output a mapper task sorts in memory at a time (default 256). Larger outputs are
+#                                   sorted in runs of this size that are merged from temp files.
+#               Any other "--" option (i.e. --iterparse) is passed on to mapper.py.
+#               .xml files may also be gzip, bz2 or xz compressed (COL.xml.gz).
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import zlib
+import heapq
+import itertools
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')      # PlacesValidations announces itself on stdout when imported
+import PlacesValidations as pv
+sys.stdout = stdout
+
+framework_dir = os.path.dirname(os.path.abspath(__file__))     # mapper.py, reducer.py and product_vals.xml
+mapper_script = os.path.join(framework_dir, 'mapper.py')
+reducer_script = os.path.join(framework_dir, 'reducer.py')
+input_suffixes = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz')
+place_bytes = 2000              # Rough size of one Place line, for sizing the --dedup Bloom filters
+compression_ratio = 5
+sort_memory = 256               # MB, see --sort-memory
+
+
+def input_files(xml_dir):
+    """ The country xml files in xml_dir, i.e. [.../COL.xml, .../USA.xml.gz] """
+    return [os.path.join(xml_dir, name) for name in sorted(os.listdir(xml_dir))
+            if name.endswith(input_suffixes) and os.path.isfile(os.path.join(xml_dir, name))]
+
+
+def partition(line, partitions):
+    """ Reducer partition of a "key\tval" line, for the key exactly as reducer.py reads it """
+    key = line.decode('utf-8', 'replace').strip().split(u"\t")[0]
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+
+def run_mapper(job):
+    """
+    # Pool worker: runs mapper.py over one xml file, like one Hadoop map task, then splits its output into
+    # the reducer partitions, each sorted unless the reducers run in --hash mode (the map side of the shuffle).
+    # Returns the paths of the partition files, one per reducer.
+    """
+    (xml_file, mapper_args, work_dir, sort_output, partitions, bloom_bits, binary, sort_bytes) = job
+    map_output = os.path.join(work_dir, os.path.basename(xml_file) + '.map')
+    env = dict(os.environ)
+    env['map_input_file'] = xml_file
+    if bloom_bits:
+        mapper_args = mapper_args + ['--bloom=' + bloom_prefix(work_dir, xml_file), '--bloom-bits=%d' % bloom_bits]
+    with open(map_output, 'wb') as out:
+        returncode = subprocess.call([sys.executable, mapper_script] + mapper_args + ['--input=' + xml_file],
+                                     stdout=out, env=env, cwd=framework_dir)
+    if returncode != 0:
+        raise RuntimeError("mapper.py failed on %s (exit code %d)" % (xml_file, returncode))
+    if partitions == 1:
+        if sort_output:
+            sort_file(map_output, sort_bytes)
+        return [map_output]
+    with open(map_output, 'rb') as f:
+        if binary:
+            partition_files = write_binary_partitions(pv.read_binary_records(f, decode=False), map_output, partitions)
+        else:
+            partition_files = write_partitions(f, map_output, sort_output, partitions, sort_bytes)
+    os.remove(map_output)
+    return partition_files
+
+
+def write_partitions(lines, map_output, sort_output, partitions, sort_bytes):
+    """
+    # Streams map output lines into one file per reducer partition (map_output, or map_output.<i>), then sorts
+    # each file with sort_file().
+    """
+    paths = [map_output if partitions == 1 else '%s.%d' % (map_output, i) for i in range(partitions)]
+    files = [open(path, 'wb') for path in paths]
+    try:
+        if partitions == 1:
+            files[0].writelines(lines)
+        else:
+            for line in lines:
+                files[partition(line, partitions)].write(line)
+    finally:
+        for f in files:
+            f.close()
+    if sort_output:
+        for path in paths:
+            sort_file(path, sort_bytes)
+    return paths
+
+
+def sort_file(path, sort_bytes):
+    """
+    # Sorts the lines of a file in place without holding more than about sort_bytes of them: each block of lines
+    # is sorted into a temp file (a run) and the runs are merged back into path. A file that fits is sorted in memory.
+    """
+    runs = []
+    try:
+        with open(path, 'rb') as f:
+            lines = f.readlines(sort_bytes)
+            while lines:
+                lines.sort()
+                more = f.readlines(sort_bytes)
+                if not more and not runs:
+                    break
+                run = tempfile.TemporaryFile(prefix='sort_run_', dir=os.path.dirname(path))
+                run.writelines(lines)
+                run.seek(0)
+                runs.append(run)
+                lines = more
+        with open(path, 'wb') as f:
+            if runs:
+                f.writelines(heapq.merge(*runs))
+            else:
+                f.writelines(lines)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def write_binary_partitions(records, map_output, partitions):
+    """ write_partitions() for binary (key, value) records: each partition file is a binary stream of its own """
+    paths = [map_output if partitions == 1 else '%s.%d' % (map_output, i) for i in range(partitions)]
+    files = [open(path, 'wb') for path in paths]
+    try:
+        writers = [pv.BinaryWriter(f).write for f in files]
+        for key, value in records:
+            writers[zlib.crc32(key) % partitions](key, value)
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def run_reducer(map_outputs, output, hash_reduce):
+    """
+    # Merges the sorted mapper outputs into one sorted stream (the reduce side of the shuffle) and reduces it.
+    # With hash_reduce the outputs are unsorted and simply concatenated into reducer.py --hash.
+    """
+    reducer_args = ['--hash'] if hash_reduce else []
+    reducer = subprocess.Popen([sys.executable, reducer_script] + reducer_args, stdin=subprocess.PIPE, stdout=output,
+                               cwd=framework_dir)
+    files = [open(path, 'rb') for path in map_outputs]
+    try:
+        if hash_reduce:
+            reducer.stdin.writelines(itertools.chain(*files))
+        else:
+            reducer.stdin.writelines(heapq.merge(*files))
+    finally:
+        reducer.stdin.close()
+        for f in files:
+            f.close()
+    if reducer.wait() != 0:
+        raise RuntimeError("reducer.py failed (exit code %d)" % reducer.returncode)
+
+
+# Two-stage duplicate search (--dedup) ------------------------------
+def bloom_prefix(work_dir, xml_file):
+    return os.path.join(work_dir, os.path.basename(xml_file))
+
+
+def bloom_size(files):
+    """ 10 bits per Place (about 1% false positives per task filter), estimated from the input file sizes """
+    total = 0
+    for xml_file in files:
+        size = os.path.getsize(xml_file)
+        if not xml_file.endswith('.xml'):
+            size *= compression_ratio
+        total += size
+    return max(1 << 20, total // place_bytes * 10)
+
+
+def find_candidates(files, work_dir, bloom_bits):
+    """
+    # Merges the per-task Bloom filters into one of the keys seen in at least two tasks (seen_twice.bloom) and
+    # collects the keys repeated within a task (candidates). Every real duplicate passes one of the two.
+    """
+    candidates = set()
+    for xml_file in files:
+        with open(bloom_prefix(work_dir, xml_file) + '.cand', 'rb') as f:
+            candidates.update(f.readlines())
+    seen_twice = pv.bloom_seen_twice([bloom_prefix(work_dir, xml_file) + '.bloom' for xml_file in files], bloom_bits)
+    with open(os.path.join(work_dir, 'seen_twice.bloom'), 'wb') as f:
+        f.write(seen_twice.bits)
+    with open(os.path.join(work_dir, 'candidates'), 'wb') as f:
+        f.writelines(sorted(candidates))
+
+
+def confirm_duplicates(job):
+    """
+    # Pool worker, stage two: re-reads one task's keys and writes "key\t1" for every key that is a candidate
+    # duplicate, split into reducer partitions like a map output. The reducer then counts them exactly and its
+    # having rule drops the false positives.
+    """
+    (xml_file, work_dir, sort_output, partitions, bloom_bits, binary, sort_bytes) = job
+    with open(os.path.join(work_dir, 'seen_twice.bloom'), 'rb') as f:
+        seen_twice = pv.BloomFilter(bloom_bits, bytearray(f.read()))
+    with open(os.path.join(work_dir, 'candidates'), 'rb') as f:
+        candidates = set(f.readlines())
+    prefix = bloom_prefix(work_dir, xml_file)
+    with open(prefix + '.keys', 'rb') as f:
+        keys = (key[:-1] for key in f if key in candidates or key[:-1] in seen_twice)
+        if binary:
+            return write_binary_partitions(((key, 1) for key in keys), prefix + '.dup', partitions)
+        return write_partitions((key + '\t1\n' for key in keys), prefix + '.dup', sort_output, partitions, sort_bytes)
+
+
+def reduce_partition(job):
+    """ Pool worker: runs one reducer.py over one partition. Returns the path of its output """
+    (map_outputs, reduce_output, hash_reduce) = job
+    with open(reduce_output, 'wb') as output:
+        run_reducer(map_outputs, output, hash_reduce)
+    return reduce_output
+
+
+def output_lines(f):
+    """ (key + "\t", line) for each "key\tval" line of a reducer output: the order reducer.py writes its keys in """
+    for line in f:
+        yield line.split('\t', 1)[0] + '\t', line
+
+
+def merge_outputs(reduce_outputs, output):
+    """
+    # Every key is in exactly one partition and reducer.py writes each partition in key order (the rows of a --top
+    # report included, see pv.TopK.rows), so merging on the key restores the order of a single reducer.
+    """
+    files = [open(path, 'rb') for path in reduce_outputs]
+    try:
+        output.writelines(line for (key, line) in heapq.merge(*[output_lines(f) for f in files]))
+    finally:
+        for f in files:
+            f.close()
+
+
+def main():
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 2:
+        sys.exit("Usage: python local_runner.py <xml directory> <Product> [queryPlaceId] [--processes=N] [--output=PATH] "
+                 "[--hash] [--reducers=N] [--dedup] [--bloom-bits=N] [--binary] [--sort-memory=MB]")
+
+    xml_dir = os.path.abspath(args[0])
+    mapper_args = args[1:3]                         # Product [queryPlaceId]
+    processes = multiprocessing.cpu_count()
+    output_path = None
+    hash_reduce = False
+    reducers = 1
+    dedup = False
+    bloom_bits = None
+    binary = False
+    sort_bytes = sort_memory*1024*1024
+    for option in options:
+        if option.startswith('--processes='):
+            processes = int(option.split('=', 1)[1])
+        elif option.startswith('--output='):
+            output_path = option.split('=', 1)[1]
+        elif option == '--hash':
+            hash_reduce = True
+        elif option.startswith('--reducers='):
+            reducers = int(option.split('=', 1)[1])
+        elif option == '--dedup':
+            dedup = True
+        elif option.startswith('--bloom-bits='):
+            bloom_bits = int(option.split('=', 1)[1])
+        elif option == '--binary':
+            binary = True
+            hash_reduce = True
+            mapper_args.append(option)
+        elif option.startswith('--sort-memory='):
+            sort_bytes = int(option.split('=', 1)[1])*1024*1024
+        else:
+            mapper_args.append(option)
+
+    files = input_files(xml_dir)
+    if not files:
+        sys.exit("No xml files found in " + xml_dir)
+    if not dedup:
+        bloom_bits = None
+    elif bloom_bits is None:
+        bloom_bits = bloom_size(files)
+
+    work_dir = tempfile.mkdtemp(prefix='local_runner_')
+    try:
+        pool = multiprocessing.Pool(processes)
+        try:
+            jobs = [(xml_file, mapper_args, work_dir, not hash_reduce, reducers, bloom_bits, binary, sort_bytes)
+                    for xml_file in files]
+            map_outputs = pool.map(run_mapper, jobs, chunksize=1)
+            if bloom_bits:
+                find_candidates(files, work_dir, bloom_bits)
+                jobs = [(xml_file, work_dir, not hash_reduce, reducers, bloom_bits, binary, sort_bytes) for xml_file in files]
+                map_outputs += pool.map(confirm_duplicates, jobs, chunksize=1)
+            if reducers > 1:
+                jobs = [([partition_files[i] for partition_files in map_outputs],
+                         os.path.join(work_dir, 'part-%05d' % i), hash_reduce) for i in range(reducers)]
+                reduce_outputs = pool.map(reduce_partition, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        if output_path:
+            output = open(output_path, 'wb')
+        else:
+            sys.stdout.flush()
+            output = sys.stdout
+        try:
+            if reducers > 1:
+                merge_outputs(reduce_outputs, output)
+            else:
+                run_reducer([partition_files[0] for partition_files in map_outputs], output, hash_reduce)
+        finally:
+            if output_path:
+                output.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,627 @@
 
 import os
 import sys
+import bz2
+import zlib
+import heapq
+import marshal
+import tempfile
 import lxml.etree as etree
+from xml.sax.saxutils import quoteattr
+stdout = sys.stdout
+sys.stdout = sys.stderr                 # PlacesValidations announces itself when imported: keep it out of the map output
 import PlacesValidations as pv
+sys.stdout = stdout
+try:
+    import lzma                             # Python 3
+except ImportError:
+    try:
+        from backports import lzma          # pip install backports.lzma
+    except ImportError:
+        lzma = None
 
 
 t = '{http://places.maps.domain.com/pds}'
 
-# Take in arguments from the MapReduce command
+# Take in arguments from the MapReduce command. Anything starting with "--" is a mapper option:
+#   --iterparse     Stream the input with etree.iterparse() instead of expecting one <Place> per line.
+#                   Use this for pretty-printed / multi-line PlaceList documents (i.e. vendor drops).
+#   --chunk-size=N  Number of bytes read from the input at a time in the default (one Place per line) mode.
+#   --input=PATH    Read the Place XML from PATH instead of stdin (also names map_input_file when it isn't set).
+#   --batch-size=N  Number of Places collected per batch for the NumPy coordinate checks (pv.CoordinateBatch).
+#   --combine       In-mapper combiner: count identical keys in memory and write "key\tN" once per key at the end
+#                   of the task instead of "key\t1" per emission. The reducer sums val, so its output is unchanged.
+#   --combine-memory=MB
+#                   Memory budget of the --combine table (default 256). When it fills up, the table is spilled to a
+#                   temp file as a sorted run and the runs are merged at the end of the task.
+#   --bloom=PREFIX  Stage one of the two-stage duplicate search (local_runner.py --dedup): emits of pv.duplicate_ids
+#                   (Basic_0017a) are not written. Their keys go to PREFIX.keys, a Bloom filter of them to PREFIX.bloom
+#                   and the keys repeated within this task to PREFIX.cand.
+#   --bloom-bits=N  Size of the --bloom filter in bits. Every task of one run must use the same size.
+#   --top           Heavy-hitter mode for the top-N reports in pv.heavy_hitters (Basic_0020, New_0006, New_0014b): their
+#                   keys, or the BaseText / word in them, are counted in one fixed-size summary per report (pv.TopK)
+#                   and the reducer writes only the top ones, as "<report>.top|key\tcount|+/-error", instead of
+#                   every distinct key.
+#   --binary        Write the pv binary record format (length-prefixed keys, varint counts, key dictionary) instead
+#                   of "key\tvalue" lines. reducer.py reads either; the records can't be sorted, so reduce them
+#                   with reducer.py --hash (local_runner.py --binary does).
+#   --binary-dictionary=N
+#                   Number of distinct keys the --binary key dictionary holds (default 65536). Repeats of these
+#                   keys are written as a 1-3 byte index. 0 turns the dictionary off.
+# gzip, bz2 and xz compressed input (file or stdin) is detected from its magic bytes and decompressed on the fly.
+options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+chunk_size = 4*1024*1024
+batch_size = 5000
+combine_memory = 256
+bloom_prefix = None
+bloom_bits = 1 << 23
+binary_dictionary = 1 << 16
+input_path = None
+for option in options:
+    if option.startswith('--chunk-size='):
+        chunk_size = int(option.split('=', 1)[1])
+    elif option.startswith('--batch-size='):
+        batch_size = int(option.split('=', 1)[1])
+    elif option.startswith('--combine-memory='):
+        combine_memory = int(option.split('=', 1)[1])
+    elif option.startswith('--bloom='):
+        bloom_prefix = option.split('=', 1)[1]
+    elif option.startswith('--bloom-bits='):
+        bloom_bits = int(option.split('=', 1)[1])
+    elif option.startswith('--binary-dictionary='):
+        binary_dictionary = int(option.split('=', 1)[1])
+    elif option.startswith('--input='):
+        input_path = option.split('=', 1)[1]
 try:
-    Product = sys.argv[1]
-    queryPlaceId = sys.argv[2]
+    Product = args[0]
+    queryPlaceId = args[1]
 except:
     Product = 'EWP'
     queryPlaceId = ''
 
-def main():
+coordinate_batch = None         # pv.CoordinateBatch, set up by main() when NumPy is available
+combiner = None                 # Combiner, set up by main() for --combine
+# Validation IDs whose reducer aggregation is not a sum: their 1s are values, not counts, so --combine leaves them alone
+uncombined_ids = set(v_id for v_id, spec in pv.validation_aggregations.items() if not isinstance(spec, pv.Sum))
+duplicate_finder = None         # DuplicateFinder, set up by main() for --bloom
+# Validation IDs aggregated with a sketch (pv.HyperLogLog): their (key, value) emits are folded into one sketch per
+# key in the mapper and written at the end of the task, so the shuffle carries one fixed-size line per key
+sketch_ids = set(v_id for v_id, spec in pv.validation_aggregations.items() if isinstance(spec, pv.HyperLogLog))
+sketches = {}
+top_reports = "--top" in options
 
-    runList = pv.getValidationList(Product)
-    emit_return = ""
 
-    if "Media_0002" or "Basic_0001" or "Basic_0002" in runList:
+class OutputBuffer(object):
+    """
+    # Map output goes through one of these instead of a sys.stdout.write() per emit: writes are collected in a
+    # list and passed on to out joined, once per `size` bytes. flush() at the end of the task.
+    """
+    def __init__(self, out, size=1 << 20):
+        self.out = out
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.length += len(data)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write(''.join(self.parts))
+            self.parts = []
+            self.length = 0
+        self.out.flush()
+
+output = OutputBuffer(sys.stdout)
+
+
+def write_text(key, value):
+    if type(value) is pv.SerializedState:
+        output.write("{0}\t\t{1}\n".format(key, value))      # Out of band: no "key\tvalue" line has an empty field
+    else:
+        output.write("{0}\t{1}\n".format(key, value))
+
+write_record = write_text       # main() swaps in a pv.BinaryWriter for --binary
+plain_text = True               # Plain keys go straight to the text output (no --combine, --bloom or --binary)
+
+
+def emit(emit_return):
+    """
+    # A validation returns a key, a (key, value) pair for its reducer aggregation (pv.validation_aggregations),
+    # or a list or generator of those. A plain key is written with the value 1.
+    """
+    if not emit_return:
+        return
+    if type(emit_return) is str or type(emit_return) is tuple:
+        emit_return = [emit_return]
+    elif type(emit_return) is not list:
+        if not hasattr(emit_return, 'next'):
+            return
+        emit_return = list(emit_return)         # A generator
+        if not emit_return:
+            return
+    if plain_text:
         try:
-            map_input_file = os.environ["map_input_file"]       # Because we need the name of the xml for the output
-        except:
-            map_input_file = "unknown"
+            lines = "\t1\n".join(emit_return)    # All plain str keys: one join instead of a format per key
+        except (TypeError, UnicodeError):
+            lines = None                        # (key, value) pairs, or unicode keys next to non-ASCII str keys
+        if type(lines) is str:
+            output.write(lines + "\t1\n")
+            return
+    for emit_string in emit_return:
+        if type(emit_string) is tuple:
+            if sketch_ids and emit_string[0].split('|', 1)[0] in sketch_ids:
+                add_to_sketch("{0}".format(emit_string[0]), emit_string[1])
+            else:
+                write_record(*emit_string)
+        elif duplicate_finder is not None and emit_string.split('|', 1)[0] in pv.duplicate_ids:
+            duplicate_finder.add("{0}".format(emit_string))
+        elif combiner is None:
+            write_record(emit_string, 1)
+        elif uncombined_ids and emit_string.split('|', 1)[0] in uncombined_ids:
+            write_record(emit_string, 1)
+        else:
+            combiner.add("{0}".format(emit_string))     # Same formatting (and unicode failures) as a written emit
+
+
+def add_to_sketch(key, value):
+    entry = sketches.get(key)
+    if entry is None:
+        spec = pv.validation_aggregations[key.split('|', 1)[0]]
+        sketches[key] = [spec, spec.start(value)]
+    else:
+        entry[1] = entry[0].add(entry[1], value)
+
+
+def fold_top(emit_return):
+    """ --top: adds the keys of the pv.heavy_hitters reports to their summaries and returns the other emits """
+    if type(emit_return) is str:
+        emit_return = [emit_return]
+    elif type(emit_return) is not list:
+        return emit_return
+    rest = []
+    for emit_string in emit_return:
+        if type(emit_string) is not tuple:
+            report = emit_string.split('|', 1)[0]
+            if report in pv.heavy_hitters:
+                add_to_sketch(report + pv.top_suffix, pv.heavy_hitters[report].item("{0}".format(emit_string)))
+                continue
+        rest.append(emit_string)
+    return rest
+
+
+def emit_sketches():
+    """ End of task: one (key, pv.SerializedState) record per sketched key """
+    for key in sorted(sketches):
+        (spec, state) = sketches[key]
+        write_record(key, spec.dump(state))
+    sketches.clear()
 
-    for line in sys.stdin:
+
+class Combiner(object):
+    """
+    # In-mapper combiner with a memory budget. Keys are counted in a dict; when the estimated size of the dict
+    # passes the budget, it is written to a temp file as a sorted, pre-summed run and emptied. At the end of the
+    # task the runs and what is left in memory are merged and every key is written once with its count N.
+    # Low-cardinality counters (Stats, TQS) never spill and collapse fully, high-cardinality ones (Basic_0017a,
+    # GEO_0002) stream through in runs of bounded size.
+    """
+    entry_size = 100        # Rough bytes per dict entry on top of the key itself (entry, str header, int)
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.counts = {}
+        self.size = 0
+        self.runs = []
+
+    def add(self, key):
+        count = self.counts.get(key)
+        if count is None:
+            self.counts[key] = 1
+            self.size += len(key) + self.entry_size
+            if self.size > self.budget:
+                self.spill()
+        else:
+            self.counts[key] = count + 1
+
+    def spill(self):
+        run = tempfile.TemporaryFile(prefix='combine_run_')
+        for item in sorted(self.counts.iteritems()):
+            marshal.dump(item, run)
+        run.seek(0)
+        self.runs.append(run)
+        self.counts = {}
+        self.size = 0
+
+    def read_run(self, run):
         try:
-            if line.find("PlaceList") >= 0:
-                PlaceList = line.rstrip()
-                if "<PlaceList" in line:
-                    if "Basic_0001" in runList:
-                        emit_return = pv.validation_modules["Basic_0001"](PlaceList, map_input_file)
-                        if emit_return:
-                            if type(emit_return) is str:
-                                sys.stdout.write("{0}\t1\n".format(emit_return))
+            while True:
+                yield marshal.load(run)
+        except EOFError:
+            run.close()
+
+    def write(self, write_record):
+        merged = heapq.merge(sorted(self.counts.iteritems()), *[self.read_run(run) for run in self.runs])
+        self.counts = {}
+        self.runs = []
+        (last_key, tot_cnt) = (None, 0)
+        for key, count in merged:
+            if key != last_key:
+                if last_key is not None:
+                    write_record(last_key, tot_cnt)
+                (last_key, tot_cnt) = (key, count)
+            else:
+                tot_cnt += count
+        if last_key is not None:
+            write_record(last_key, tot_cnt)
+
+
+def validate_PlaceList(PlaceList, runList, map_input_file):
+    """ Runs the PlaceList header check (Basic_0001) on the opening <PlaceList ...> tag """
+    if "<PlaceList" in PlaceList:
+        if "Basic_0001" in runList:
+            emit(pv.validation_modules["Basic_0001"](PlaceList, map_input_file))
+
+
+def validate_Place(node, runList, map_input_file):
+    """ Runs every validation in the run list against one parsed <Place> element """
+    Place = pv.IndexedPlace(node)       # One shared tag index per Place for all validations
+    for val in runList:
+        if val in pv.validation_modules:
+            if val == "Basic_0001":
                 continue
-            node = etree.fromstring(line)
-            if node.tag == t+'Place':
-                Place = node
-
-                for val in runList:
-                    if val in pv.validation_modules:
-                        if val == "Basic_0001":
-                            continue
-                        if val == "Media_0002" or val == "Basic_0002":
-                            emit_return = pv.validation_modules[val](Place, map_input_file)
-                        if val == "New_0015":
-                            emit_return = pv.validation_modules[val](Place, queryPlaceId)
-                        else:
-                            emit_return = pv.validation_modules[val](Place)
-                        if emit_return:
-                            if type(emit_return) is str:
-                                sys.stdout.write("{0}\t1\n".format(emit_return))
-                            elif type(emit_return) is list:
-                                for emit_string in emit_return:
-                                    sys.stdout.write("{0}\t1\n".format(emit_string))
+            if coordinate_batch is not None and val in pv.batched_validations:
+                coordinate_batch.add(Place, val)
+                continue
+            if val == "Media_0002" or val == "Basic_0002":
+                emit_return = pv.validation_modules[val](Place, map_input_file)
+            elif val == "New_0015":
+                emit_return = pv.validation_modules[val](Place, queryPlaceId)
+            else:
+                emit_return = pv.validation_modules[val](Place)
+            if top_reports:
+                emit_return = fold_top(emit_return)
+            emit(emit_return)
+    if coordinate_batch is not None and len(coordinate_batch) >= batch_size:
+        emit(coordinate_batch.flush())
+
+
+def start_tag(elem):
+    """
+    # Rebuilds the opening tag of an element, i.e. <PlaceList xmlns="http://places.maps.domain.com/pds">, with
+    # prefixed names and escaped attribute values. Only a fallback for when the raw tag isn't in the HeadRecorder.
+    """
+    prefixes = dict((uri, prefix) for prefix, uri in elem.nsmap.items() if prefix)
+    def name(tag):
+        qname = etree.QName(tag)
+        prefix = prefixes.get(qname.namespace)
+        return prefix + ':' + qname.localname if prefix else qname.localname
+    start = '<' + name(elem)
+    namespaces = sorted(elem.nsmap.items(), key=lambda item: item[0] or '')     # The default xmlns first
+    for prefix, uri in namespaces:
+        if prefix:
+            start += ' xmlns:%s=%s' % (prefix, quoteattr(uri))
+        else:
+            start += ' xmlns=%s' % quoteattr(uri)
+    for key, value in elem.attrib.items():
+        start += ' %s=%s' % (name(key), quoteattr(value))
+    return start + '>'
+
+
+class HeadRecorder(object):
+    """
+    # --iterparse input wrapper: passes reads through and keeps the first `limit` bytes, so the PlaceList header
+    # can be handed to Basic_0001 as the raw line it sits on, exactly as the default line mode does.
+    """
+    def __init__(self, source, limit=1 << 20):
+        self.source = source
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        if self.size < self.limit:
+            self.parts.append(data[:self.limit - self.size])
+            self.size += len(self.parts[-1])
+        return data
+
+    def placelist_line(self):
+        """ The raw line holding the <PlaceList ...> tag, without its line ending, or None """
+        head = ''.join(self.parts)
+        pos = head.find('<PlaceList')
+        if pos < 0:
+            return None
+        end = head.find('\n', pos)
+        if end < 0:
+            if self.size >= self.limit:
+                return None             # The line runs past what was kept
+            end = len(head)
+        return head[head.rfind('\n', 0, pos) + 1:end].rstrip()
+
+
+def line_prefilters(runList):
+    """
+    # Returns [(val, match), ...] in run list order when every enabled Place validation declares a raw-line
+    # prefilter (see pv.validation_prefilters), otherwise None because every Place has to be parsed anyway.
+    """
+    prefilters = []
+    for val in runList:
+        if val not in pv.validation_modules or val == "Basic_0001":     # Never run on a Place line
+            continue
+        if val == "New_0015":
+            predicate = pv.PlaceId_prefilter(queryPlaceId.split(','))
+        elif val in pv.validation_prefilters:
+            predicate = pv.validation_prefilters[val]
+        else:
+            return None
+        if hasattr(predicate, 'search'):
+            prefilters.append((val, predicate.search))
+        else:
+            prefilters.append((val, lambda chunk, start, end, predicate=predicate: chunk.find(predicate, start, end) >= 0))
+    return prefilters
 
+
+class DuplicateFinder(object):
+    """
+    # Map side of local_runner.py --dedup. Keeps every duplicate_ids key of this task in a key file and a Bloom
+    # filter; a key that is already in the filter when it is added is a candidate repeat within this task.
+    """
+    def __init__(self, prefix, size):
+        self.prefix = prefix
+        self.bloom = pv.BloomFilter(size)
+        self.keys = open(prefix + '.keys', 'wb')
+        self.candidates = set()
+
+    def add(self, key):
+        if key in self.bloom:
+            self.candidates.add(key)
+        else:
+            self.bloom.add(key)
+        self.keys.write(key + '\n')
+
+    def close(self):
+        self.keys.close()
+        with open(self.prefix + '.bloom', 'wb') as f:
+            f.write(self.bloom.bits)
+        with open(self.prefix + '.cand', 'wb') as f:
+            f.writelines(key + '\n' for key in sorted(self.candidates))
+
+
+# Compressed input ------------------------------------------------
+compression_magic = (('\x1f\x8b', 'gzip'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz'))
+compression_suffixes = ('.gz', '.bz2', '.xz')
+
+
+def new_decompressor(kind):
+    if kind == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)     # gzip header and trailer
+    if kind == 'bz2':
+        return bz2.BZ2Decompressor()
+    if lzma is None:
+        raise IOError("xz compressed input needs the lzma module (pip install backports.lzma)")
+    return lzma.LZMADecompressor()
+
+
+class DecompressedInput(object):
+    """
+    # Read-only file-like wrapper around a raw byte stream (stdin or an open file).
+    # The first block is sniffed for a gzip/bz2/xz magic number; compressed streams are decompressed
+    # incrementally as read() is called, so nothing is ever written to disk. Concatenated members
+    # (i.e. cat a.gz b.gz) are decoded back to back. As with gzip -d, zero bytes after a member (tape or
+    # block padding) are skipped and any other data that doesn't start a new member ends the input.
+    # Anything else is passed through untouched.
+    """
+    def __init__(self, raw, block_size=1024*1024):
+        self.raw = raw
+        self.block_size = block_size
+        self.head = raw.read(block_size)
+        self.kind = None
+        for magic, kind in compression_magic:
+            if self.head.startswith(magic):
+                (self.magic, self.kind) = (magic, kind)
+        self.decompressor = None        # None between members
+        self.gap = ''                   # Data after a member that is too short to tell whether a new one starts
+        self.trailing = False           # Trailing data was found, the rest of the input is ignored
+        self.buffer = ''
+        self.eof = False
+
+    def read_raw(self, size):
+        if self.head:
+            data, self.head = self.head, ''
+            return data
+        return self.raw.read(size)
+
+    def decompress(self, data):
+        out = []
+        while data and not self.trailing:
+            if self.decompressor is None:
+                data = (self.gap + data).lstrip('\x00')
+                self.gap = ''
+                if len(data) < len(self.magic) and self.magic.startswith(data):
+                    self.gap = data
+                    break
+                if not data.startswith(self.magic):
+                    self.trailing = True
+                    break
+                self.decompressor = new_decompressor(self.kind)
+            try:
+                out.append(self.decompressor.decompress(data))
+            except EOFError:                # The previous member ended exactly on a block boundary
+                self.decompressor = None
+                continue
+            data = getattr(self.decompressor, 'unused_data', '')
+            if data:                        # End of one member, a new one may start right after it
+                self.decompressor = None
+        return ''.join(out)
+
+    def read(self, size=-1):
+        if self.kind is None:
+            if self.head:
+                if size < 0:
+                    return self.read_raw(size) + self.raw.read()
+                if size < len(self.head):
+                    data, self.head = self.head[:size], self.head[size:]
+                    return data
+            return self.read_raw(size)
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            data = self.read_raw(self.block_size)
+            if not data:
+                self.eof = True
+                break
+            self.buffer += self.decompress(data)
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def open_input(path=None):
+    """ Returns a DecompressedInput over PATH, or over stdin when no path is given """
+    if path is None:
+        return DecompressedInput(sys.stdin)
+    return DecompressedInput(open(path, 'rb'))
+
+
+def input_file_name(path):
+    """ Drops a .gz/.bz2/.xz suffix so name based checks still see i.e. COL.xml for COL.xml.gz """
+    for suffix in compression_suffixes:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def read_records(source, size):
+    """
+    # Reads the input in large binary chunks and yields one (chunk, start, end) span per newline-terminated record.
+    # Records are not copied out of the chunk here: the PlaceList check and the prefilters search the span in
+    # place, and only a record that actually gets parsed is sliced into its own string for lxml.
+    # A record that runs past the end of a chunk is carried over (and joined once) into the next span.
+    """
+    pending = []
+    while True:
+        chunk = source.read(size)
+        if not chunk:
+            break
+        start = 0
+        end = chunk.find('\n')
+        if end < 0:
+            pending.append(chunk)
+            continue
+        if pending:
+            pending.append(chunk[:end+1])
+            record = ''.join(pending)
+            pending = []
+            yield record, 0, len(record)
+            start = end + 1
+            end = chunk.find('\n', start)
+        while end >= 0:
+            yield chunk, start, end + 1
+            start = end + 1
+            end = chunk.find('\n', start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    if pending:
+        record = ''.join(pending)
+        yield record, 0, len(record)
+
+
+def map_lines(source, runList, map_input_file):
+    """ Default input mode: every <Place> sits on exactly one physical line """
+    prefilters = line_prefilters(runList)
+    lineRunList = runList
+    for chunk, start, end in read_records(source, chunk_size):
+        try:
+            if chunk.find("PlaceList", start, end) >= 0:
+                validate_PlaceList(chunk[start:end].rstrip(), runList, map_input_file)
+                continue
+            if prefilters is not None:
+                # Only the validations whose prefilter matches this raw line can emit anything for it
+                lineRunList = [val for (val, match) in prefilters if match(chunk, start, end)]
+                if not lineRunList:
+                    continue
+            node = etree.fromstring(chunk[start:end], pv.place_parser)
+            if node.tag == t+'Place':
+                validate_Place(node, lineRunList, map_input_file)
             node.clear()
         except:
             continue
 
+
+def map_iterparse(source, runList, map_input_file):
+    """
+    # Streaming input mode for arbitrarily formatted PlaceList documents.
+    # Each Place is validated on its end event, then cleared along with its preceding siblings so that
+    # the partially built tree never holds more than one Place at a time and memory stays flat.
+    # Blank text is dropped here (and only here), so a pretty-printed Place still comes out of New_0015 on one row.
+    """
+    source = HeadRecorder(source)
+    context = etree.iterparse(source, events=('start', 'end'), tag=('{*}PlaceList', t+'Place'), remove_blank_text=True,
+                              **pv.parser_options)
+    for event, elem in context:
+        if elem.tag != t+'Place':
+            if event == 'start':
+                try:
+                    PlaceList = source.placelist_line()
+                    if PlaceList is None:
+                        PlaceList = start_tag(elem)
+                    validate_PlaceList(PlaceList, runList, map_input_file)
+                except:
+                    pass
+            continue
+        if event == 'start':
+            continue
+        try:
+            validate_Place(elem, runList, map_input_file)
+        except:
+            pass
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    del context
+
+
+def main():
+    global coordinate_batch, combiner, duplicate_finder, write_record, plain_text
+
+    runList = pv.getValidationList(Product)
+    if pv.np is not None and [val for val in runList if val in pv.batched_validations]:
+        coordinate_batch = pv.CoordinateBatch()
+    if [val for val in runList if val in pv.taxonomy_validations]:
+        pv.category_taxonomy()                  # Up front, so that a missing category_file stops the task
+    if "--combine" in options:
+        combiner = Combiner(combine_memory*1024*1024)
+    if bloom_prefix is not None:
+        duplicate_finder = DuplicateFinder(bloom_prefix, bloom_bits)
+    if "--binary" in options:
+        write_record = pv.BinaryWriter(output, binary_dictionary).write
+    plain_text = combiner is None and duplicate_finder is None and write_record is write_text
+
+    if "Media_0002" or "Basic_0001" or "Basic_0002" in runList:
+        try:
+            map_input_file = os.environ["map_input_file"]       # Because we need the name of the xml for the output
+        except:
+            map_input_file = input_path or "unknown"
+        map_input_file = input_file_name(map_input_file)
+
+    source = open_input(input_path)
+    if "--iterparse" in options:
+        map_iterparse(source, runList, map_input_file)
+    else:
+        map_lines(source, runList, map_input_file)
+    if coordinate_batch is not None:
+        emit(coordinate_batch.flush())
+    emit_sketches()
+    if combiner is not None:
+        combiner.write(write_record)
+    output.flush()
+    if duplicate_finder is not None:
+        duplicate_finder.close()
+
 if __name__ == '__main__':
     main()
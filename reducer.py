@@ -1,39 +1,167 @@
 #!/usr/lib/python_2.7.3/bin/python
 
+# Reducer options:
+#   (none)          Sorted mode: input is sorted by key (Hadoop shuffle, or `sort`), values are folded per key run.
+#   --hash          Hash mode: input can be in any order (i.e. mapper output piped straight in). Values are folded
+#                   in a hash table and written in key order at the end, so the output is the same as sorted mode.
+#   --hash-memory=MB
+#                   Memory budget of the --hash table (default 512). When it fills up, the table is spilled to a
+#                   temp file as a sorted run and the runs are merged at the end.
+# The input is "key\tval" text lines (and "key\t\tstate" lines for the mapper's serialized sketches and --top
+# summaries, see PlacesValidations.SerializedState) or the binary record format of mapper.py --binary (told apart
+# by the first byte, see PlacesValidations.read_binary_records). The output is always text.
+# How the values of a key are folded (sum, min, max, distinct, first N, top k, having) is looked up by validation ID
+# in PlacesValidations.validation_aggregations.
+
+import io
+import os
 import sys
 import codecs
+import heapq
+import cPickle
+import tempfile
+
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')      # PlacesValidations announces itself on stdout when imported
+import PlacesValidations as pv
+sys.stdout = stdout
 
 sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
-inData = codecs.getreader('utf-8')(sys.stdin)
+stdin = io.open(sys.stdin.fileno(), 'rb')
 
-(last_key, tot_cnt, v_id) = (None, 0, None)
+options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+hash_memory = 512
+for option in options:
+    if option.startswith('--hash-memory='):
+        hash_memory = int(option.split('=', 1)[1])
 
-for line in inData:
-    try:
-        (key, val) = line.strip().split("\t")
-        if last_key != key:
-            if last_key != None:
-                k = last_key.split('|')
-                v_id = k[0]
-
-                if v_id == 'Basic_0017a':
-                    if tot_cnt > 1:
-                        sys.stdout.write("%s\t%s\n" % (last_key,tot_cnt))
-                else:
-                    sys.stdout.write("%s\t%s\n" % (last_key,tot_cnt))
-
-            (last_key, tot_cnt) = (key, int(val))
-        else:
-            (last_key, tot_cnt) = (key, tot_cnt + int(val))
-    except:
-        pass
-
-if last_key:
-    if v_id == 'Basic_0017a':
-        if tot_cnt > 1:
-            sys.stdout.write("%s\t%s\n" % (last_key, tot_cnt))
+
+def aggregation(key):
+    v_id = key.split('|')[0]
+    return pv.validation_aggregations.get(v_id, pv.default_aggregation)
+
+
+def write_key(key, spec, state):
+    if hasattr(spec, 'rows'):
+        rows = spec.rows(key, state)        # i.e. the top k keys of a pv.TopK report, under '<report>.top|'
     else:
-        sys.stdout.write("%s\t%s\n" % (last_key, tot_cnt))
+        rows = [(key,) + spec.result(state)]
+    for (key, count, value) in rows:
+        if spec.having is None or count >= spec.having:
+            sys.stdout.write("%s\t%s\n" % (key, value))
+
+
+def text_records(inData):
+    for line in inData:
+        fields = line.strip().split("\t")
+        if len(fields) == 2:
+            yield fields[0], fields[1]
+        elif len(fields) == 3 and not fields[1]:
+            yield fields[0], pv.SerializedState(fields[2])     # "key\t\tstate", see pv.SerializedState
+
+
+def input_records(stdin):
+    if stdin.peek(1)[:1] == pv.binary_magic[:1]:
+        return pv.read_binary_records(stdin)
+    return text_records(codecs.getreader('utf-8')(stdin))
+
+
+def start_state(spec, val):
+    if type(val) is pv.SerializedState:
+        return spec.load(val)               # A mapper sketch or --top summary
+    if type(val) is int and not isinstance(spec, pv.Sum):
+        val = unicode(val)                  # Binary counts are ints, the other aggregations fold text
+    return spec.start(val)
+
 
+def add_value(spec, state, val):
+    if type(val) is pv.SerializedState:
+        return spec.merge(state, spec.load(val))
+    if type(val) is int and not isinstance(spec, pv.Sum):
+        val = unicode(val)
+    return spec.add(state, val)
+
+
+def reduce_sorted(records):
+    (last_key, spec, state) = (None, None, None)
+
+    for key, val in records:
+        try:
+            if last_key != key:
+                key_spec = aggregation(key)
+                key_state = start_state(key_spec, val)
+                if last_key != None:
+                    write_key(last_key, spec, state)
+                (last_key, spec, state) = (key, key_spec, key_state)
+            else:
+                state = add_value(spec, state, val)
+        except:
+            pass
+
+    if last_key:
+        write_key(last_key, spec, state)
+
+
+# Hash mode ------------------------------------------------------
+# Keys are ordered by key+"\t" everywhere below: that is the order `sort` puts the "key\tval" lines in.
+entry_size = 100        # Rough bytes per table entry on top of the key itself (see pv.value_size for the states)
+
+def spill(table):
+    run = tempfile.TemporaryFile(prefix='reduce_run_')
+    for key in sorted(table, key=lambda key: key + u"\t"):
+        cPickle.dump((key + u"\t", table[key][1]), run, cPickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+def read_run(run):
+    try:
+        while True:
+            yield cPickle.load(run)
+    except EOFError:
+        run.close()
+
+def reduce_hash(records, budget):
+    (table, size, runs) = ({}, 0, [])
+
+    for key, val in records:
+        try:
+            entry = table.get(key)
+            if entry is None:
+                spec = aggregation(key)
+                state = start_state(spec, val)
+                table[key] = [spec, state]
+                size += len(key) + entry_size + spec.state_size(state)
+            elif type(val) is pv.SerializedState:
+                (spec, other) = (entry[0], entry[0].load(val))
+                size += spec.state_size(other)              # At most what the merge can add
+                entry[1] = spec.merge(entry[1], other)
+            else:
+                spec = entry[0]
+                if type(val) is int and not isinstance(spec, pv.Sum):
+                    val = unicode(val)
+                size += spec.add_size(entry[1], val)       # Only what the state actually grows by
+                entry[1] = spec.add(entry[1], val)
+            if size > budget:
+                runs.append(spill(table))
+                (table, size) = ({}, 0)
+        except:
+            pass
+
+    in_memory = [(key + u"\t", table[key][1]) for key in table]
+    in_memory.sort(key=lambda item: item[0])
+    (last_key, spec, state) = (None, None, None)
+    for key, key_state in heapq.merge(in_memory, *[read_run(run) for run in runs]):
+        if key != last_key:
+            if last_key is not None:
+                write_key(last_key[:-1], spec, state)
+            (last_key, spec, state) = (key, aggregation(key[:-1]), key_state)
+        else:
+            state = spec.merge(state, key_state)
+    if last_key is not None:
+        write_key(last_key[:-1], spec, state)
 
 
+if "--hash" in options:
+    reduce_hash(input_records(stdin), hash_memory*1024*1024)
+else:
+    reduce_sorted(input_records(stdin))
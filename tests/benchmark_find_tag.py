@@ -0,0 +1,42 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_find_tag.py
+# Purpose:      Micro-benchmark of the compiled find_tag() lookup against ElementPath elem.find(ns+tag),
+#               on the Locations of the sample Places.
+#
+# Usage:        python tests/benchmark_find_tag.py [repeat]     (not collected by unittest discover)
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from test_PlacesValidations import pv, sample_places
+
+# The lookups New_0007 and the GEO checks make on each Location
+tags = ('Side', 'Spot', 'BaseName', 'HouseNumber', 'Link', 'GeoPosition', 'Latitude', 'Longitude', 'NoSuchTag')
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    Locations = [Location for Place in sample_places() for Location in Place.findall(pv.ns + 'Location')]
+    ns = pv.ns
+    find_tag = pv.find_tag
+
+    def find():
+        for Location in Locations:
+            for tag in tags:
+                Location.find(ns + tag)
+
+    def compiled_find():
+        for Location in Locations:
+            for tag in tags:
+                find_tag(Location, tag)
+
+    lookups = len(Locations) * len(tags)
+    for (name, lookup) in (('elem.find(ns+tag)', find), ('find_tag(elem, tag)', compiled_find)):
+        best = min(timeit.repeat(lookup, number=1, repeat=repeat))
+        print "%-24s %6.2f us per lookup" % (name, best / lookups * 1e6)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,846 @@
+#-------------------------------------------------------------------------------
+# Name:         test_PlacesValidations.py
+# Purpose:      Unit tests of the PlacesValidations.py helpers and of the checks built on them.
+#
+# Usage:        python -m unittest discover -s tests      (from the repository root, Python 2.7 with lxml)
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import re
+import math
+import random
+import collections
+import shutil
+import tempfile
+import unittest
+import lxml.etree as etree
+from cStringIO import StringIO
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')      # PlacesValidations announces itself on stdout when imported
+import PlacesValidations as pv
+sys.stdout = stdout
+places_file = os.path.join(repo_dir, 'tests', 'data', 'places', 'USA.xml')
+
+
+def sample_places():
+    """ The parsed Places of tests/data/places/USA.xml (one per line) """
+    with open(places_file, 'rb') as f:
+        return [etree.fromstring(line, pv.place_parser) for line in f if line.startswith('<Place ')]
+
+
+class IndexedPlaceTest(unittest.TestCase):
+    """ IndexedPlace answers every lookup the way the lxml element it wraps does """
+
+    def test_descendant_lookups(self):
+        for node in sample_places():
+            Place = pv.IndexedPlace(node)
+            for tag in ('BaseText', 'Location', 'Parsed', 'CategoryId', 'Latitude', 'ContactString', 'NoSuchTag'):
+                self.assertEqual(Place.findall(pv.ns + tag), node.findall(pv.ns + tag))
+                self.assertTrue(Place.find(pv.ns + tag) is node.find(pv.ns + tag))
+
+    def test_other_paths_fall_through(self):
+        node = sample_places()[0]
+        Place = pv.IndexedPlace(node)
+        for path in (pv.t + 'Identity', './/' + pv.t + 'Location/' + pv.t + 'Side', pv.ns + 'GeoPosition[@type]', 'NoSuchTag'):
+            self.assertEqual(Place.findall(path), node.findall(path))
+            self.assertTrue(Place.find(path) is node.find(path))
+        self.assertEqual((Place.tag, Place.attrib, list(Place), len(Place), Place[0]), (node.tag, node.attrib, list(node), len(node), node[0]))
+
+
+class PlaceFactsTest(unittest.TestCase):
+    """ The facts memoized on an IndexedPlace are the ones a bare element computes every time """
+
+    def test_same_facts_as_the_bare_element(self):
+        for node in sample_places():
+            Place = pv.IndexedPlace(node)
+            for fact in (pv.CountryCode_PlaceID, pv.core_or_non_core, pv.first_category, pv.additional_attributes):
+                value = fact(Place)
+                self.assertEqual(value, fact(node))
+                self.assertTrue(fact(Place) is value)
+        self.assertFalse(pv.place_facts(node) is pv.place_facts(node))       # A bare element keeps nothing
+
+    def emits(self, val, Place):
+        """ The emits of a validation, or the type of what it raised (New_0007 does on some Places) """
+        try:
+            return pv.validation_modules[val](Place)
+        except Exception as error:
+            return type(error)
+
+    def test_same_emits_as_the_bare_element(self):
+        vals = ('GEO_0002', 'GEO_0003', 'GEO_0004', 'GEO_0005', 'New_0007', 'Stats_0001', 'Stats_0002', 'Stats_0004',
+                'Stats_0005', 'TQS_0005', 'TQS_0010')
+        for node in sample_places():
+            Place = pv.IndexedPlace(node)
+            for val in vals + vals:                 # The second round reads the memoized facts
+                self.assertEqual(self.emits(val, Place), self.emits(val, node), val)
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_whitespace_is_kept(self):
+        """ New_0015, New_0020, New_0023 and TQS_0008 emit etree.tostring() of the Place as it was written """
+        xml = ('<Place xmlns="%s">\n  <Content>\n    <BaseText>Joe &amp; Co</BaseText>\n  </Content>\n  '
+               '<!-- c -->\n  <Identity>\t<PlaceId>1</PlaceId> </Identity>\n</Place>' % pv.t[1:-1])
+        self.assertEqual(etree.tostring(etree.fromstring(xml, pv.place_parser)), etree.tostring(etree.fromstring(xml)))
+        self.assertEqual(etree.tostring(etree.fromstring(xml, pv.place_parser)), xml)
+
+
+class FindTagTest(unittest.TestCase):
+    """ find_tag() returns what elem.find(ns+tag) does """
+
+    def test_parity(self):
+        tags = pv.place_tags + ('Address', 'NoSuchTag')     # Unregistered tags are compiled on first use
+        for Place in sample_places():
+            for elem in [Place] + Place.findall(pv.ns + 'Location') + Place.findall(pv.ns + 'Parsed'):
+                for tag in tags:
+                    self.assertTrue(pv.find_tag(elem, tag) is elem.find(pv.ns + tag))
+
+    def test_nested_and_missing(self):
+        Place = etree.fromstring('<Place xmlns="%s"><Location><Address><Parsed><StreetName><BaseName>Main</BaseName>'
+                                 '</StreetName></Parsed></Address></Location><Location/></Place>' % pv.t[1:-1])
+        (first, second) = Place.findall(pv.ns + 'Location')
+        self.assertEqual(pv.find_tag(first, 'BaseName').text, 'Main')
+        self.assertTrue(pv.find_tag(Place, 'BaseName') is first.find(pv.ns + 'BaseName'))
+        self.assertTrue(pv.find_tag(second, 'BaseName') is None)
+
+
+class PrefilterTest(unittest.TestCase):
+    """ A raw-line prefilter only turns away Place lines its validation emits nothing for """
+
+    def test_tag_forms(self):
+        usa = pv.country_prefilter('USA')
+        for line in ('<Place><CountryCode>USA</CountryCode>', '<Place><p:CountryCode a="1" b=\'>\'>USA</p:CountryCode>',
+                     '<CountryCode>\n USA </CountryCode>', '<CountryCode>U&#83;A</CountryCode>', '<CountryCode><![CDATA[USA]]>',
+                     '<CountryCode><!-- x -->USA</CountryCode>', '<CountryCode/><CountryCode>CAN</CountryCode><CountryCode>USA<'):
+            self.assertTrue(usa.search(line), line)
+        for line in ('<Place><CountryCode>CAN</CountryCode>', '<CountryCodes>USA</CountryCodes>', '<CountryCode/>',
+                     '<CountryCode>USAX</CountryCode>', '<Place>USA</Place>', ''):
+            self.assertFalse(usa.search(line), line)
+
+    def test_turned_away_lines_emit_nothing(self):
+        with open(places_file, 'rb') as f:
+            lines = [line for line in f if line.startswith('<Place ')]
+        variants = []
+        for line in lines:
+            variants.append(line)
+            variants.append(re.sub('<(CountryCode|PlaceId)>', r'<\1 source="x" >', line))
+            variants.append(re.sub('<(CountryCode|PlaceId)>([^<]*)<', r'<\1>\n \2 <', line))
+            variants.append(re.sub('<(CountryCode|PlaceId)>([^<]*)<', r'<\1><![CDATA[\2]]><', line))
+        variants.append(lines[0].replace('<PlaceId>', '<PlaceId>' + pv.PlaceID_to_search + '<!-- -->', 1))
+        emitted = 0
+        for val, predicate in sorted(pv.validation_prefilters.items()):
+            for line in variants:
+                try:
+                    emits = pv.validation_modules[val](pv.IndexedPlace(etree.fromstring(line, pv.place_parser)))
+                except Exception:
+                    emits = None
+                if emits:
+                    self.assertTrue(predicate.search(line), (val, line))
+                    emitted += 1
+        self.assertTrue(emitted)
+
+
+class BinaryFormatTest(unittest.TestCase):
+    """ Records written by BinaryWriter read back unchanged with read_binary_records() """
+
+    def records(self, n):
+        rng = random.Random(19)
+        keys = [u'Basic_%04d|USA|%d' % (rng.randint(0, 30), i) for i in range(40)] + [u'New_0006|RUS|\u041c\u043e\u0441\u043a\u0432\u0430', u'']
+        values = [0, 1, 127, 128, 300, 1 << 40, u'', u'text', u'\u0395\u03bb\u03bb\u03ac\u03b4\u03b1', -1]
+        return [(rng.choice(keys), rng.choice(values)) for i in range(n)]
+
+    def write(self, records, dictionary_size):
+        out = StringIO()
+        writer = pv.BinaryWriter(out, dictionary_size)
+        for key, value in records:
+            writer.write(key.encode('utf-8'), value.encode('utf-8') if type(value) is unicode else value)
+        return out.getvalue()
+
+    def expected(self, records):
+        """ Counts come back as ints, everything else (negative ints too) as text """
+        return [(key, value if type(value) in (int, long) and value >= 0 else u'%s' % value) for key, value in records]
+
+    def test_round_trip(self):
+        records = self.records(2000)
+        for dictionary_size in (0, 8, 1 << 16):        # No dictionary, an overflowing one, a roomy one
+            stream = self.write(records, dictionary_size)
+            for chunk_size in (1, 7, 1 << 20):          # Records split across chunks
+                self.assertEqual(list(pv.read_binary_records(StringIO(stream), chunk_size=chunk_size)),
+                                 self.expected(records))
+
+    def test_concatenated_streams_and_raw_bytes(self):
+        (first, second) = (self.records(300), self.records(200)[::-1])
+        stream = self.write(first, 8) + self.write(second, 16)
+        self.assertEqual(list(pv.read_binary_records(StringIO(stream), chunk_size=5)), self.expected(first + second))
+        raw = list(pv.read_binary_records(StringIO(stream), decode=False))
+        self.assertEqual([(key.decode('utf-8'), value if type(value) is int else value.decode('utf-8'))
+                          for key, value in raw], self.expected(first + second))
+
+    def test_truncated_stream(self):
+        stream = self.write(self.records(10), 8)
+        self.assertRaises(ValueError, list, pv.read_binary_records(StringIO(stream[:-1])))
+
+
+class ProfanityTest(unittest.TestCase):
+    """ The New_0006 matcher against the substring loop it replaced """
+
+    def texts(self, words, n):
+        rng = random.Random(21)
+        fillers = [u'cafe', u'bar', u'grill', u'the', u'\u041a\u0430\u0444\u0435', u'sexton', u'assistant', u'x']
+        return [u' '.join(rng.choice(words + fillers * 3) for i in range(rng.randint(1, 6))) for j in range(n)]
+
+    def test_automaton_finds_every_occurrence(self):
+        patterns = [u'he', u'she', u'his', u'hers', u'ass', u'asshole', u'a']
+        automaton = pv.AhoCorasick(patterns)
+        for text in self.texts([u'ushers', u'asshole', u'hishe'], 500):
+            expected = []
+            for index, pattern in enumerate(patterns):
+                start = text.find(pattern)
+                while start >= 0:
+                    expected.append((start, start + len(pattern), index))
+                    start = text.find(pattern, start + 1)
+            self.assertEqual(sorted(automaton.find(text)), sorted(expected))
+
+    def test_same_term_as_the_substring_loop(self):
+        """ On space separated words the old ' term ' test and the whole-word match agree """
+        words = [word.decode('utf-8') for word in pv.profanity_list if re.match(r'^[a-z0-9 ]+$', word)]
+        for text in self.texts(words, 3000):
+            old = None
+            for word in pv.profanity_list:
+                if ' ' + word + ' ' in ' ' + text + ' ':
+                    old = word
+                    break
+            self.assertEqual(pv.profanity_found(text), old)
+
+
+def make_place(basetexts=(), parsed=()):
+    """
+    # A parsed Place with a BaseText per (languageCode or None, text or None) of basetexts and a Location per dict of
+    # parsed ({'BaseName': text, 'StreetType': text, 'Level3': ...}, a None text writes an empty element)
+    """
+    Place = etree.Element(pv.t + 'Place', nsmap={None: pv.t[1:-1]})
+    etree.SubElement(etree.SubElement(Place, pv.t + 'Identity'), pv.t + 'PlaceId').text = '1'
+    etree.SubElement(Place, pv.t + 'CountryCode').text = 'USA'
+    LocationList = etree.SubElement(Place, pv.t + 'LocationList')
+    for fields in parsed:
+        Parsed = etree.SubElement(etree.SubElement(etree.SubElement(etree.SubElement(LocationList, pv.t + 'Location'),
+                                                                    pv.t + 'Address'), pv.t + 'ParsedList'), pv.t + 'Parsed')
+        StreetName = etree.SubElement(Parsed, pv.t + 'StreetName')
+        AdminLevel = etree.SubElement(etree.SubElement(Parsed, pv.t + 'Admin'), pv.t + 'AdminLevel')
+        for tag in ('BaseName', 'StreetType', 'Level3', 'Level4', 'Level5'):
+            if tag in fields:
+                etree.SubElement(StreetName if tag in ('BaseName', 'StreetType') else AdminLevel, pv.t + tag).text = fields[tag]
+    TextList = etree.SubElement(etree.SubElement(etree.SubElement(Place, pv.t + 'Content'), pv.t + 'NameList'), pv.t + 'TextList')
+    for (language, text) in basetexts:
+        BaseText = etree.SubElement(etree.SubElement(TextList, pv.t + 'Text'), pv.t + 'BaseText')
+        if language is not None:
+            BaseText.set('languageCode', language)
+        BaseText.text = text
+    return pv.IndexedPlace(etree.fromstring(etree.tostring(Place, encoding='UTF-8'), pv.place_parser))
+
+
+def outcome(validation, Place):
+    """ The emits of a validation, or the fact that it raised (which stops the Place) """
+    try:
+        return validation(Place)
+    except Exception:
+        return 'raised'
+
+
+def random_text(rng, pieces):
+    if rng.random() < 0.05:
+        return None
+    return u''.join(rng.choice(pieces) for i in range(rng.randint(0, 6)))
+
+
+# The script checks as Basic_0029-0037 were written before basetext_script_emits(): one regex match per character
+old_scripts = (('Basic_0029', 'Cyrillic', ('bg', 'be', 'mk', 'ru', 'ro', 'sr', 'uk', 'bs', 'kk'), ur'[\u0400-\u0482]+|[\u0488-\u04FF]+', True),
+               ('Basic_0030', 'Greek', ('el',), ur'[\u0386-\u03F6]+', True),
+               ('Basic_0031', 'Hebrew', ('he',), ur'[\u05D0-\u05EA]+', False),
+               ('Basic_0032', 'Arabic', ('ar', 'ur'), ur'[\u0621-\u063A]+|[\u0640-\u064A]+|[\u066E-\u066F]+|[\u0671-\u06D3]+|[\u06EE-\u06EF]+|[\u06FA-\u06FF]+', False),
+               ('Basic_0033', 'Thai', ('th',), ur'[\u0E01-\u0E5B]+', False),
+               ('Basic_0034', 'CJK', ('zh', 'ja', 'ko', 'zh-Hant'), ur'[\u4E00-\u9FA5]+', False),
+               ('Basic_0035', 'Korean', ('ko',), ur'[\u1100-\u11FF]+|[\u3130-\u318F]+|[\uA960-\uA97F]+|[\uAC00-\uD7FF]+', False),
+               ('Basic_0036', 'Hindi', ('hi',), ur'[\u0900-\u097F]+', False),
+               ('Basic_0037', 'Georgian', ('ka',), ur'[\u10A0-\u10FF]+', False))
+
+def old_script_check(Place, v_id, script, languages, pattern, rstrip):
+    CountryCode, PlaceId = pv.CountryCode_PlaceID(Place)
+    return_emits = []
+    try:
+        for BaseText in Place.findall(pv.ns+"BaseText"):
+            btext = BaseText.text
+            if rstrip:
+                btext = btext.rstrip("\n")
+            btext_lc = BaseText.attrib.get('languageCode', 'None')
+            if btext_lc not in languages:
+                for char in btext:
+                    if re.match(pattern, char):
+                        btext = btext.replace('|', '#').encode('UTF-8')
+                        return_emits.append(v_id+'|'+CountryCode+'|'+PlaceId+'|Invalid: '+script+' characters found in BaseText|'+btext+'|languageCode="'+btext_lc+'"')
+                        break
+    except:
+        pass
+    return return_emits
+
+
+class ScriptChecksTest(unittest.TestCase):
+    """ Basic_0029-0037 against the per-character checks they replaced, None texts and allowed languages included """
+
+    pieces = [u'a', u'Main ', u'|', u'\n', u' ', u'1', u'\u0400', u'\u0482', u'\u0483', u'\u0488', u'\u04FF', u'\u0385',
+              u'\u0386', u'\u03F6', u'\u05D0', u'\u05EA', u'\u05EB', u'\u0621', u'\u063B', u'\u0640', u'\u066F', u'\u0671',
+              u'\u06EE', u'\u06FF', u'\u0E01', u'\u0E5B', u'\u4E00', u'\u9FA5', u'\u3041', u'\u30A0', u'\u1100', u'\u3130',
+              u'\uA960', u'\uAC00', u'\uD7FF', u'\u0900', u'\u097F', u'\u10A0', u'\u10FF', u'\u00E9']
+    languages = [None, 'en', 'ru', 'kk', 'el', 'he', 'ar', 'ur', 'th', 'zh', 'ja', 'ko', 'zh-Hant', 'hi', 'ka']
+
+    def check(self, basetexts):
+        Place = make_place(basetexts)
+        for (v_id, script, languages, pattern, rstrip) in old_scripts:
+            self.assertEqual(outcome(pv.validation_modules[v_id], Place),
+                             old_script_check(Place, v_id, script, languages, pattern, rstrip), (v_id, basetexts))
+
+    def test_random_texts(self):
+        rng = random.Random(22)
+        for i in range(3000):
+            self.check([(rng.choice(self.languages), random_text(rng, self.pieces)) for j in range(rng.randint(1, 4))])
+
+    def test_none_texts(self):
+        """ A BaseText without text stops the checks that strip it, and the others unless its language is allowed """
+        for language in self.languages:
+            self.check([('en', u'\u0410 \u0386 \u05D0 \u0E01 \u4E00 \uAC00 \u0900 \u10A0\n'), (language, None),
+                        ('en', u'\u0411 \u0387 \u05D1 \u0E02 \u4E01 \uAC01 \u0901 \u10A1')])
+        Place = make_place([('en', u'\u05D0'), ('he', None), ('en', u'\u05D1|\n')])
+        self.assertEqual(pv.Basic_0031(Place), ['Basic_0031|USA|1|Invalid: Hebrew characters found in BaseText|\xd7\x90|languageCode="en"',
+                                                'Basic_0031|USA|1|Invalid: Hebrew characters found in BaseText|\xd7\x91#\n|languageCode="en"'])
+        self.assertEqual(pv.Basic_0030(make_place([('en', u'\u0386'), ('el', None), ('en', u'\u0387')])),
+                         ['Basic_0030|USA|1|Invalid: Greek characters found in BaseText|\xce\x86|languageCode="en"'])
+
+    def test_allowed_languages(self):
+        for (v_id, script, languages, pattern, rstrip) in old_scripts:
+            text = pv.text_scripts(u''.join(self.pieces))[script]
+            for language in languages:
+                self.assertEqual(pv.validation_modules[v_id](make_place([(language, text)])), [])
+            self.assertEqual(len(pv.validation_modules[v_id](make_place([('en', text), (None, text)]))), 2)
+
+
+# The spacing/punctuation checks as they were written before text_lint(), with their own regexes
+old_consecutive_punctuation = re.compile('(([-/\\\\()!"+,&\'.])\\2+)')
+old_punctuation = re.compile('^[-\/\\\(\)\!\"\+\,\&\'\.]*$')
+old_appendix_f = ur'[\u0023-\u0025]+|[\u002A]+|[\u00A1-\u00A7]+|[\u00A9-\u00AE]+|[\u003A-\u003F]+|[\u007B-\u007E]+|[\u0040]+|[\u005B]+|[\u005D-\u005F]+|[\u00B0-\u00B3]+|[\u00B5-\u00B7]+|[\u00B9-\u00BF]+|[\u0060]+|[\u00D7]+'
+old_numeric = re.compile('^([-/\\()\s,\'&.]*)([0-9]+)([-/\\()\s,\'&.]*)$')
+
+def old_Basic_0020(Place):
+    CountryCode, PlaceId = pv.CountryCode_PlaceID(Place)
+    return_emits = []
+    try:
+        for BaseText in Place.findall(pv.ns+"BaseText"):
+            btext = BaseText.text.rstrip("\n")
+            if "  " in btext:
+                print_btext = btext.replace("  ", "__").replace('|', '#')
+                return_emits.append('Basic_0020|'+CountryCode+'|'+PlaceId+'|Multiple consecutive spaces found in BaseText|'+print_btext)
+    except:
+        pass
+    return return_emits
+
+def old_consecutive_check(v_id, texts, strip_first, CountryCode, PlaceId, where):
+    """ Basic_0022/0040 (the text searched as it is, then stripped) and Basic_0101/0116 (stripped and not empty) """
+    return_emits = []
+    for btext in texts:
+        if strip_first:
+            if btext == "":
+                continue
+        btext = btext.encode('UTF-8')
+        consec = old_consecutive_punctuation.search(btext)
+        match = old_punctuation.search(btext)
+        btext = btext.rstrip("\n")
+        if consec or match:
+            btext = btext.replace('|', '#')
+            if consec:
+                return_emits.append(v_id+'|'+CountryCode+'|'+PlaceId+'|Multiple consecutive punctuation found in '+where+'|'+btext+'|'+consec.group(1))
+            else:
+                return_emits.append(v_id+'a|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in '+where+'|'+btext+'|'+match.group(0))
+    return return_emits
+
+def old_appendix_f_check(v_id, texts, CountryCode, PlaceId, where):
+    """ Basic_0041/0057/0087/0117: one regex match per character """
+    return_emits = []
+    try:
+        for btext in texts:
+            for char in btext:
+                if re.match(old_appendix_f, char):
+                    btext = btext.replace('|', '#').encode('UTF-8')
+                    return_emits.append(v_id+'|'+CountryCode+'|'+PlaceId+'|Invalid punctuation found in '+where+'|'+btext)
+                    break
+    except:
+        pass
+    return return_emits
+
+def old_parsed_texts(Place, tag):
+    """ The text of the first `tag` below each Parsed, stripped, or "" """
+    texts = []
+    for Parsed in Place.findall(pv.ns+"Parsed"):
+        try:
+            texts.append(Parsed.find(pv.ns+tag).text.rstrip("\n"))
+        except:
+            texts.append("")
+    return texts
+
+def old_lint_checks(Place):
+    CountryCode, PlaceId = pv.CountryCode_PlaceID(Place)
+    def raw(tag):
+        return [elem.text for elem in Place.findall(pv.ns+tag)]
+    def numeric(texts):
+        return ['Basic_0104|'+CountryCode+'|'+PlaceId+'|Invalid numeric value found in AdminLevel/Level4|'+btext.encode('UTF-8').replace('|', '#')
+                for btext in texts if btext != "" and old_numeric.search(btext.encode('UTF-8'))]
+    return {'Basic_0020': lambda: old_Basic_0020(Place),
+            'Basic_0022': lambda: old_consecutive_check('Basic_0022', raw('BaseText'), False, CountryCode, PlaceId, 'BaseText'),
+            'Basic_0040': lambda: old_consecutive_check('Basic_0040', raw('BaseName'), False, CountryCode, PlaceId, 'StreetName/BaseName'),
+            'Basic_0041': lambda: old_appendix_f_check('Basic_0041', raw('BaseName'), CountryCode, PlaceId, 'StreetName/BaseName'),
+            'Basic_0057': lambda: old_appendix_f_check('Basic_0057', old_parsed_texts(Place, 'StreetType'), CountryCode, PlaceId, 'StreetName/StreetType'),
+            'Basic_0087': lambda: old_appendix_f_check('Basic_0087', old_parsed_texts(Place, 'Level3'), CountryCode, PlaceId, 'AdminLevel/Level3'),
+            'Basic_0101': lambda: old_consecutive_check('Basic_0101', old_parsed_texts(Place, 'Level4'), True, CountryCode, PlaceId, 'AdminLevel/Level4'),
+            'Basic_0104': lambda: numeric(old_parsed_texts(Place, 'Level4')),
+            'Basic_0116': lambda: old_consecutive_check('Basic_0116', old_parsed_texts(Place, 'Level5'), True, CountryCode, PlaceId, 'AdminLevel/Level5'),
+            'Basic_0117': lambda: old_appendix_f_check('Basic_0117', old_parsed_texts(Place, 'Level5'), CountryCode, PlaceId, 'AdminLevel/Level5')}
+
+
+class TextLintTest(unittest.TestCase):
+    """ The checks that read text_lint() against their own regexes as they were written, on crafted texts """
+
+    # Both ends of every Appendix F range and their neighbours, the backslash between [ and ] included
+    pieces = [u' ', u'  ', u'\n', u'\t', u'a', u'Main', u'12', u'0', u'|', u'\u00c0', u'\u041c'] + \
+             list(u'-/\\()!"+,&\'.') + [u'--', u'..', u'\\\\', u'//', u'&&', u"''"] + \
+             list(u'"#%&)*+9:?@AZ[\]_'
+                  u'`az{~\u007F\u00a0\u00a1\u00a7\u00a8\u00a9\u00ae\u00af\u00b0\u00b3\u00b4\u00b5'
+                  u'\u00b7\u00b8\u00b9\u00bf\u00d6\u00d7\u00d8')
+
+    def check(self, Place):
+        old = old_lint_checks(Place)
+        for v_id in sorted(old):
+            try:
+                expected = old[v_id]()
+            except Exception:
+                expected = 'raised'
+            self.assertEqual(outcome(pv.validation_modules[v_id], Place), expected, v_id)
+
+    def test_random_texts(self):
+        rng = random.Random(23)
+        for i in range(2000):
+            basetexts = [(None, random_text(rng, self.pieces)) for j in range(rng.randint(1, 3))]
+            parsed = []
+            for j in range(rng.randint(0, 3)):
+                parsed.append(dict((tag, random_text(rng, self.pieces)) for tag in ('BaseName', 'StreetType', 'Level3', 'Level4', 'Level5')
+                                   if rng.random() < 0.9))
+            self.check(make_place(basetexts, parsed))
+
+    def test_edges(self):
+        texts = [u'', u'\n', u'--', u'--\n', u'\n--', u'a  b\n', u'a \n', u'  \n', u'a\\b', u'a[b', u'12', u'12\n', u' (12). ',
+                 u'1\n2', u'\u00d7', u'\u00b4', u'a.\n.', u'!!x++', u'"', u'|', u'||']
+        for text in texts:
+            fields = dict((tag, text) for tag in ('BaseName', 'StreetType', 'Level3', 'Level4', 'Level5'))
+            self.check(make_place([(None, text)], [fields]))
+            self.check(make_place([(None, text), (None, text + u'..')], [fields, {}, fields]))
+
+
+class CategoryTaxonomyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.taxonomy = pv.CategoryTaxonomy(os.path.join(repo_dir, pv.category_file))
+        self.ids = set()
+        for elem in etree.parse(os.path.join(repo_dir, pv.category_file)).getroot():
+            self.ids.update(category.get('id') or category.text for category in elem)
+
+    def test_under(self):
+        for prefix in ('600-6900', '600', '100-1000', '999-9999-9999'):
+            expected = sorted(category_id for category_id in self.ids if category_id.startswith(prefix + '-'))
+            self.assertEqual(self.taxonomy.under(prefix + '-*'), expected)
+            self.assertEqual(self.taxonomy.under(prefix), expected)
+        self.assertTrue(self.taxonomy.under('600-6900-*'))
+        self.assertEqual(self.taxonomy.under('123-4567-*'), [])
+
+    def test_under_stops_at_the_branch(self):
+        work_dir = tempfile.mkdtemp(prefix='test_taxonomy_')
+        try:
+            path = os.path.join(work_dir, 'taxonomy.xml')
+            with open(path, 'wb') as f:
+                f.write('<CategoryTaxonomy><Group name="g"><Category>600-6900-0001</Category><Category>600-690-0001'
+                        '</Category><Category>600-69000-0001</Category><Category>600-6900.5</Category></Group>'
+                        '<Lookup name="l"><Category id="600-6900-0002">x</Category></Lookup></CategoryTaxonomy>')
+            taxonomy = pv.CategoryTaxonomy(path)
+            self.assertEqual(taxonomy.under('600-6900-*'), ['600-6900-0001', '600-6900-0002'])
+            self.assertEqual(taxonomy.lookup('l'), {'600-6900-0002': 'x'})
+        finally:
+            shutil.rmtree(work_dir)
+
+    def test_in_group(self):
+        group = self.taxonomy.group('TQS_Priority')
+        self.assertTrue(group)
+        for category_id in sorted(self.ids) + ['None', '600-6900']:
+            self.assertEqual(self.taxonomy.in_group('TQS_Priority', category_id), category_id in group)
+        self.assertTrue(self.taxonomy.in_group('TQS_Priority', sorted(group)[0]))
+
+
+class BloomSeenTwiceTest(unittest.TestCase):
+    """ bloom_seen_twice() folds saved filters block by block into the bits set in at least two of them """
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='test_bloom_')
+        self.block = pv.bloom_block
+
+    def tearDown(self):
+        pv.bloom_block = self.block
+        shutil.rmtree(self.work_dir)
+
+    def save(self, bloom, name):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'wb') as f:
+            f.write(bloom.bits)
+        return path
+
+    def test_keys_in_two_filters(self):
+        rng = random.Random(16)
+        size = 8 * 1000 + 3
+        filters = []
+        for task in range(5):
+            bloom = pv.BloomFilter(size)
+            for i in range(150):
+                bloom.add('Basic_0017a|%d' % rng.randint(0, 2000))
+            filters.append(bloom)
+        paths = [self.save(bloom, '%d.bloom' % task) for task, bloom in enumerate(filters)]
+        expected = bytearray(len(filters[0].bits))
+        for i in range(len(expected)):
+            for bit in range(8):
+                if sum(1 for bloom in filters if bloom.bits[i] & (1 << bit)) >= 2:
+                    expected[i] |= 1 << bit
+        for block in (1, 7, 1 << 20):
+            pv.bloom_block = block
+            seen_twice = pv.bloom_seen_twice(paths, size)
+            self.assertEqual(seen_twice.size, size)
+            self.assertEqual(seen_twice.bits, expected)
+        twice = pv.BloomFilter(size)
+        twice.add('Basic_0017a|x')
+        self.assertTrue('Basic_0017a|x' in pv.bloom_seen_twice(paths[:2] + [self.save(twice, 'x1'), self.save(twice, 'x2')], size))
+        self.assertEqual(pv.bloom_seen_twice(paths[:1], size).bits, bytearray(len(expected)))
+
+    def test_size_mismatch(self):
+        paths = [self.save(pv.BloomFilter(800), 'a'), self.save(pv.BloomFilter(808), 'b')]
+        pv.bloom_block = 10
+        self.assertRaises(ValueError, pv.bloom_seen_twice, paths, 800)
+        self.assertRaises(ValueError, pv.bloom_seen_twice, paths[:1], 808)
+
+
+class ContactTest(unittest.TestCase):
+    """ classify_contact() and the contact checks that read it """
+
+    def place(self, contacts):
+        """ A Non-Core Place with the given (type, ContactString text or None) Contacts """
+        xml = ['<Place xmlns="%s"><CountryCode>USA</CountryCode><PlaceId>1</PlaceId><ContactList>' % pv.t[1:-1]]
+        for (contact_type, text) in contacts:
+            xml.append('<Contact type="%s">' % contact_type)
+            if text is not None:
+                xml.append('<ContactString>%s</ContactString>' % text)
+            xml.append('</Contact>')
+        xml.append('</ContactList></Place>')
+        return pv.IndexedPlace(etree.fromstring(''.join(xml), pv.place_parser))
+
+    def test_classify(self):
+        contacts = pv.contact_list(self.place([('EMAIL', ' a@b.com;c..d@e.org '), ('EMAIL', 'web@joe.org'),
+                                               ('PHONE', '555 123-4567'), ('FAX', '555  123'), ('MOBILE', 'www.5.com'),
+                                               ('URL', 'http://www.joe.com/a\n'), ('URL', ' '), ('URL', None)]))
+        self.assertEqual([(contact['type'], contact['emails'], contact['number'], contact['url']) for contact in contacts],
+                         [('EMAIL', [('a@b.com', True), ('c..d@e.org', False)], False, False),
+                          ('EMAIL', [('web@joe.org', True)], False, False),
+                          ('PHONE', [('555 123-4567', False)], True, False),
+                          ('FAX', [('555  123', False)], False, False),
+                          ('MOBILE', [('www.5.com', False)], False, False),
+                          ('URL', [('http://www.joe.com/a', False)], False, True),
+                          ('URL', [('', False)], False, False),
+                          ('URL', [], False, False)])
+        self.assertEqual(contacts[0]['value'], 'a@b.com;c..d@e.org')
+        self.assertEqual(contacts[-1]['value'], None)
+
+    def test_only_url_contacts_are_urls(self):
+        for contact_type in ('EMAIL', 'PHONE', 'FAX', 'MOBILE'):
+            Place = self.place([(contact_type, 'web@joe.org'), (contact_type, 'http://www.joe.com')])
+            self.assertEqual(pv.contact_urls(Place), [])
+            self.assertEqual(pv.TQS_0011(Place), 'TQS_0011|Does not have URL')
+        Place = self.place([('EMAIL', 'web@joe.org'), ('URL', 'www.joe.net\n')])
+        self.assertEqual(pv.contact_urls(Place), ['www.joe.net'])
+        self.assertEqual(pv.TQS_0011(Place), 'TQS_0011|Has URL')
+        self.assertEqual(pv.TQS_0011(self.place([])), 'TQS_0011|Does not have URL')
+
+    def test_missing_contact_string_stops_the_checks(self):
+        checks = (('Basic_0135', 'EMAIL', 'a@b', ['Basic_0135|USA|1|Invalid email address|a@b']),
+                  ('Basic_0144', 'FAX', '12-34', []),
+                  ('Basic_0145', 'FAX', '1234', ['Basic_0145|USA|1|Length of FAX value should be between 5 and 11 digits.|4|1234']),
+                  ('Basic_0147', 'MOBILE', '1 2 x', ['Basic_0147|USA|1|Invalid MOBILE number|1 2 x']))
+        for (validation, contact_type, text, emits) in checks:
+            validate = pv.validation_modules[validation]
+            self.assertRaises(ValueError, validate, self.place([(contact_type, text), (contact_type, None)]))
+            self.assertEqual(validate(self.place([('URL', None), ('PHONE', None), (contact_type, text)])), emits)
+
+
+class AggregationTest(unittest.TestCase):
+    """ The reducer aggregations give the same result folded value by value or merged from split states """
+
+    def fold(self, spec, values):
+        state = spec.start(values[0])
+        for value in values[1:]:
+            state = spec.add(state, value)
+        return state
+
+    def test_results(self):
+        rng = random.Random(15)
+        for i in range(200):
+            values = [u'%d' % rng.randint(-50, 50) for j in range(rng.randint(1, 30))]
+            numbers = [int(value) for value in values]
+            smallest = min(values, key=lambda value: (int(value), value))
+            largest = max(values, key=lambda value: (int(value), value))
+            expected = ((pv.Sum(), (sum(numbers), sum(numbers))),
+                        (pv.Min(), (len(values), smallest)),
+                        (pv.Max(), (len(values), largest)),
+                        (pv.Distinct(), (len(set(values)), len(set(values)))),
+                        (pv.FirstN(3), (len(values), '|'.join(sorted(values)[:3]))))
+            cut = rng.randint(1, len(values))
+            for (spec, result) in expected:
+                self.assertEqual(spec.result(self.fold(spec, list(values))), result)
+                if cut < len(values):
+                    merged = spec.merge(self.fold(spec, values[:cut]), self.fold(spec, values[cut:]))
+                    self.assertEqual(spec.result(merged), result)
+
+
+class HyperLogLogTest(unittest.TestCase):
+    """ HyperLogLog estimates stay within a few standard errors, whether folded in one sketch or merged from dumps """
+
+    def test_estimates(self):
+        spec = pv.HyperLogLog(precision=10)
+        for n in (1, 5, 100, 3000, 50000):
+            values = [u'PlaceId %d' % i for i in range(n)]
+            one = spec.start(values[0])
+            for value in values[1:] + values[:n // 2]:      # Repeats don't count
+                one = spec.add(one, value)
+            (estimate, output) = spec.result(one)
+            self.assertTrue(abs(estimate - n) <= 3 * 1.04 / 32 * n + 1, (n, estimate))
+            self.assertEqual(output.split('|')[0], str(estimate))
+            halves = [spec.start(values[0]), spec.start(values[-1])]
+            for i, value in enumerate(values):
+                halves[i % 2] = spec.add(halves[i % 2], value)
+            merged = spec.merge(spec.load(spec.dump(halves[0])), spec.load(str(spec.dump(halves[1]))))
+            self.assertEqual(merged, one)
+
+
+class AggregationSizeTest(unittest.TestCase):
+    """ reducer.py --hash only charges its memory budget for what a state actually grows by """
+
+    def grow(self, spec, values):
+        state = spec.start(values[0])
+        size = spec.state_size(state)
+        for value in values[1:]:
+            size += spec.add_size(state, value)
+            state = spec.add(state, value)
+        return size
+
+    def test_fixed_size_states(self):
+        values = [u'%d' % i for i in range(1000)]
+        self.assertEqual(self.grow(pv.Sum(), values), 0)
+        self.assertEqual(self.grow(pv.Max(), values), len(values[0]))
+        self.assertEqual(self.grow(pv.HyperLogLog(precision=4), values), 16)
+
+    def test_growing_states(self):
+        values = [u'a', u'b', u'a', u'c', u'b']
+        self.assertEqual(self.grow(pv.Distinct(), values), 3 * (1 + pv.value_size))
+        self.assertEqual(self.grow(pv.FirstN(2), values), 2 * (1 + pv.value_size))
+        self.assertEqual(self.grow(pv.TopK(k=2), values), 3 * (1 + pv.value_size))
+
+
+class TopKTest(unittest.TestCase):
+    """ TopK counts against exact counts: true count between counter and counter + floor, floor <= n/(capacity+1) """
+
+    def stream(self, n):
+        rng = random.Random(18)
+        return [u'key %d' % int(rng.paretovariate(1.0)) for i in range(n)]
+
+    def summarize(self, spec, keys, tasks):
+        """ One summary per task, serialized and merged as mapper.py --top and reducer.py do """
+        state = None
+        for task in range(tasks):
+            part = spec.start(keys[task])
+            for key in keys[task + tasks::tasks]:
+                part = spec.add(part, key)
+            part = spec.load(spec.dump(part))
+            state = part if state is None else spec.merge(state, part)
+        return state
+
+    def test_error_bound(self):
+        keys = self.stream(20000)
+        exact = collections.Counter(key.encode('utf-8') for key in keys)
+        spec = pv.TopK(k=10, capacity=30)
+        (floor, counts) = spec.compact(self.summarize(spec, keys, 4))
+        self.assertTrue(0 < floor <= len(keys) / 31.0)
+        for key, count in exact.items():
+            self.assertTrue(counts.get(key, 0) <= count <= counts.get(key, 0) + floor)
+        rows = spec.rows('Basic_0020.top', [floor, counts])
+        self.assertEqual(len(rows), 10)
+        for row_key, count, text in rows:
+            self.assertEqual(text, '%d|+/-%d' % (count, floor))
+            self.assertTrue(count - floor <= exact[row_key.split('|', 1)[1].encode('utf-8')] <= count)
+        heavy = [key for key, count in exact.most_common(10) if count > 2 * floor]
+        self.assertTrue(heavy)
+        self.assertTrue(set(heavy) <= set(row_key.split('|', 1)[1] for row_key, count, text in rows))
+
+    def test_exact_below_capacity(self):
+        keys = self.stream(5000)
+        spec = pv.TopK(k=5, capacity=5000)
+        rows = spec.rows('New_0014b.top', self.summarize(spec, [u'New_0014b|' + key for key in keys], 3))
+        top = sorted(collections.Counter(keys).items(), key=lambda item: (-item[1], item[0]))[:5]
+        self.assertEqual(sorted((row_key, count) for row_key, count, text in rows),
+                         sorted((u'New_0014b.top|' + key, count) for key, count in top))
+        self.assertTrue(all(text.endswith('|+/-0') for row_key, count, text in rows))
+
+    def test_item(self):
+        emit_string = 'New_0006|RUS|1234| Profanity found in BaseText| word |Some text'
+        self.assertEqual(pv.heavy_hitters['New_0006'].item(emit_string), ' word ')
+        self.assertEqual(pv.TopK().item(emit_string), emit_string)
+
+
+def central_angle(a, b):
+    """ The angle between two (LAT, LONG) points in radians, with the atan2 (Vincenty) form of the formula """
+    (y1, x1, y2, x2) = [math.radians(float(c)) for c in (a[0], a[1], b[0], b[1])]
+    dx = x2 - x1
+    return math.atan2(math.hypot(math.cos(y2) * math.sin(dx), math.cos(y1) * math.sin(y2) - math.sin(y1) * math.cos(y2) * math.cos(dx)),
+                      math.sin(y1) * math.sin(y2) + math.cos(y1) * math.cos(y2) * math.cos(dx))
+
+
+class MathDistanceTest(unittest.TestCase):
+
+    points = [(49.8755, 6.07594), (49.87257, 6.0784), (49.8755, 6.075941), (0, 0), (0, 180), (-33.8688, 151.2093),
+              (89.9999, -45), ('40.7128', '-74.0060'), (51.5074, -0.1278)]
+
+    def test_haversine(self):
+        for a in self.points:
+            for b in self.points:
+                for unit in ('m', 'km', 'mi'):
+                    expected = central_angle(a, b) * pv.earth_radius[unit]
+                    self.assertAlmostEqual(pv.math_distance(a, b, unit), expected, delta=1e-6 + expected * 1e-9)
+        self.assertAlmostEqual(pv.math_distance((0, 0), (0, 1)), 6371000 * math.pi / 180, places=6)
+        self.assertAlmostEqual(pv.math_distance((49.8755, 6.07594), (49.8755, 6.075941)), 0.0717, places=4)     # Sub-meter
+        self.assertEqual(pv.math_distance((10, 20), (10, 20)), 0)
+        self.assertAlmostEqual(pv.math_distance((0, 0), (0, 180), unit='km'), 6371 * math.pi, places=6)
+
+    def test_units(self):
+        (a, b) = (self.points[0], self.points[-1])
+        meters = pv.math_distance(a, b)
+        self.assertEqual(pv.math_distance(a, b, unit='m'), meters)
+        self.assertAlmostEqual(pv.math_distance(a, b, unit='km'), meters / 1000, places=9)
+        self.assertAlmostEqual(pv.math_distance(a, b, unit='mi'), meters * 3958.76 / 6371000, places=9)
+        self.assertEqual(pv.math_distance(a, b, unit='feet'), meters)          # Unknown units are meters
+
+    def check_batches(self):
+        """ Batches give the distances of their pairs, pair by pair """
+        (a, b, one) = (self.points, self.points[::-1], self.points[1])
+        for unit in ('m', 'mi'):
+            cases = ((pv.math_distance(a, b, unit), [pv.math_distance(p, q, unit) for (p, q) in zip(a, b)]),
+                     (pv.math_distance(a, one, unit), [pv.math_distance(p, one, unit) for p in a]),       # N against one
+                     (pv.math_distance(one, b, unit), [pv.math_distance(one, q, unit) for q in b]))
+            for (batch, singles) in cases:
+                self.assertEqual(len(batch), len(singles))
+                for (distance, single) in zip(batch, singles):
+                    self.assertAlmostEqual(distance, single, delta=1e-6)
+        self.assertRaises(ValueError, pv.math_distance, a, b[1:])
+
+    @unittest.skipIf(pv.np is None, "needs NumPy")
+    def test_numpy_batches(self):
+        self.check_batches()
+        batch = pv.np.array([p[:2] for p in self.points], dtype=float)
+        self.assertEqual(list(pv.math_distance(batch, batch)), [0] * len(self.points))
+
+    def test_batches_without_numpy(self):
+        np = pv.np
+        pv.np = None
+        try:
+            self.check_batches()
+            self.assertEqual(pv.math_distance(self.points, self.points), [0] * len(self.points))
+        finally:
+            pv.np = np
+
+
+missing = object()      # make_geo_place: leave the Latitude/Longitude element out
+
+def make_geo_place(place_id, locations):
+    """
+    # A parsed Place with a Location per (Side text or None, [(GeoPosition type or None, latitude, longitude), ...])
+    # of locations. A None latitude/longitude writes an empty element, `missing` none at all.
+    """
+    Place = etree.Element(pv.t + 'Place', nsmap={None: pv.t[1:-1]})
+    etree.SubElement(etree.SubElement(Place, pv.t + 'Identity'), pv.t + 'PlaceId').text = place_id
+    etree.SubElement(Place, pv.t + 'CountryCode').text = 'USA'
+    LocationList = etree.SubElement(Place, pv.t + 'LocationList')
+    for (side, geo_positions) in locations:
+        Location = etree.SubElement(LocationList, pv.t + 'Location')
+        if side is not None:
+            etree.SubElement(Location, pv.t + 'Side').text = side
+        GeoPositionList = etree.SubElement(Location, pv.t + 'GeoPositionList')
+        for (geo_type, latitude, longitude) in geo_positions:
+            GeoPosition = etree.SubElement(GeoPositionList, pv.t + 'GeoPosition')
+            if geo_type is not None:
+                GeoPosition.set('type', geo_type)
+            for (tag, text) in (('Latitude', latitude), ('Longitude', longitude)):
+                if text is not missing:
+                    etree.SubElement(GeoPosition, pv.t + tag).text = text
+    return pv.IndexedPlace(etree.fromstring(etree.tostring(Place, encoding='UTF-8'), pv.place_parser))
+
+
+@unittest.skipIf(pv.np is None, "needs NumPy")
+class CoordinateBatchTest(unittest.TestCase):
+    """ CoordinateBatch.flush() emits what the per-Place Basic_0003/0004/0006a/0006b emit for the same Places """
+
+    coordinates = [missing, None, u'', u'None', u'0', u'0.0', u'-0', u'41.9', u'-12.5', u'90', u'-90', u'90.0001', u'180',
+                   u'-180.5', u'1E5', u'1e5', u'2E-3', u'E', u'abc', u'nan', u'inf', u' 12 ', u'0x10', u'1,5', u'\u0661']
+
+    def check(self, Places):
+        batch = pv.CoordinateBatch()
+        expected = []
+        for (Place, vals) in Places:
+            for val in vals:
+                batch.add(Place, val)
+                expected.extend(pv.validation_modules[val](Place))
+        self.assertEqual(len(batch), len(Places))
+        self.assertEqual(sorted(batch.flush()), sorted(expected))
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.flush(), [])
+
+    def test_random_places(self):
+        rng = random.Random(8)
+        for i in range(300):
+            Places = []
+            for j in range(rng.randint(1, 6)):
+                locations = []
+                for k in range(rng.randint(0, 3)):
+                    side = rng.choice([u'left', u'right', u'neither', u'', None])
+                    same = (rng.choice(self.coordinates), rng.choice(self.coordinates))
+                    geo_positions = []
+                    for m in range(rng.choice([1, 2, 2, 2, 3])):
+                        geo_type = rng.choice([u'DISPLAY', u'ROUTING', u'ROUTING', u'OTHER', None])
+                        if rng.random() < 0.5:
+                            geo_positions.append((geo_type,) + same)        # DISPLAY and ROUTING often identical
+                        else:
+                            geo_positions.append((geo_type, rng.choice(self.coordinates), rng.choice(self.coordinates)))
+                    locations.append((side, geo_positions))
+                vals = rng.sample(pv.batched_validations, rng.randint(1, 4))
+                Places.append((make_geo_place(u'%d' % j, locations), vals))
+            self.check(Places)
+
+    def test_every_coordinate(self):
+        for latitude in self.coordinates:
+            for longitude in self.coordinates:
+                locations = [(u'left', [(u'DISPLAY', latitude, longitude), (u'ROUTING', latitude, longitude)]),
+                             (u'right', [(None, latitude, u'1'), (u'ROUTING', latitude, longitude)])]
+                self.check([(make_geo_place(u'1', locations), pv.batched_validations)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------------------
+# Name:         test_local_runner.py
+# Purpose:      local_runner.py --reducers=N must write the same output, in the same key order, as one reducer.
+#
+# Usage:        python -m unittest discover -s tests      (from the repository root, Python 2.7 with lxml)
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import unittest
+import random
+import subprocess
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')      # PlacesValidations announces itself on stdout when imported
+import local_runner
+sys.stdout = stdout
+places_dir = os.path.join(repo_dir, 'tests', 'data', 'places')     # Two small country files, one Place per line
+framework_dir = None
+
+
+def setUpModule():
+    """
+    # A copy of the framework whose product_vals.xml also has the product "All" (no Include or Exclude list, so
+    # every validation runs), which puts the --top reports between all the other keys of the output.
+    """
+    global framework_dir
+    framework_dir = tempfile.mkdtemp(prefix='test_framework_')
+    for path in glob.glob(os.path.join(repo_dir, '*.py')) + [os.path.join(repo_dir, 'category_taxonomy.xml')]:
+        shutil.copy(path, framework_dir)
+    with open(os.path.join(repo_dir, 'product_vals.xml'), 'rb') as f:
+        product_vals = f.read()
+    product_vals = product_vals.replace('</ProductValidationList>', '\t<Product name="All"></Product>\n</ProductValidationList>')
+    with open(os.path.join(framework_dir, 'product_vals.xml'), 'wb') as f:
+        f.write(product_vals)
+
+
+def tearDownModule():
+    shutil.rmtree(framework_dir)
+
+
+def run_local_runner(product, options, input_dir=places_dir):
+    """ The output lines of local_runner.py over input_dir (tests/data/places) """
+    work_dir = tempfile.mkdtemp(prefix='test_local_runner_')
+    try:
+        output_path = os.path.join(work_dir, 'output.txt')
+        with open(os.devnull, 'wb') as devnull:
+            subprocess.check_call([sys.executable, os.path.join(framework_dir, 'local_runner.py'), input_dir, product,
+                                   'x', '--processes=2', '--output=' + output_path] + options,
+                                  cwd=framework_dir, stdout=devnull, stderr=devnull)
+        with open(output_path, 'rb') as f:
+            return f.readlines()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def run_pipeline(product):
+    """ cat | mapper.py | sort | reducer.py over each file of tests/data/places, as Hadoop streaming runs them """
+    lines = []
+    with open(os.devnull, 'wb') as devnull:
+        for path in local_runner.input_files(places_dir):
+            env = dict(os.environ)
+            env['map_input_file'] = path
+            with open(path, 'rb') as stdin:
+                lines += subprocess.check_output([sys.executable, os.path.join(framework_dir, 'mapper.py'), product, 'x'],
+                                                 cwd=framework_dir, env=env, stdin=stdin, stderr=devnull).splitlines(True)
+        reducer = subprocess.Popen([sys.executable, os.path.join(framework_dir, 'reducer.py')], cwd=framework_dir,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=devnull)
+        output = reducer.communicate(''.join(sorted(lines)))[0]
+    return output.splitlines(True)
+
+
+class LocalRunnerTest(unittest.TestCase):
+
+    def test_same_output_as_the_pipeline(self):
+        for product in ('EWP', 'All'):
+            lines = run_local_runner(product, [])
+            self.assertTrue(lines)
+            self.assertEqual(lines, run_pipeline(product))
+            self.assertEqual(run_local_runner(product, ['--hash']), lines)
+
+    def test_sort_file(self):
+        """ Sorted in memory, or in runs merged from temp files when the file is larger than sort_bytes """
+        rng = random.Random(10)
+        lines = ['%s\t%d\n' % (rng.choice(['a', 'b|x', 'b', 'c d', '']), rng.randint(0, 99)) for i in range(1000)]
+        work_dir = tempfile.mkdtemp(prefix='test_sort_file_')
+        try:
+            path = os.path.join(work_dir, 'map')
+            for sort_bytes in (1, 100, 5000, 1 << 20):
+                with open(path, 'wb') as f:
+                    f.writelines(lines)
+                local_runner.sort_file(path, sort_bytes)
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.readlines(), sorted(lines))
+            self.assertEqual(os.listdir(work_dir), ['map'])
+        finally:
+            shutil.rmtree(work_dir)
+
+
+class ReducersTest(unittest.TestCase):
+
+    def check_reducers(self, product, options):
+        single = run_local_runner(product, options + ['--reducers=1'])
+        self.assertTrue(single)
+        keys = [line.split('\t', 1)[0] + '\t' for line in single]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(run_local_runner(product, options + ['--reducers=3']), single)
+
+    def test_sorted(self):
+        self.check_reducers('All', [])
+
+    def test_hash(self):
+        self.check_reducers('All', ['--hash'])
+
+    def test_top(self):
+        self.check_reducers('All', ['--top'])
+
+    def test_hash_top(self):
+        self.check_reducers('All', ['--hash', '--top'])
+
+    def test_binary(self):
+        self.check_reducers('All', ['--binary', '--top'])
+
+    def test_dedup(self):
+        self.check_reducers('EWP', ['--dedup'])
+
+
+class DedupTest(unittest.TestCase):
+
+    def test_same_duplicates_as_a_full_count(self):
+        """ USA.xml twice (every PlaceId a duplicate across tasks) and CAN.xml once (none) """
+        input_dir = tempfile.mkdtemp(prefix='test_dedup_')
+        try:
+            for (name, source) in (('A.xml', 'USA.xml'), ('B.xml', 'USA.xml'), ('C.xml', 'CAN.xml')):
+                shutil.copy(os.path.join(places_dir, source), os.path.join(input_dir, name))
+            full = run_local_runner('Basic_0017a', [], input_dir)
+            self.assertTrue(full)
+            self.assertEqual(run_local_runner('Basic_0017a', ['--dedup'], input_dir), full)
+            self.assertEqual(run_local_runner('Basic_0017a', ['--dedup', '--reducers=3', '--bloom-bits=4099'], input_dir), full)
+        finally:
+            shutil.rmtree(input_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
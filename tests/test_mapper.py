@@ -0,0 +1,254 @@
+#-------------------------------------------------------------------------------
+# Name:         test_mapper.py
+# Purpose:      mapper.py input modes and options must not change what the job reports.
+#
+# Usage:        python -m unittest discover -s tests      (from the repository root, Python 2.7 with lxml)
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import re
+import bz2
+import gzip
+import random
+import shutil
+import tempfile
+import unittest
+import subprocess
+import collections
+import lxml.etree as etree
+from cStringIO import StringIO
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+places_file = os.path.join(repo_dir, 'tests', 'data', 'places', 'USA.xml')     # One Place per line
+sys.path.insert(0, repo_dir)
+(argv, stderr) = (sys.argv, sys.stderr)
+(sys.argv, sys.stderr) = (['mapper.py', 'EWP'], open(os.devnull, 'w'))         # mapper.py reads its arguments when imported
+import mapper
+(sys.argv, sys.stderr) = (argv, stderr)
+
+
+def run_mapper(product, options, input_path=places_file, query='x'):
+    """ The sorted output lines of mapper.py over input_path, read from stdin as Hadoop streaming feeds it """
+    env = dict(os.environ)
+    env['map_input_file'] = input_path
+    with open(input_path, 'rb') as stdin, open(os.devnull, 'wb') as devnull:
+        output = subprocess.check_output([sys.executable, os.path.join(repo_dir, 'mapper.py'), product, query] + options,
+                                         cwd=repo_dir, env=env, stdin=stdin, stderr=devnull)
+    return sorted(output.splitlines(True))
+
+
+def reduce_lines(lines):
+    """ The reducer.py output for the given map output lines """
+    reducer = subprocess.Popen([sys.executable, os.path.join(repo_dir, 'reducer.py')], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, cwd=repo_dir)
+    return reducer.communicate(''.join(sorted(lines)))[0]
+
+
+def gzip_compress(data):
+    f = StringIO()
+    with gzip.GzipFile(fileobj=f, mode='wb') as g:
+        g.write(data)
+    return f.getvalue()
+
+
+class DecompressedInputTest(unittest.TestCase):
+    """ Compressed input reads back as the original bytes, member after member, like gzip -d / bzip2 -d """
+
+    def read(self, stream, block_size, read_size=-1):
+        source = mapper.DecompressedInput(StringIO(stream), block_size)
+        if read_size < 0:
+            return source.read()
+        return ''.join(iter(lambda: source.read(read_size), ''))
+
+    def check(self, compress):
+        data = ''.join('<Place id="%d"/>\n' % i for i in range(2000))
+        cases = ((compress(data), data),
+                 (compress(data) + compress('x\n'), data + 'x\n'),                     # cat a.gz b.gz
+                 (compress(data) + '\x00' * 512, data),                                # Tape / block padding
+                 (compress(data) + '\x00' * 3 + compress('y\n') + '\x00', data + 'y\n'),
+                 (compress(data) + 'trailing garbage' + compress('z\n'), data),       # Ignored, as gzip -d does
+                 (compress(data) + compress('z\n')[:1], data))
+        for (stream, expected) in cases:
+            for block_size in (6, 7, 100, 1 << 20):
+                self.assertEqual(self.read(stream, block_size), expected)
+            self.assertEqual(self.read(stream, 50, 1000), expected)
+
+    def test_gzip(self):
+        self.check(gzip_compress)
+
+    def test_bz2(self):
+        self.check(bz2.compress)
+
+    @unittest.skipIf(mapper.lzma is None, "needs the lzma module")
+    def test_xz(self):
+        self.check(lambda data: mapper.lzma.compress(data, format=mapper.lzma.FORMAT_XZ))
+
+    @unittest.skipIf(mapper.lzma is not None, "the lzma module is installed")
+    def test_xz_without_lzma(self):
+        self.assertRaises(IOError, self.read, '\xfd7zXZ\x00' + '\x00' * 100, 1024)
+
+    def test_plain_input_is_passed_through(self):
+        data = '<PlaceList>\n\x1f\x8b' + 'x' * 1000
+        for block_size in (1, 7, 1 << 20):
+            self.assertEqual(self.read(data, block_size), data)
+            self.assertEqual(self.read(data, block_size, 13), data)
+
+    def test_input_file_name(self):
+        for (path, name) in (('/data/COL.xml.gz', '/data/COL.xml'), ('COL.xml.bz2', 'COL.xml'), ('COL.xml.xz', 'COL.xml'),
+                             ('COL.xml', 'COL.xml'), ('COL.gz.xml', 'COL.gz.xml'), ('COL.xml.zip', 'COL.xml.zip')):
+            self.assertEqual(mapper.input_file_name(path), name)
+
+    def test_compressed_file_maps_like_the_plain_file(self):
+        with open(places_file, 'rb') as f:
+            data = f.read()
+        work_dir = tempfile.mkdtemp(prefix='test_mapper_')
+        try:
+            for (suffix, compress) in (('.gz', gzip_compress), ('.bz2', bz2.compress)):
+                input_path = os.path.join(work_dir, 'USA.xml' + suffix)
+                with open(input_path, 'wb') as f:
+                    f.write(compress(data[:len(data) // 2]) + compress(data[len(data) // 2:]) + '\x00' * 512)
+                for product in ('default', 'EWP'):
+                    self.assertEqual(run_mapper(product, [], input_path), run_mapper(product, []))
+        finally:
+            shutil.rmtree(work_dir)
+
+
+class CombinerTest(unittest.TestCase):
+
+    def test_spilled_runs_match_in_memory_counts(self):
+        rng = random.Random(12)
+        keys = ['Stats_0001|USA'] * 500 + ['Basic_0017a|%d' % rng.randint(0, 400) for i in range(3000)]
+        rng.shuffle(keys)
+        for budget in (1 << 30, 4096, 0):           # Never spills, spills every few dozen keys, spills every new key
+            combiner = mapper.Combiner(budget)
+            for key in keys:
+                combiner.add(key)
+            records = []
+            combiner.write(lambda key, count: records.append((key, count)))
+            self.assertEqual(records, sorted(collections.Counter(keys).items()))
+
+    def test_combined_output_reduces_the_same(self):
+        for product in ('default', 'EWP'):
+            plain = run_mapper(product, [])
+            combined = run_mapper(product, ['--combine'])
+            self.assertTrue(len(combined) < len(plain))
+            self.assertEqual(reduce_lines(combined), reduce_lines(plain))
+
+
+class ChunkedInputTest(unittest.TestCase):
+
+    def test_chunk_sizes(self):
+        """ Records that straddle chunk boundaries (or a chunk of one byte) map as whole lines """
+        for product in ('default', 'EWP', 'GEO_0002'):
+            lines = run_mapper(product, [])
+            self.assertTrue(lines)
+            for size in (1, 97, 4096):
+                self.assertEqual(run_mapper(product, ['--chunk-size=%d' % size]), lines)
+
+    def test_no_final_newline(self):
+        """ The last Place maps even when no newline follows it """
+        with open(places_file, 'rb') as f:
+            places = [line for line in f if line.startswith('<Place ')]
+        work_dir = tempfile.mkdtemp(prefix='test_mapper_')
+        input_path = os.path.join(work_dir, 'USA.xml')
+        try:
+            with open(input_path, 'wb') as f:
+                f.write(''.join(places[-2:]).rstrip('\n'))
+            lines = run_mapper('EWP', [], input_path)
+            with open(input_path, 'ab') as f:
+                f.write('\n')
+            self.assertTrue(lines)
+            self.assertEqual(run_mapper('EWP', [], input_path), lines)
+            self.assertEqual(run_mapper('EWP', ['--chunk-size=97'], input_path), lines)
+        finally:
+            shutil.rmtree(work_dir)
+
+
+class IterparseTest(unittest.TestCase):
+
+    def test_same_output_as_line_mode(self):
+        for product in ('default', 'EWP'):
+            lines = run_mapper(product, [])
+            self.assertTrue(lines)
+            self.assertEqual(run_mapper(product, ['--iterparse']), lines)
+
+    def test_raw_placelist_header(self):
+        """ Basic_0001 sees the PlaceList line as written, in both modes """
+        with open(places_file, 'rb') as f:
+            document = f.read()
+        header = ('<PlaceList xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://places.maps.domain.com/pds" '
+                  'xsi:schemaLocation="a &amp; b" version=\'1\'>')
+        work_dir = tempfile.mkdtemp(prefix='test_mapper_')
+        input_path = os.path.join(work_dir, 'HDR.xml')
+        try:
+            with open(input_path, 'wb') as f:
+                f.write(document.replace('<PlaceList xmlns="http://places.maps.domain.com/pds">', header, 1))
+            lines = [line for line in run_mapper('EWP', [], input_path) if line.startswith('Basic_0001|')]
+            self.assertEqual(lines, ['Basic_0001|HDR.xml|PlaceList xmlns is incorrect.|' + header + '\t1\n'])
+            self.assertEqual([line for line in run_mapper('EWP', ['--iterparse'], input_path)
+                              if line.startswith('Basic_0001|')], lines)
+        finally:
+            shutil.rmtree(work_dir)
+
+    def test_pretty_printed_document(self):
+        """ A pretty-printed PlaceList maps like the one Place per line file, whole Place rows (New_0015) included """
+        with open(places_file, 'rb') as f:
+            query = ','.join(re.findall('<PlaceId>([^<]*)</PlaceId>', f.read())[:3])
+        work_dir = tempfile.mkdtemp(prefix='test_mapper_')
+        input_path = os.path.join(work_dir, 'USA.xml')
+        try:
+            with open(input_path, 'wb') as f:
+                f.write(etree.tostring(etree.parse(places_file), pretty_print=True))
+            for product in ('default', 'EWP', 'New_0015'):
+                lines = run_mapper(product, [], places_file, query)
+                self.assertTrue(lines)
+                self.assertEqual([line.replace(input_path, places_file) for line in run_mapper(product, ['--iterparse'], input_path, query)],
+                                 lines)
+        finally:
+            shutil.rmtree(work_dir)
+
+
+class TopTest(unittest.TestCase):
+
+    def test_top_rows_count_the_report_field(self):
+        """ --top counts the BaseTexts / words of the Basic_0020 and New_0006 keys, not the per-Place keys """
+        plain = reduce_lines(run_mapper('default', [])).splitlines(True)
+        top = reduce_lines(run_mapper('default', ['--top'])).splitlines(True)
+        for report in ('Basic_0020', 'New_0006'):
+            exact = collections.Counter()
+            for line in plain:
+                (key, count) = line.rstrip('\n').split('\t')
+                if key.startswith(report + '|'):
+                    exact[key.split('|')[4]] += int(count)
+            rows = [line for line in top if line.startswith(report)]
+            self.assertEqual(rows, sorted('%s.top|%s\t%d|+/-0\n' % (report, item, count) for item, count in exact.items()))
+        self.assertTrue(any(line.startswith('Basic_0020.top|') for line in top))
+
+
+class EmitTest(unittest.TestCase):
+    """ The one-join fast path of emit() writes what a write per key writes """
+
+    def emitted(self, emit_return):
+        (saved, mapper.output) = (mapper.output, mapper.OutputBuffer(StringIO()))
+        try:
+            mapper.emit(emit_return)
+            mapper.output.flush()
+            return mapper.output.out.getvalue()
+        finally:
+            mapper.output = saved
+
+    def test_emit_forms(self):
+        cases = (('Basic_0001|a', 'Basic_0001|a\t1\n'),
+                 (['Basic_0001|a', 'Basic_0002|b'], 'Basic_0001|a\t1\nBasic_0002|b\t1\n'),
+                 ((key for key in ['Basic_0001|a', 'Basic_0002|b']), 'Basic_0001|a\t1\nBasic_0002|b\t1\n'),
+                 ((key for key in []), ''), ([], ''), (None, ''),
+                 ([('Stats_0001|USA', 5), 'Basic_0001|a'], 'Stats_0001|USA\t5\nBasic_0001|a\t1\n'),
+                 ([u'New_0006|a', 'New_0006|b'], 'New_0006|a\t1\nNew_0006|b\t1\n'),              # Joins to unicode
+                 (['New_0006|\xc3\xa9', u'New_0006|b'], 'New_0006|\xc3\xa9\t1\nNew_0006|b\t1\n'))  # Join raises
+        for (emit_return, expected) in cases:
+            self.assertEqual(self.emitted(emit_return), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
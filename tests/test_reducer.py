@@ -0,0 +1,87 @@
+#-------------------------------------------------------------------------------
+# Name:         test_reducer.py
+# Purpose:      reducer.py over hand-made "key\tval" input: serialized states and sorted vs --hash mode.
+#
+# Usage:        python -m unittest discover -s tests      (from the repository root, Python 2.7 with lxml)
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import random
+import unittest
+import subprocess
+from cStringIO import StringIO
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')      # PlacesValidations announces itself on stdout when imported
+import PlacesValidations as pv
+sys.stdout = stdout
+
+
+def run_reducer(lines, options=[]):
+    """ The output lines of reducer.py over the given input lines """
+    reducer = subprocess.Popen([sys.executable, os.path.join(repo_dir, 'reducer.py')] + options,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=repo_dir)
+    output = reducer.communicate(''.join(lines))[0]
+    if reducer.returncode != 0:
+        raise RuntimeError("reducer.py failed (exit code %d)" % reducer.returncode)
+    return output.splitlines(True)
+
+
+class SerializedStateTest(unittest.TestCase):
+
+    def test_state_lines_are_merged_and_values_added(self):
+        spec = pv.validation_aggregations['Stats_0006']
+        state = spec.dump(spec.add(spec.start('a'), 'b'))
+        lines = ['Stats_0006|USA\t\t%s\n' % state,                  # A mapper sketch of a and b
+                 'Stats_0006|USA\thll:%s\n' % state,                # Raw values, whatever their text
+                 'Stats_0006|USA\ttopk:c\n',
+                 'Stats_0006|USA\ta\n']
+        self.assertEqual(run_reducer(lines), ['Stats_0006|USA\t4|+/-0\n'])
+        self.assertEqual(run_reducer(lines[::-1], ['--hash']), ['Stats_0006|USA\t4|+/-0\n'])
+
+    def test_binary_records_keep_the_state_type(self):
+        spec = pv.validation_aggregations['Stats_0006']
+        state = spec.dump(spec.start('a'))
+        out = StringIO()
+        writer = pv.BinaryWriter(out)
+        writer.write('Stats_0006|USA', state)
+        writer.write('Stats_0006|USA', str(state))
+        records = list(pv.read_binary_records(StringIO(out.getvalue())))
+        self.assertEqual([type(value) for key, value in records], [pv.SerializedState, unicode])
+        self.assertEqual(run_reducer([out.getvalue()], ['--hash']), ['Stats_0006|USA\t2|+/-0\n'])
+
+
+class HashModeTest(unittest.TestCase):
+    """ reducer.py --hash, spilling or not, writes what sorted mode writes """
+
+    def test_spills_match_sorted_mode(self):
+        rng = random.Random(13)
+        spec = pv.validation_aggregations['Stats_0006']
+        lines = []
+        for i in range(3000):
+            lines.append('Basic_0017a|%d\t1\n' % rng.randint(0, 150))                # Counted, having=2
+            lines.append('Basic_0020|USA|%d\t%d\n' % (rng.randint(0, 100), rng.randint(1, 3)))
+            lines.append(u'New_0006|RUS|\u041a\u0430\u0444\u0435 %d\t1\n'.encode('utf-8') % rng.randint(0, 20))
+            lines.append('Stats_0006|%s\t%d\n' % (rng.choice(['USA', 'CAN']), rng.randint(0, 500)))
+        for country in ('USA', 'DEU'):
+            lines.append('Stats_0006|%s\t\t%s\n' % (country, spec.dump(spec.add(spec.start('x'), 'y'))))
+        sorted_output = run_reducer(sorted(lines))
+        self.assertTrue(len(sorted_output) > 200)
+        rng.shuffle(lines)
+        self.assertEqual(run_reducer(lines, ['--hash']), sorted_output)
+        self.assertEqual(run_reducer(lines, ['--hash', '--hash-memory=0']), sorted_output)     # Spills every new key
+
+    def test_last_key(self):
+        """ The Basic_0017a duplicates-only rule applies to the last key of the input like to any other """
+        lines = ['Basic_0017a|1\t1\n', 'Basic_0017a|1\t1\n', 'Basic_0017a|2\t1\n']
+        for options in ([], ['--hash']):
+            self.assertEqual(run_reducer(lines, options), ['Basic_0017a|1\t2\n'])
+            self.assertEqual(run_reducer(lines + ['Stats_0001|USA\t1\n'], options), ['Basic_0017a|1\t2\n', 'Stats_0001|USA\t1\n'])
+            self.assertEqual(run_reducer(['Basic_0001|USA.xml|x\t3\n', 'Basic_0017a|9\t1\n'], options), ['Basic_0001|USA.xml|x\t3\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()